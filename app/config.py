@@ -8,6 +8,101 @@ class Settings(BaseSettings):
     GOOGLE_API_KEY: str = ""
     gemma_embedding_model: str = ""
 
+    # Semantic answer cache (app/services/answer_cache.py)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_ENTRIES_PER_APP: int = 500
+    # Looser match used only to serve a fallback while the LLM circuit is open
+    ANSWER_CACHE_FALLBACK_THRESHOLD: float = 0.85
+
+    # Max seconds a request waits on an identical in-flight LLM call (app/services/single_flight.py)
+    LLM_SINGLE_FLIGHT_WAIT_SECONDS: float = 30.0
+
+    GEMINI_API_BASE_URL: str = "https://generativelanguage.googleapis.com/v1beta"
+
+    # Upstream deadlines, hedging and circuit breaking (app/services/gemini_client.py)
+    CHAT_LATENCY_BUDGET_SECONDS: float = 25.0
+    GEMINI_TIMEOUT_SECONDS: float = 20.0
+    GEMINI_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    GEMINI_HEDGING_ENABLED: bool = False
+    GEMINI_HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0
+
+    # Gemini cachedContents for each tenant's knowledge-base prefix (app/services/context_cache.py).
+    # Caching needs a model version that supports it and a prefix above Gemini's minimum size.
+    CONTEXT_CACHE_ENABLED: bool = False
+    CONTEXT_CACHE_MIN_TOKENS: int = 32768
+    CONTEXT_CACHE_MAX_TOKENS: int = 500000
+    CONTEXT_CACHE_TTL_SECONDS: int = 3600
+    CONTEXT_CACHE_RETRY_SECONDS: int = 300
+
+    # Tiered model routing by message complexity; apps can override via settings (app/services/model_router.py)
+    MODEL_ROUTING_ENABLED: bool = False
+
+    # Prompt history: rolling session summary plus the last turns verbatim (app/services/conversation.py)
+    HISTORY_RECENT_TURNS: int = 3
+    HISTORY_TOKEN_BUDGET: int = 1500
+    SUMMARY_BATCH_TURNS: int = 2
+    SUMMARY_MAX_WORDS: int = 200
+    SUMMARY_MAX_TOKENS: int = 400
+
+    # Regex guardrail rules (app/services/guardrail.py), matched with google-re2 in linear time
+    GUARDRAIL_REGEX_MAX_PATTERN_LENGTH: int = 500
+    GUARDRAIL_REGEX_TIME_LIMIT_MS: float = 50.0
+    GUARDRAIL_REGEX_STREAM_HOLD_CHARS: int = 64
+
+    # Automatic session language detection (app/services/intents.py); apps can override via settings
+    LANGUAGE_DETECTION_ENABLED: bool = True
+    LANGUAGE_DETECTION_MIN_CHARS: int = 15
+    LANGUAGE_DETECTION_MIN_CONFIDENCE: float = 0.9
+
+    # Chat turn persistence (app/services/persistence.py): "sync" stores the turn before
+    # responding, "async" responds first and writes behind within CHAT_PERSISTENCE_FLUSH_SECONDS
+    CHAT_PERSISTENCE_MODE: str = "sync"
+    CHAT_PERSISTENCE_FLUSH_SECONDS: float = 0.2
+    CHAT_PERSISTENCE_MAX_BACKLOG: int = 5000
+
+    # In-process LRU of active sessions (app/services/session_cache.py); 0 entries disables it.
+    # With a coalesce window > 0, lastActiveAt/token updates are written at most once per window per session
+    SESSION_CACHE_MAX_ENTRIES: int = 10000
+    SESSION_CACHE_IDLE_SECONDS: float = 1800
+    SESSION_CACHE_MAX_AGE_SECONDS: float = 60
+    SESSION_LAST_ACTIVE_COALESCE_SECONDS: float = 0
+
+    # Storage layout of chat_messages for newly created apps: "documents" or "timeseries" (app/utils/chat_messages.py)
+    CHAT_MESSAGES_LAYOUT: str = "documents"
+
+    # Chat data lifecycle (app/services/lifecycle.py): sessions idle for SESSION_IDLE_EXPIRY_HOURS are closed;
+    # with archival on, closed sessions older than CHAT_ARCHIVE_AFTER_DAYS are written with their messages to
+    # compressed JSONL under CHAT_ARCHIVE_URI (a directory or s3://bucket/prefix) and deleted
+    CHAT_LIFECYCLE_ENABLED: bool = True
+    CHAT_LIFECYCLE_INTERVAL_SECONDS: float = 3600
+    SESSION_IDLE_EXPIRY_HOURS: float = 24
+    CHAT_ARCHIVE_ENABLED: bool = False
+    CHAT_ARCHIVE_AFTER_DAYS: float = 30
+    CHAT_ARCHIVE_URI: str = "archive"
+    CHAT_ARCHIVE_BATCH_SESSIONS: int = 500
+    # TTL backstops in days; 0 disables. CHAT_DATA_TTL_DAYS must exceed CHAT_ARCHIVE_AFTER_DAYS
+    GUARDRAIL_EVENTS_TTL_DAYS: int = 90
+    CHAT_DATA_TTL_DAYS: int = 0
+
+    # Bulk content ingestion (app/routers/admin/content.py): items are validated, embedded and inserted
+    # in chunks of BULK_CONTENT_CHUNK_SIZE with up to BULK_CONTENT_CONCURRENCY chunks in flight
+    BULK_CONTENT_CHUNK_SIZE: int = 100
+    BULK_CONTENT_CONCURRENCY: int = 4
+
+    # Conversation analytics rollups (app/services/analytics.py): per tenant/day/language counters
+    # flushed to analytics_rollups with $inc every ANALYTICS_FLUSH_SECONDS
+    ANALYTICS_ENABLED: bool = True
+    ANALYTICS_FLUSH_SECONDS: float = 10.0
+
+    # Guardrail hit audit log, written behind the request (app/services/guardrail_events.py)
+    GUARDRAIL_EVENTS_ENABLED: bool = True
+    GUARDRAIL_EVENTS_MAX_QUEUE: int = 10000
+    GUARDRAIL_EVENTS_BATCH_SIZE: int = 500
+    GUARDRAIL_EVENTS_FLUSH_SECONDS: float = 2.0
 
     class Config:
         env_file = ".env"
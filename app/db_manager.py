@@ -75,7 +75,9 @@ class DatabaseManager:
             'app_content': db['app_content'],
             'app_guardrails': db['app_guardrails'],
             'chat_sessions': db['chat_sessions'],
-            'chat_messages': db['chat_messages']
+            'chat_messages': db['chat_messages'],
+            'guardrail_events': db['guardrail_events'],
+            'chat_archives': db['chat_archives']
         }
 
     async def close_app_connection(self, mongodb_connection_string: str):
@@ -7,16 +7,44 @@ from .routers.admin import qna as client_qna_router
 from .routers.admin import notes as client_notes_router
 from .routers.admin import urls as client_urls_router
 from .routers.admin import documents as client_documents_router
+from .routers.admin import content as client_content_router
 from .routers.admin import guardrail as client_guardrail_router
 # from .routers.admin import reindex as client_train_router  # Commented out train model API
 from .routers.admin import settings as client_settings_router
+from .routers.admin import metrics as admin_metrics_router
+from .routers.admin import usage as client_usage_router
+from .routers.admin import analytics as client_analytics_router
 from .routers import chat as chat_router
+from .services.gemini_client import close_http_client
+from .services.tokens import token_accountant
+from .services.analytics import conversation_analytics
+from .services.guardrail_events import guardrail_events
+from .services.persistence import turn_writer
+from .services.session_cache import session_cache
+from .services.lifecycle import chat_lifecycle
+from .config import settings
 
 
 # Lifespan context to ensure async resources are managed for testing
 @asynccontextmanager
 async def lifespan(app):
+    token_accountant.start()
+    if settings.ANALYTICS_ENABLED:
+        conversation_analytics.start()
+    guardrail_events.start()
+    turn_writer.start()
+    session_cache.start()
+    if settings.CHAT_LIFECYCLE_ENABLED:
+        chat_lifecycle.start()
     yield
+    await chat_lifecycle.stop()
+    # Deferred session updates go through the turn writer, so drain the cache first
+    await session_cache.stop()
+    await turn_writer.stop()
+    await token_accountant.stop()
+    await conversation_analytics.stop()
+    await guardrail_events.stop()
+    await close_http_client()
 
 app = FastAPI(title="Chatbot Platform API", lifespan=lifespan)
 
@@ -28,9 +56,13 @@ app.include_router(client_qna_router.router)
 app.include_router(client_notes_router.router)
 app.include_router(client_urls_router.router)
 app.include_router(client_documents_router.router)
+app.include_router(client_content_router.router)
 app.include_router(client_guardrail_router.router)
 # app.include_router(client_train_router.router)  # Commented out train model API
 app.include_router(client_settings_router.router)
+app.include_router(admin_metrics_router.router)
+app.include_router(client_usage_router.router)
+app.include_router(client_analytics_router.router)
 app.include_router(chat_router.router)
 
 @app.get("/")
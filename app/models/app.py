@@ -1,7 +1,11 @@
 # app/models/app.py
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
+from app.models.settings import IntentSettings, LanguageDetectionSettings, ModelRoutingSettings
+
+# Typed per-app settings; stored with only the fields sent so the rest keep their defaults
+SETTINGS_FIELDS = ("modelRouting", "intents", "languageDetection")
 
 class AppModel(BaseModel):
     id: Optional[str] = Field(
@@ -18,6 +22,11 @@ class AppModel(BaseModel):
         default_factory=lambda: {"en": "You're welcome!"},
         example={"en": "You're welcome!", "es": "¡De nada!"}
     )
+    fallbackMessage: Optional[Dict[str, str]] = Field(
+        None,
+        example={"en": "I'm having trouble answering right now. Please try again in a moment."},
+        description="Sent instead of an LLM answer while the upstream model is unavailable"
+    )
     defaultLanguage: str = Field(..., example="en")
     availableLanguages: List[str] = Field(..., example=["en", "es"])
     googleApiKey: Optional[str] = Field(None)
@@ -26,5 +35,34 @@ class AppModel(BaseModel):
         example="mongodb://localhost:27017/app_db_name",
         description="MongoDB connection string for this app's data storage"
     )
+    modelRouting: Optional[ModelRoutingSettings] = Field(
+        None,
+        example={"enabled": True, "tiers": {"simple": {"model": "gemini-1.5-flash-8b", "maxOutputTokens": 256}}},
+        description="Per-app overrides for tiered model routing"
+    )
+    intents: Optional[IntentSettings] = Field(
+        None,
+        example={"greeting": {"phrases": ["hi", "hello"], "responses": {"en": "Hi! How can I help?"}}, "handoff": {"phrases": ["talk to a human"]}},
+        description="Per-app greeting/thanks/language_switch/handoff phrases answered without the LLM"
+    )
+    languageDetection: Optional[LanguageDetectionSettings] = Field(
+        None,
+        example={"enabled": True, "minChars": 15, "minConfidence": 0.9},
+        description="Automatic switching of the session language among availableLanguages"
+    )
     createdAt: datetime = Field(default_factory=datetime.utcnow, example="2025-08-23T12:00:00Z")
     updatedAt: datetime = Field(default_factory=datetime.utcnow, example="2025-08-23T12:00:00Z")
+
+    def document(self, **kwargs) -> Dict[str, Any]:
+        """The app as stored: dict(by_alias=True, **kwargs), with nested settings holding only the fields sent."""
+        doc = self.dict(by_alias=True, **kwargs)
+        for field in SETTINGS_FIELDS:
+            value = getattr(self, field)
+            if field in doc and value is not None:
+                doc[field] = value.dict(exclude_unset=True)
+        return doc
+
+class AppRecord(AppModel):
+    """An app as read back; the cache version counters are only written by the server."""
+    contentVersion: int = Field(0, description="Bumped on every knowledge base change; used to invalidate caches")
+    guardrailVersion: int = Field(0, description="Bumped on every guardrail change; used to invalidate caches")
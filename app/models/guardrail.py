@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Literal
 from datetime import datetime
 
 class GuardrailModel(BaseModel):
@@ -29,3 +29,34 @@ class GuardrailModel(BaseModel):
 				"updatedAt": "2025-08-23T12:00:00Z"
 			}
 		}
+
+class CandidateRule(BaseModel):
+	id: Optional[str] = Field(alias="_id", default=None)
+	ruleName: Optional[str] = None
+	ruleType: str
+	pattern: str
+	action: str = "block_input"
+	responseMessage: Dict[str, str] = Field(default_factory=dict)
+
+class GuardrailEvaluateRequest(BaseModel):
+	rules: List[CandidateRule]
+	# Corpus: inline texts, or the tenant's chat_messages from the last `days` days
+	texts: Optional[List[str]] = None
+	direction: Literal["input", "output"] = Field("input", description="Direction for inline texts")
+	days: Optional[int] = Field(None, ge=1, le=365)
+	sender: Optional[Literal["user", "ai"]] = Field("user", description="user, ai, or null for both when reading chat_messages")
+	limit: int = Field(100000, ge=1, le=1000000)
+	batchSize: int = Field(500, ge=1, le=10000)
+	sampleSize: int = Field(5, ge=0, le=50)
+
+	class Config:
+		json_schema_extra = {
+			"example": {
+				"rules": [
+					{"ruleName": "Crypto scams", "ruleType": "regex", "pattern": "fr[e3]{2}\\s*crypto", "action": "block_input"},
+					{"ruleName": "Refund mentions", "ruleType": "blacklist_phrase", "pattern": "refund", "action": "log_only"}
+				],
+				"days": 7,
+				"sender": "user"
+			}
+		}
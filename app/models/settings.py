@@ -0,0 +1,92 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+# Per-app settings bodies. Every field is optional and only the fields sent are
+# stored, overlaying the defaults; unknown keys are rejected so typos surface as 422s.
+
+class TierConfig(BaseModel):
+	model: str = Field(None, min_length=1, example="gemini-1.5-flash-8b")
+	maxOutputTokens: int = Field(None, gt=0, example=256)
+	# null means no extra trimming for the tier
+	contextTokens: Optional[int] = Field(None, ge=0, example=2000)
+	historyTokens: Optional[int] = Field(None, ge=0, example=400)
+
+	class Config:
+		extra = "forbid"
+
+class RoutingTiers(BaseModel):
+	simple: TierConfig = None
+	standard: TierConfig = None
+	complex: TierConfig = None
+
+	class Config:
+		extra = "forbid"
+
+class RoutingThresholds(BaseModel):
+	simpleQnaSimilarity: float = Field(None, ge=-1, le=1)
+	simpleMaxWords: int = Field(None, ge=0)
+	complexMinWords: int = Field(None, ge=0)
+	complexMinQuestions: int = Field(None, ge=1)
+	complexMaxRetrievalScore: float = Field(None, ge=-1, le=1)
+
+	class Config:
+		extra = "forbid"
+
+class ModelRoutingSettings(BaseModel):
+	enabled: bool = None
+	tiers: RoutingTiers = None
+	thresholds: RoutingThresholds = None
+
+	class Config:
+		extra = "forbid"
+		schema_extra = {
+			"example": {
+				"enabled": True,
+				"tiers": {"simple": {"model": "gemini-1.5-flash-8b", "maxOutputTokens": 256}},
+				"thresholds": {"simpleMaxWords": 8}
+			}
+		}
+
+class PhraseIntent(BaseModel):
+	phrases: List[str] = None
+	# language code -> reply
+	responses: Dict[str, str] = None
+
+	class Config:
+		extra = "forbid"
+
+class LanguageSwitchIntent(BaseModel):
+	# phrase -> language code
+	phrases: Dict[str, str] = None
+	responses: Dict[str, str] = None
+
+	class Config:
+		extra = "forbid"
+
+class IntentSettings(BaseModel):
+	greeting: PhraseIntent = None
+	thanks: PhraseIntent = None
+	language_switch: LanguageSwitchIntent = None
+	handoff: PhraseIntent = None
+	maxTrivialTokens: int = Field(None, ge=1)
+
+	class Config:
+		extra = "forbid"
+		schema_extra = {
+			"example": {
+				"greeting": {"phrases": ["hi", "hello"], "responses": {"en": "Hi! How can I help?"}},
+				"language_switch": {"phrases": {"auf deutsch": "de"}},
+				"handoff": {"phrases": ["talk to a human"]}
+			}
+		}
+
+class LanguageDetectionSettings(BaseModel):
+	enabled: bool = None
+	minChars: int = Field(None, ge=0)
+	minConfidence: float = Field(None, ge=0, le=1)
+
+	class Config:
+		extra = "forbid"
+		schema_extra = {
+			"example": {"enabled": True, "minChars": 15, "minConfidence": 0.9}
+		}
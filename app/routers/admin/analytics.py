@@ -0,0 +1,59 @@
+# app/routers/admin/analytics.py
+
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, Optional
+import datetime
+from app.services.analytics import COUNTERS, conversation_analytics, utc_day
+
+router = APIRouter(prefix="/api/v1/client/app/{app_id}/analytics", tags=["Client Analytics"])
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 366
+
+def _parse_day(value: str, name: str) -> datetime.date:
+	try:
+		return datetime.date.fromisoformat(value)
+	except ValueError:
+		raise HTTPException(status_code=400, detail=f"{name} must be a YYYY-MM-DD date")
+
+def _rates(counts: Dict[str, int]) -> Dict[str, float]:
+	# Every numerator counts at most once per turn, so each rate stays within 0..1
+	turns = counts["turns"]
+	rate = lambda field: round(counts[field] / turns, 4) if turns else 0.0
+	return {
+		"guardrailInputRate": rate("guardrailInputTriggers"),
+		"guardrailOutputRate": rate("guardrailOutputTriggers"),
+		"fastPathRate": rate("fastPathHits"),
+	}
+
+# GET /api/v1/client/app/{app_id}/analytics?start=2024-06-01&end=2024-06-30
+@router.get("", response_model=dict)
+async def get_analytics(app_id: str, start: Optional[str] = Query(None, description="First UTC day, YYYY-MM-DD"), end: Optional[str] = Query(None, description="Last UTC day, YYYY-MM-DD (default today)")):
+	end_day = _parse_day(end, "end") if end else datetime.date.fromisoformat(utc_day())
+	start_day = _parse_day(start, "start") if start else end_day - datetime.timedelta(days=DEFAULT_RANGE_DAYS - 1)
+	if start_day > end_day or (end_day - start_day).days >= MAX_RANGE_DAYS:
+		raise HTTPException(status_code=400, detail=f"start must not be after end, and the range is at most {MAX_RANGE_DAYS} days")
+	start, end = start_day.isoformat(), end_day.isoformat()
+
+	# One rollup document per day and language, so this reads days x languages documents at most
+	rollups = await conversation_analytics.collection.find({"appId": app_id, "day": {"$gte": start, "$lte": end}}).to_list(None)
+	rows = [(r["day"], r["language"], r) for r in rollups]
+	# Include counters recorded by this worker but not flushed yet
+	rows += [(day, language, counts) for (day, language), counts in conversation_analytics.pending(app_id).items() if start <= day <= end]
+
+	days: Dict[str, Dict] = {}
+	totals = dict.fromkeys(COUNTERS, 0)
+	for day, language, counts in rows:
+		entry = days.setdefault(day, {"day": day, **dict.fromkeys(COUNTERS, 0), "languages": {}})
+		by_language = entry["languages"].setdefault(language, dict.fromkeys(COUNTERS, 0))
+		for field in COUNTERS:
+			value = counts.get(field, 0)
+			entry[field] += value
+			by_language[field] += value
+			totals[field] += value
+	return {
+		"start": start,
+		"end": end,
+		"totals": {**totals, **_rates(totals)},
+		"days": [{**days[day], **_rates(days[day])} for day in sorted(days)],
+	}
@@ -1,25 +1,29 @@
 # app/routers/admin/app.py
 import uuid
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from app.db import apps_collection
-from ...models.app import AppModel
+from app.config import settings
+from app.utils.chat_messages import LAYOUT_FIELD
+from app.utils.pagination import MAX_PAGE_SIZE, paginate
+from ...models.app import AppModel, AppRecord
 
 router = APIRouter(prefix="/api/v1/admin/app", tags=["Admin App - Apps"])
 
 @router.post("/")
 async def create_app(app: AppModel):
-	doc = app.dict(by_alias=True)
+	doc = app.document()
 	doc["_id"] = str(uuid.uuid4())
+	# New tenants start in the configured chat_messages layout; existing ones move via scripts/migrate_chat_messages.py
+	doc[LAYOUT_FIELD] = settings.CHAT_MESSAGES_LAYOUT
 	await apps_collection.insert_one(doc)
 	return {"id": doc["_id"]}
 
-from typing import List
+from typing import List, Optional
 
-@router.get("/", response_model=List[AppModel])
-async def list_apps():
-	apps = await apps_collection.find().to_list(100)
-	print("DEBUG: MongoDB returned:", apps)
-	return apps if apps else []
+@router.get("/", response_model=List[AppRecord])
+async def list_apps(request: Request, after: Optional[str] = Query(None, description="Last _id of the previous page"), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+	# Keyset pages ordered by _id, or every app as NDJSON; rows keep the AppRecord shape
+	return await paginate(request, apps_collection, {}, after, limit, lambda a: AppRecord(**a).document())
 
 @router.get("/{app_id}")
 async def get_app(app_id: str):
@@ -31,7 +35,7 @@ async def get_app(app_id: str):
 @router.put("/{app_id}")
 async def update_app(app_id: str, app: AppModel):
 	update_result = await apps_collection.update_one(
-		{"_id": app_id}, {"$set": app.dict(exclude_unset=True, by_alias=True)}
+		{"_id": app_id}, {"$set": app.document(exclude_unset=True)}
 	)
 	if update_result.modified_count == 0:
 		raise HTTPException(status_code=404, detail="App not found or data unchanged")
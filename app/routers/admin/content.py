@@ -0,0 +1,255 @@
+"""
+Bulk content ingestion.
+
+POST /api/v1/client/app/{app_id}/content:bulk takes a JSON array or NDJSON
+(Content-Type: application/x-ndjson) of items such as
+{"contentType": "qa", "question": ..., "answer": ..., "language": "en"}.
+Each item is validated with the model used by the single-item endpoint, then
+embedded and inserted in chunks of BULK_CONTENT_CHUNK_SIZE, with at most
+BULK_CONTENT_CONCURRENCY chunks in flight. The body is parsed as it arrives, so
+memory stays bounded by the chunks in flight rather than the import size.
+"""
+import asyncio
+import codecs
+import json
+import re
+from typing import AsyncIterator, Dict, List, Tuple
+from fastapi import APIRouter, Request
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from app.config import settings
+from app.db import app_collection
+from app.models.content import QnAContent, NoteContent, URLContent, DocumentContent
+from app.services.embedding import generate_embeddings
+from app.utils.database import get_app_and_collections, bump_app_version, CONTENT_VERSION_FIELD
+from app.utils.helpers import get_valid_api_key, build_doc_dict, extract_pdf_text_from_document
+from app.utils.pagination import NDJSON_MEDIA_TYPE
+
+router = APIRouter(prefix="/api/v1/client/app/{app_id}", tags=["Client Content"])
+
+CONTENT_MODELS = {
+	"qa": QnAContent,
+	"note": NoteContent,
+	"url": URLContent,
+	"document": DocumentContent,
+}
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"\s*")
+# Characters that matter when finding the end of an array element
+_STRUCTURE = re.compile(r'["\\\[\]{}]')
+_STRING_END = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r"[\s,\]]")
+
+
+async def _ndjson_items(stream) -> AsyncIterator:
+	"""Yields one parsed object (or the ValueError) per non-empty line."""
+	buffer = b""
+	async for chunk in stream:
+		buffer += chunk
+		*lines, buffer = buffer.split(b"\n")
+		for line in lines:
+			if line.strip():
+				try:
+					yield json.loads(line)
+				except ValueError as e:
+					yield e
+	if buffer.strip():
+		try:
+			yield json.loads(buffer)
+		except ValueError as e:
+			yield e
+
+
+def _element_end(buffer: str, start: int, state: Dict):
+	"""
+	Scans the element at buffer[start:] from where the last call stopped and
+	returns its end, or None if it is not complete yet. `state` carries the scan
+	position, bracket depth and whether the scan is inside a string, so every
+	character is looked at once however many chunks the element spans.
+	"""
+	pos = max(state["pos"], start)
+	if buffer[start] not in '[{"':
+		match = _SCALAR_END.search(buffer, pos)
+		state["pos"] = match.start() if match else len(buffer)
+		return match.start() if match else None
+	while True:
+		match = (_STRING_END if state["inString"] else _STRUCTURE).search(buffer, pos)
+		if not match:
+			state["pos"] = len(buffer)
+			return None
+		char, pos = match.group(), match.end()
+		if char == "\\":
+			if pos == len(buffer):
+				# The escaped character is in the next chunk
+				state["pos"] = match.start()
+				return None
+			pos += 1
+			continue
+		if char == '"':
+			state["inString"] = not state["inString"]
+		elif char in "[{":
+			state["depth"] += 1
+		else:
+			state["depth"] -= 1
+		if not state["inString"] and state["depth"] == 0:
+			return pos
+
+
+async def _json_array_items(stream) -> AsyncIterator:
+	"""
+	Yields the elements of a top-level JSON array as the body streams in. Each
+	element is decoded once it is complete, so parsing stays linear in the body
+	size; an element that is complete but not valid JSON is yielded as its
+	ValueError and parsing goes on with the next one.
+	"""
+	buffer, start, started = "", 0, False
+	state = {"pos": 0, "depth": 0, "inString": False}
+	# Chunks may split a multi-byte character
+	decode = codecs.getincrementaldecoder("utf-8")().decode
+	async for chunk in stream:
+		if start:
+			# Drop what has been parsed once per chunk, not once per element
+			buffer, state["pos"], start = buffer[start:], state["pos"] - start, 0
+		buffer += decode(chunk)
+		while True:
+			start = _WHITESPACE.match(buffer, start).end()
+			if start == len(buffer):
+				break
+			if not started:
+				if buffer[start] != "[":
+					yield ValueError("Body must be a JSON array or NDJSON")
+					return
+				start, started = start + 1, True
+				continue
+			if buffer[start] in ",]":
+				if buffer[start] == "]":
+					return
+				start += 1
+				continue
+			end = _element_end(buffer, start, state)
+			if end is None:
+				# Incomplete element; wait for more of the body
+				break
+			try:
+				yield _decoder.decode(buffer[start:end])
+			except ValueError as e:
+				yield e
+			start, state = end, {"pos": 0, "depth": 0, "inString": False}
+	if buffer[start:].strip():
+		yield ValueError("Malformed JSON array")
+
+
+def _validate(item) -> Tuple[str, object]:
+	if isinstance(item, ValueError):
+		raise ValueError(f"Malformed JSON: {item}")
+	if not isinstance(item, dict):
+		raise ValueError("Item must be an object")
+	fields = dict(item)
+	content_type = fields.pop("contentType", None)
+	model = CONTENT_MODELS.get(content_type)
+	if model is None:
+		raise ValueError(f"contentType must be one of {sorted(CONTENT_MODELS)}")
+	try:
+		return content_type, model(**fields)
+	except ValidationError as e:
+		raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+
+
+async def _embedding_text(content_type: str, content) -> Tuple[str, Dict]:
+	"""Text to embed (same as the single-item endpoints) and extra document fields."""
+	if content_type == "qa":
+		return f"{content.question} {content.answer}", {}
+	if content_type == "note":
+		return content.text, {}
+	if content_type == "url":
+		return content.url + (" " + content.description if content.description else ""), {}
+	extracted_text = await extract_pdf_text_from_document(content)
+	if not extracted_text or not extracted_text.strip():
+		raise ValueError("No text could be extracted from the PDF.")
+	return extracted_text, {"extractedText": extracted_text[:10000]}
+
+
+async def _ingest_chunk(app_id: str, api_key: str, collection, chunk: List[Tuple[int, str, object]]) -> List[Dict]:
+	results, pending = [], []
+	for index, content_type, content in chunk:
+		try:
+			text, extra = await _embedding_text(content_type, content)
+		except Exception as e:
+			results.append({"index": index, "status": "failed", "error": getattr(e, "detail", None) or str(e)})
+			continue
+		pending.append((index, content_type, content, text, extra))
+	if not pending:
+		return results
+
+	try:
+		embeddings = await generate_embeddings([p[3] for p in pending], api_key)
+	except Exception as e:
+		return results + [{"index": p[0], "status": "failed", "error": f"Embedding error: {e}"} for p in pending]
+
+	docs = [
+		build_doc_dict(app_id, content_type, content.dict(), embedding, extra=extra)
+		for (index, content_type, content, text, extra), embedding in zip(pending, embeddings)
+	]
+	write_errors = {}
+	try:
+		await collection.insert_many(docs, ordered=False)
+	except BulkWriteError as e:
+		write_errors = {err["index"]: err.get("errmsg", "write error") for err in e.details.get("writeErrors", [])}
+	except Exception as e:
+		write_errors = {i: str(e) for i in range(len(docs))}
+	for i, (p, doc) in enumerate(zip(pending, docs)):
+		if i in write_errors:
+			results.append({"index": p[0], "status": "failed", "error": write_errors[i]})
+		else:
+			results.append({"index": p[0], "status": "created", "id": doc["_id"]})
+	return results
+
+
+@router.post("/content:bulk", response_model=dict)
+async def bulk_create_content(app_id: str, request: Request):
+	app = await app_collection.find_one({"_id": app_id})
+	api_key = get_valid_api_key(app)
+	app_data, collections = await get_app_and_collections(app_id)
+	app_content_collection = collections['app_content']
+
+	ndjson = NDJSON_MEDIA_TYPE in request.headers.get("content-type", "")
+	items = (_ndjson_items if ndjson else _json_array_items)(request.stream())
+
+	results, chunk, in_flight = [], [], set()
+	chunk_size = max(1, settings.BULK_CONTENT_CHUNK_SIZE)
+	concurrency = max(1, settings.BULK_CONTENT_CONCURRENCY)
+
+	async def submit(chunk):
+		if len(in_flight) >= concurrency:
+			done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+			for task in done:
+				in_flight.discard(task)
+				results.extend(task.result())
+		in_flight.add(asyncio.create_task(_ingest_chunk(app_id, api_key, app_content_collection, chunk)))
+
+	index = 0
+	try:
+		async for item in items:
+			try:
+				content_type, content = _validate(item)
+				chunk.append((index, content_type, content))
+			except ValueError as e:
+				results.append({"index": index, "status": "invalid", "error": str(e)})
+			index += 1
+			if len(chunk) >= chunk_size:
+				await submit(chunk)
+				chunk = []
+		if chunk:
+			await submit(chunk)
+		for task in in_flight:
+			results.extend(await task)
+	finally:
+		for task in in_flight:
+			task.cancel()
+
+	results.sort(key=lambda r: r["index"])
+	counts = {status: sum(1 for r in results if r["status"] == status) for status in ("created", "invalid", "failed")}
+	if counts["created"]:
+		await bump_app_version(app_id, CONTENT_VERSION_FIELD)
+	return {**counts, "results": results}
@@ -1,8 +1,8 @@
 
 
-from fastapi import APIRouter, HTTPException, Body, UploadFile, File
+from fastapi import APIRouter, HTTPException, Body, UploadFile, File, Query, Request
 from app.db import app_collection
-from app.utils.database import get_app_and_collections
+from app.utils.database import get_app_and_collections, bump_app_version, CONTENT_VERSION_FIELD
 import base64
 def decrypt_api_key(enc_key: str) -> str:
 	try:
@@ -12,7 +12,8 @@ def decrypt_api_key(enc_key: str) -> str:
 from app.utils.helpers import get_valid_api_key, safe_generate_embedding, build_doc_dict
 from app.utils.helpers import extract_pdf_text_from_document
 from ...models.content import DocumentContent
-from typing import List
+from typing import List, Optional
+from app.utils.pagination import MAX_PAGE_SIZE, paginate
 import uuid
 
 router = APIRouter(prefix="/api/v1/client/app/{app_id}/documents", tags=["Client Documents"])
@@ -42,17 +43,18 @@ async def create_document(app_id: str, document: DocumentContent = Body(...)):
 	embedding = await safe_generate_embedding(extracted_text, api_key)
 	doc = build_doc_dict(app_id, "document", document.dict(), embedding, extra={"extractedText": extracted_text[:10000]})
 	await app_content_collection.insert_one(doc)
+	await bump_app_version(app_id, CONTENT_VERSION_FIELD)
 	return {"id": doc["_id"]}
 
  # GET /api/v1/admin/app/{app_id}/documents
 @router.get("", response_model=List[dict])
-async def list_documents(app_id: str):
+async def list_documents(app_id: str, request: Request, after: Optional[str] = Query(None, description="Last _id of the previous page"), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)):
 	# Get app-specific collections
 	app_data, collections = await get_app_and_collections(app_id)
 	app_content_collection = collections['app_content']
 
-	docs = await app_content_collection.find({"app_id": app_id, "contentType": "document"}).to_list(100)
-	return [to_dict(d) for d in docs] if docs else []
+	# Keyset pages ordered by _id, or the whole list as NDJSON
+	return await paginate(request, app_content_collection, {"app_id": app_id, "contentType": "document"}, after, limit, to_dict)
 
 
 # PUT /api/v1/admin/app/{app_id}/documents/{document_id}
@@ -79,6 +81,7 @@ async def update_document(app_id: str, document_id: str, document: DocumentConte
 	)
 	if update_result.modified_count == 0:
 		raise HTTPException(status_code=404, detail="Document not found or data unchanged")
+	await bump_app_version(app_id, CONTENT_VERSION_FIELD)
 	return {"message": "Document updated successfully"}
 
 # DELETE /api/v1/admin/app/{app_id}/documents/{document_id}
@@ -92,4 +95,5 @@ async def delete_document(app_id: str, document_id: str):
 	delete_result = await app_content_collection.delete_one({"_id": document_id, "contentType": "document", "app_id": app_id})
 	if delete_result.deleted_count == 0:
 		raise HTTPException(status_code=404, detail="Document not found")
+	await bump_app_version(app_id, CONTENT_VERSION_FIELD)
 	return {"message": "Document deleted successfully"}
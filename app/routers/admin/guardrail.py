@@ -1,9 +1,15 @@
 
 
-from fastapi import APIRouter, HTTPException, Body
-from app.utils.database import get_app_and_collections
-from ...models.guardrail import GuardrailModel
-from typing import List
+from fastapi import APIRouter, HTTPException, Body, Query, Request
+from app.utils.database import get_app_and_collections, bump_app_version, GUARDRAIL_VERSION_FIELD
+from app.utils.chat_messages import from_storage, message_filter
+from ...models.guardrail import GuardrailModel, GuardrailEvaluateRequest
+from app.services.guardrail import (
+	REGEX_RULE_TYPE, RULE_DIRECTIONS, CompiledGuardrails, evaluate_corpus, validate_regex_pattern
+)
+from typing import List, Optional
+from app.utils.pagination import MAX_PAGE_SIZE, paginate
+import datetime
 import uuid
 
 router = APIRouter(prefix="/api/v1/client/app/{app_id}/guardrails", tags=["Client Guardrail"])
@@ -16,9 +22,17 @@ def to_dict(obj):
 	# No ObjectId conversion needed; all IDs are strings
 	return obj
 
+def check_pattern(guardrail):
+	if guardrail.ruleType == REGEX_RULE_TYPE:
+		try:
+			validate_regex_pattern(guardrail.pattern)
+		except ValueError as e:
+			raise HTTPException(status_code=400, detail=f"Invalid regex pattern: {e}")
+
 # POST /api/v1/admin/app/{appId}/guardrails
 @router.post("", response_model=dict)
 async def create_guardrail(app_id: str, guardrail: GuardrailModel = Body(...)):
+	check_pattern(guardrail)
 	# Get app-specific collections
 	app_data, collections = await get_app_and_collections(app_id)
 	guardrails_collection = collections['app_guardrails']
@@ -27,17 +41,61 @@ async def create_guardrail(app_id: str, guardrail: GuardrailModel = Body(...)):
 	doc["app_id"] = app_id
 	doc["_id"] = str(uuid.uuid4())
 	await guardrails_collection.insert_one(doc)
+	await bump_app_version(app_id, GUARDRAIL_VERSION_FIELD)
 	return {"id": doc["_id"]}
 
+# POST /api/v1/client/app/{appId}/guardrails/evaluate
+@router.post("/evaluate", response_model=dict)
+async def evaluate_guardrails(app_id: str, body: GuardrailEvaluateRequest = Body(...)):
+	"""Dry-run candidate rules over inline texts or recent chat messages; nothing is saved."""
+	if (body.texts is None) == (body.days is None):
+		raise HTTPException(status_code=400, detail="Provide either texts or days")
+	rules = []
+	for i, rule in enumerate(body.rules):
+		if rule.ruleType not in RULE_DIRECTIONS:
+			raise HTTPException(status_code=400, detail=f"Unknown ruleType {rule.ruleType!r}")
+		check_pattern(rule)
+		doc = rule.dict(by_alias=True)
+		doc["_id"] = doc["_id"] or f"candidate-{i}"
+		rules.append(doc)
+	matcher = CompiledGuardrails(rules)
+
+	if body.texts is not None:
+		async def corpus():
+			for text in body.texts[:body.limit]:
+				yield {"text": text, "direction": body.direction}
+	else:
+		# Get app-specific collections
+		app_data, collections = await get_app_and_collections(app_id)
+		since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=body.days)
+		query = message_filter(collections['chat_messages_layout'], app_id, timestamp={"$gte": since})
+		if body.sender:
+			query["sender"] = body.sender
+		cursor = collections['chat_messages'].find(
+			query, {"message": 1, "sender": 1, "sessionId": 1, "meta": 1, "timestamp": 1}
+		).batch_size(body.batchSize).limit(body.limit)
+
+		async def corpus():
+			async for msg in cursor:
+				msg = from_storage(msg)
+				yield {
+					"text": msg.get("message", ""),
+					"direction": "output" if msg.get("sender") == "ai" else "input",
+					"sessionId": msg.get("sessionId"),
+					"timestamp": msg.get("timestamp"),
+				}
+
+	return await evaluate_corpus(matcher, corpus(), batch_size=body.batchSize, sample_size=body.sampleSize)
+
 # GET /api/v1/admin/app/{appId}/guardrails
 @router.get("", response_model=List[dict])
-async def list_guardrails(app_id: str):
+async def list_guardrails(app_id: str, request: Request, after: Optional[str] = Query(None, description="Last _id of the previous page"), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)):
 	# Get app-specific collections
 	app_data, collections = await get_app_and_collections(app_id)
 	guardrails_collection = collections['app_guardrails']
 
-	guards = await guardrails_collection.find({"app_id": app_id}).to_list(100)
-	return [to_dict(g) for g in guards] if guards else []
+	# Keyset pages ordered by _id, or the whole list as NDJSON
+	return await paginate(request, guardrails_collection, {"app_id": app_id}, after, limit, to_dict)
 
 # GET /api/v1/admin/app/{appId}/guardrails/{rule_id}
 @router.get("/{rule_id}", response_model=dict)
@@ -54,6 +112,7 @@ async def get_guardrail(app_id: str, rule_id: str):
 # PUT /api/v1/admin/app/{appId}/guardrails/{rule_id}
 @router.put("/{rule_id}", response_model=dict)
 async def update_guardrail(app_id: str, rule_id: str, guardrail: GuardrailModel = Body(...)):
+	check_pattern(guardrail)
 	# Get app-specific collections
 	app_data, collections = await get_app_and_collections(app_id)
 	guardrails_collection = collections['app_guardrails']
@@ -64,6 +123,7 @@ async def update_guardrail(app_id: str, rule_id: str, guardrail: GuardrailModel
 	)
 	if update_result.modified_count == 0:
 		raise HTTPException(status_code=404, detail="Guardrail not found or data unchanged")
+	await bump_app_version(app_id, GUARDRAIL_VERSION_FIELD)
 	return {"message": "Guardrail updated successfully"}
 
 # DELETE /api/v1/admin/app/{appId}/guardrails/{rule_id}
@@ -76,4 +136,5 @@ async def delete_guardrail(app_id: str, rule_id: str):
 	delete_result = await guardrails_collection.delete_one({"_id": rule_id, "app_id": app_id})
 	if delete_result.deleted_count == 0:
 		raise HTTPException(status_code=404, detail="Guardrail not found")
+	await bump_app_version(app_id, GUARDRAIL_VERSION_FIELD)
 	return {"message": "Guardrail deleted successfully"}
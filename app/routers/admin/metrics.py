@@ -0,0 +1,73 @@
+# app/routers/admin/metrics.py
+
+from fastapi import APIRouter
+from app.services.answer_cache import answer_cache
+from app.services.single_flight import llm_single_flight
+from app.services.gemini_client import gemini_health
+from app.services.context_cache import context_cache
+from app.services.model_router import routing_metrics
+from app.services.guardrail import guardrail_matchers
+from app.services.guardrail_events import guardrail_events
+from app.services.persistence import turn_writer
+from app.services.session_cache import session_cache
+from app.services.chat_processor import pipeline_metrics
+from app.services.lifecycle import chat_lifecycle
+
+router = APIRouter(prefix="/api/v1/admin/metrics", tags=["Admin Metrics"])
+
+# GET /api/v1/admin/metrics/answer-cache
+@router.get("/answer-cache", response_model=dict)
+async def get_answer_cache_metrics():
+	return answer_cache.stats()
+
+# GET /api/v1/admin/metrics/single-flight
+@router.get("/single-flight", response_model=dict)
+async def get_single_flight_metrics():
+	return llm_single_flight.stats()
+
+# GET /api/v1/admin/metrics/circuit-breakers
+@router.get("/circuit-breakers", response_model=dict)
+async def get_circuit_breaker_metrics():
+	# Keys are reported by fingerprint only
+	return gemini_health.stats()
+
+# GET /api/v1/admin/metrics/context-cache
+@router.get("/context-cache", response_model=dict)
+async def get_context_cache_metrics():
+	return context_cache.stats()
+
+# GET /api/v1/admin/metrics/model-routing
+@router.get("/model-routing", response_model=dict)
+async def get_model_routing_metrics():
+	return routing_metrics.stats()
+
+# GET /api/v1/admin/metrics/guardrails
+@router.get("/guardrails", response_model=dict)
+async def get_guardrail_metrics():
+	return guardrail_matchers.stats()
+
+# GET /api/v1/admin/metrics/guardrail-events
+@router.get("/guardrail-events", response_model=dict)
+async def get_guardrail_event_metrics():
+	return guardrail_events.stats()
+
+# GET /api/v1/admin/metrics/persistence
+@router.get("/persistence", response_model=dict)
+async def get_persistence_metrics():
+	return turn_writer.stats()
+
+# GET /api/v1/admin/metrics/session-cache
+@router.get("/session-cache", response_model=dict)
+async def get_session_cache_metrics():
+	return session_cache.stats()
+
+# GET /api/v1/admin/metrics/chat-pipeline
+@router.get("/chat-pipeline", response_model=dict)
+async def get_chat_pipeline_metrics():
+	# Per-stage latency of chat turns; compare "total" with "llm" for the overhead around the model call
+	return pipeline_metrics.stats()
+
+# GET /api/v1/admin/metrics/lifecycle
+@router.get("/lifecycle", response_model=dict)
+async def get_lifecycle_metrics():
+	return chat_lifecycle.stats()
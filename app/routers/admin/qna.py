@@ -1,8 +1,8 @@
 
 
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Query, Request
 from app.db import app_collection
-from app.utils.database import get_app_and_collections
+from app.utils.database import get_app_and_collections, bump_app_version, CONTENT_VERSION_FIELD
 import base64
 def decrypt_api_key(enc_key: str) -> str:
 	try:
@@ -11,7 +11,8 @@ def decrypt_api_key(enc_key: str) -> str:
 		return enc_key
 from app.utils.helpers import get_valid_api_key, safe_generate_embedding, build_doc_dict
 from ...models.content import QnAContent
-from typing import List
+from typing import List, Optional
+from app.utils.pagination import MAX_PAGE_SIZE, paginate
 import uuid
 
 router = APIRouter(prefix="/api/v1/client/app/{appId}/qna", tags=["Client QnA"])
@@ -37,16 +38,17 @@ async def create_qna(app_id: str, qna: QnAContent = Body(...)):
 	embedding = await safe_generate_embedding(text, api_key)
 	doc = build_doc_dict(app_id, "qa", qna.dict(), embedding)
 	await app_content_collection.insert_one(doc)
+	await bump_app_version(app_id, CONTENT_VERSION_FIELD)
 	return {"id": doc["_id"]}
 
 @router.get("", response_model=List[dict])
-async def list_qna(app_id: str):
+async def list_qna(app_id: str, request: Request, after: Optional[str] = Query(None, description="Last _id of the previous page"), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)):
 	# Get app-specific collections
 	app_data, collections = await get_app_and_collections(app_id)
 	app_content_collection = collections['app_content']
 
-	qnas = await app_content_collection.find({"app_id": app_id, "contentType": "qa"}).to_list(100)
-	return [to_dict(q) for q in qnas] if qnas else []
+	# Keyset pages ordered by _id, or the whole list as NDJSON
+	return await paginate(request, app_content_collection, {"app_id": app_id, "contentType": "qa"}, after, limit, to_dict)
 
 @router.put("/{qa_id}", response_model=dict)
 async def update_qna(app_id: str, qa_id: str, qna: QnAContent = Body(...)):
@@ -65,6 +67,7 @@ async def update_qna(app_id: str, qa_id: str, qna: QnAContent = Body(...)):
 	)
 	if update_result.modified_count == 0:
 		raise HTTPException(status_code=404, detail="QnA not found or data unchanged")
+	await bump_app_version(app_id, CONTENT_VERSION_FIELD)
 	return {"message": "QnA updated successfully"}
 
 @router.delete("/{qa_id}", response_model=dict)
@@ -77,4 +80,5 @@ async def delete_qna(app_id: str, qa_id: str):
 	delete_result = await app_content_collection.delete_one({"_id": qa_id, "contentType": "qa", "app_id": app_id})
 	if delete_result.deleted_count == 0:
 		raise HTTPException(status_code=404, detail="QnA not found")
+	await bump_app_version(app_id, CONTENT_VERSION_FIELD)
 	return {"message": "QnA deleted successfully"}
@@ -3,6 +3,7 @@
 from fastapi import APIRouter, HTTPException, Body
 from app.db import app_collection
 from typing import Dict, List
+from app.models.settings import IntentSettings, LanguageDetectionSettings, ModelRoutingSettings
 import base64
 
 router = APIRouter(prefix="/api/v1/client/app/{app_id}/settings", tags=["Client Settings"])
@@ -41,3 +42,32 @@ async def update_google_api_key(app_id: str, google_api_key: str = Body(...)):
     if update_result.modified_count == 0:
         raise HTTPException(status_code=404, detail="App not found or key unchanged")
     return {"message": "Google API key updated"}
+
+
+# Tiered model routing: {"enabled": bool, "tiers": {tier: {...}}, "thresholds": {...}}
+@router.put("/model-routing", response_model=dict)
+async def update_model_routing(app_id: str, model_routing: ModelRoutingSettings = Body(...)):
+    # Only the fields sent are stored; the rest keep their defaults
+    update_result = await app_collection.update_one({"_id": app_id}, {"$set": {"modelRouting": model_routing.dict(exclude_unset=True)}})
+    if update_result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="App not found")
+    return {"message": "Model routing updated"}
+
+
+# Intent table: {"greeting": {"phrases": [...], "responses": {lang: text}}, ..., "maxTrivialTokens": 5}
+# language_switch phrases map each phrase to a language code
+@router.put("/intents", response_model=dict)
+async def update_intents(app_id: str, intents: IntentSettings = Body(...)):
+    update_result = await app_collection.update_one({"_id": app_id}, {"$set": {"intents": intents.dict(exclude_unset=True)}})
+    if update_result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="App not found")
+    return {"message": "Intents updated"}
+
+
+# Automatic language detection: {"enabled": bool, "minChars": int, "minConfidence": float}
+@router.put("/language-detection", response_model=dict)
+async def update_language_detection(app_id: str, language_detection: LanguageDetectionSettings = Body(...)):
+    update_result = await app_collection.update_one({"_id": app_id}, {"$set": {"languageDetection": language_detection.dict(exclude_unset=True)}})
+    if update_result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="App not found")
+    return {"message": "Language detection updated"}
@@ -0,0 +1,20 @@
+# app/routers/admin/usage.py
+
+from fastapi import APIRouter, HTTPException
+from app.db import app_collection
+from app.services.tokens import token_accountant
+
+router = APIRouter(prefix="/api/v1/client/app/{app_id}/usage", tags=["Client Usage"])
+
+# GET /api/v1/client/app/{app_id}/usage
+@router.get("", response_model=dict)
+async def get_token_usage(app_id: str):
+	app = await app_collection.find_one({"_id": app_id}, {"tokenUsage": 1})
+	if not app:
+		raise HTTPException(status_code=404, detail="App not found")
+	usage = {"llmCalls": 0, "inputTokens": 0, "outputTokens": 0}
+	usage.update(app.get("tokenUsage", {}))
+	# Include totals recorded by this worker but not flushed yet
+	for field, value in token_accountant.pending(app_id).items():
+		usage[field] += value
+	return usage
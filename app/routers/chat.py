@@ -15,42 +15,126 @@ def get_url_response():
 
 
 
-async def get_llm_response(app, language, x_app_id, prompt):
-    # Use the provided prompt with context instead of empty string
-    ai_response = await call_gemma_api(app["googleApiKey"], prompt, model="gemini-1.5-flash")
+async def resolve_cached_prefix(app, x_app_id, turn, model):
+    # Name of the upstream cache holding this tenant's knowledge-base prefix, or None to send the full prompt
+    if turn is None or not turn.get("prompt_prefix"):
+        return None
+    return await context_cache.resolve(x_app_id, app["googleApiKey"], model, app.get("contentVersion", 0), turn["prompt_prefix"])
+
+async def get_llm_response(app, language, x_app_id, prompt, turn=None):
+    route = turn["route"] if turn and turn.get("route") else {"tier": "standard", **routing_config(app)["tiers"]["standard"]}
+    model, max_tokens = route["model"], route["maxOutputTokens"]
+    started = time.monotonic()
+    ai_response = None
+    cache_name = await resolve_cached_prefix(app, x_app_id, turn, model)
+    if cache_name:
+        ai_response = await call_gemma_api(app["googleApiKey"], turn["prompt_suffix"], model=model, max_tokens=max_tokens, cached_content=cache_name)
+        if isinstance(ai_response, dict) and ai_response.get("error") and not ai_response.get("unavailable"):
+            # Cache expired or evicted upstream: register again next turn, answer with the full prompt now
+            context_cache.invalidate(x_app_id, model)
+            ai_response = None
+    if ai_response is None:
+        # Use the provided prompt with context instead of empty string
+        ai_response = await call_gemma_api(app["googleApiKey"], prompt, model=model, max_tokens=max_tokens)
     if isinstance(ai_response, dict) and ai_response.get("error"):
+        if ai_response.get("unavailable") and turn is not None:
+            turn["fallback"] = True
+            return fallback_answer(app, language, x_app_id, turn)
         raise HTTPException(status_code=502, detail=ai_response)
+    record_llm_usage(x_app_id, language, turn, route, model, time.monotonic() - started, prompt, ai_response)
     return ai_response
 
-async def store_message_and_response(x_app_id, session, user_message, ai_response, language):
-    # Get app-specific collections
-    app, collections = await get_app_and_collections(x_app_id)
-    chat_messages_collection = collections['chat_messages']
-    chat_sessions_collection = collections['chat_sessions']
+def record_llm_usage(x_app_id, language, turn, route, model, seconds, prompt, ai_response):
+    usage = {"inputTokens": estimate_tokens(prompt), "outputTokens": estimate_tokens(ai_response)}
+    if turn is not None:
+        turn["usage"] = usage
+    routing_metrics.record(route["tier"], model, seconds, usage["inputTokens"], usage["outputTokens"])
+    token_accountant.record(x_app_id, usage["inputTokens"], usage["outputTokens"])
+    conversation_analytics.record(x_app_id, language, llmCalls=1, **usage)
+
+DEFAULT_FALLBACK_MESSAGE = "I'm having trouble answering right now. Please try again in a moment."
+
+def fallback_answer(app, language, x_app_id, turn):
+    # Upstream is unhealthy or out of time: serve the closest cached answer, else the app's fallback message
+    if turn.get("query_embedding") and turn.get("standalone"):
+        cached_answer = answer_cache.lookup(x_app_id, app_cache_version(app), language, turn["query_embedding"],
+                                            threshold=settings.ANSWER_CACHE_FALLBACK_THRESHOLD)
+        if cached_answer is not None:
+            return cached_answer
+    return app.get("fallbackMessage", {}).get(language, DEFAULT_FALLBACK_MESSAGE)
+
+async def get_query_embedding(app, text):
+    # Best effort: a failed embedding call only means the answer cache and routing similarity are skipped for this turn
+    if not (settings.ANSWER_CACHE_ENABLED or routing_config(app)["enabled"]) or not app.get("googleApiKey"):
+        return None
+    try:
+        # Whitespace/compatibility variants of a question share one embedding (and one single-flight key)
+        return await generate_embedding(text.clean, app["googleApiKey"])
+    except Exception as e:
+        logging.warning(f"[answer_cache] Query embedding failed for app_id={app.get('_id')}: {e}")
+        return None
+
+async def store_message_and_response(x_app_id, session, user_message, ai_response, language, usage=None):
+    # usage holds the LLM input/output tokens spent on this answer; absent for cached or canned answers
+    usage = usage or {"inputTokens": 0, "outputTokens": 0}
+    now = datetime.datetime.now(datetime.timezone.utc)
+    messages = [
+        {
+            "appId": x_app_id,
+            "sessionId": session["_id"],
+            "sender": "user",
+            "message": user_message,
+            "timestamp": now,
+            "language": language,
+            "tokens": estimate_tokens(user_message)
+        },
+        {
+            "appId": x_app_id,
+            "sessionId": session["_id"],
+            "sender": "ai",
+            "message": ai_response,
+            "timestamp": now,
+            "language": language,
+            "tokens": estimate_tokens(ai_response),
+            "inputTokens": usage["inputTokens"],
+            "outputTokens": usage["outputTokens"]
+        }
+    ]
+    update = {
+        # status: a session closed for inactivity is active again once the user returns
+        "$set": {"lastActiveAt": now, "language": language, "status": "active"},
+        "$inc": {"inputTokens": usage["inputTokens"], "outputTokens": usage["outputTokens"]},
+        # The session keeps the last few messages for prompt history; chat_messages stays the full log
+        "$push": recent_turns_push(messages)
+    }
+    # One insert_many and one session update, grouped with other turns by the turn writer;
+    # the session cache may fold the update into its coalescing window instead
+    conversation_analytics.record(x_app_id, language, messages=len(messages))
+    await turn_writer.write(x_app_id, session["_id"], messages, session_cache.record_turn(x_app_id, session["_id"], update))
+    return now
 
+async def store_canned_reply(x_app_id, session, reply, language, session_set=None):
+    # Welcome and intent replies: only the AI message is logged
     now = datetime.datetime.now(datetime.timezone.utc)
-    await chat_messages_collection.insert_one({
-        "appId": x_app_id,
-        "sessionId": session["_id"],
-        "sender": "user",
-        "message": user_message,
-        "timestamp": now,
-        "language": language
-    })
-    await chat_messages_collection.insert_one({
+    messages = [{
         "appId": x_app_id,
         "sessionId": session["_id"],
         "sender": "ai",
-        "message": ai_response,
+        "message": reply,
         "timestamp": now,
-        "language": language
-    })
-    await chat_sessions_collection.update_one({"_id": session["_id"]}, {"$set": {"lastActiveAt": now, "language": language}})
+        "language": language,
+        "tokens": estimate_tokens(reply)
+    }]
+    update = {"$set": {"lastActiveAt": now, "status": "active", **(session_set or {})}, "$push": recent_turns_push(messages)}
+    conversation_analytics.record(x_app_id, language, messages=len(messages))
+    await turn_writer.write(x_app_id, session["_id"], messages, session_cache.record_turn(x_app_id, session["_id"], update))
     return now
+
 PROMPT_SEPARATOR = "\n---\n"
 # app/routers/chat.py
-from fastapi import APIRouter, Request, Header, HTTPException, Body
-from typing import Optional, Dict
+from fastapi import APIRouter, Request, Response, Header, HTTPException, Body, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from typing import Optional, Dict, Union
 from pydantic import BaseModel, Field
 class ChatMessageRequest(BaseModel):
     message: str = Field(..., example="Hello, how can I use your service?")
@@ -63,11 +147,33 @@ class ChatMessageResponse(BaseModel):
     language: str = Field(..., example="en")
 from uuid import uuid4
 from app.db import app_collection
-from app.utils.database import get_app_and_collections
+from app.utils.database import get_app_and_collections, GUARDRAIL_VERSION_FIELD
+from app.utils.chat_messages import message_filter
+from app.utils.text import NormalizedText
+from app.services.embedding import generate_embedding
+from app.services.answer_cache import answer_cache, app_cache_version, is_standalone_turn
+from app.services.llm import call_gemma_api, stream_gemma_api
+from app.services.context_cache import context_cache
+from app.services.conversation import RECENT_TURNS_FIELD, fit_history, messages_after, recent_turn, recent_turns_push, recent_turns_size, update_rolling_summary
+from app.services.model_router import choose_route, routing_config, routing_metrics, trim_context
+from app.services.tokens import estimate_tokens, token_accountant
+from app.services.analytics import conversation_analytics
+from app.services.guardrail import CompiledGuardrails, StreamingGuardrail, guardrail_matchers
+from app.services.guardrail_events import record_guardrail_hits
+from app.services.intents import detect_language, intent_response, intent_tables
+from app.services.persistence import turn_writer
+from app.services.session_cache import session_cache
+from app.services.resilience import CircuitOpenError, DeadlineExceeded, start_latency_budget
+from app.services.chat_processor import TurnPipeline, pipeline_metrics
+from app.config import settings
+import asyncio
 import base64
+from contextlib import aclosing
 import httpx
+import json
 import logging
 import datetime
+import time
 
 router = APIRouter(prefix="/api/v1/client/chat", tags=["Client Chat"])
 
@@ -75,32 +181,33 @@ router = APIRouter(prefix="/api/v1/client/chat", tags=["Client Chat"])
 def decrypt_api_key(enc_key: str) -> str:
     return base64.b64decode(enc_key.encode()).decode()
 
-def detect_language_switch(user_message_lower, switch_phrases):
-    for phrase, lang in switch_phrases:
-        if phrase in user_message_lower:
-            return lang
-    return None
-
-def detect_thank_you(user_message_lower, thank_you_phrases):
-    return any(phrase in user_message_lower for phrase in thank_you_phrases)
-
-def build_prompt(user_message, qna_context, note_context, url_context, doc_context, last_msgs):
-    prompt = (
+def build_prompt_prefix(qna_context, note_context, url_context, doc_context):
+    # Identical for every message of a tenant until its content changes, so it can be cached upstream
+    prefix = (
         "You are an expert assistant. Answer the user's question strictly using ONLY the provided context below. "
         "If the answer is not present, reply 'I don't know based on the provided context.'\n"
-        f"User Question: {user_message}\n"
     )
     if qna_context:
-        prompt += "\nQ&A Knowledge Base:\n" + PROMPT_SEPARATOR.join(qna_context)
+        prefix += "\nQ&A Knowledge Base:\n" + PROMPT_SEPARATOR.join(qna_context)
     if note_context:
-        prompt += "\nNotes:\n" + PROMPT_SEPARATOR.join(note_context)
+        prefix += "\nNotes:\n" + PROMPT_SEPARATOR.join(note_context)
     if url_context:
-        prompt += "\nURLs:\n" + PROMPT_SEPARATOR.join(url_context)
+        prefix += "\nURLs:\n" + PROMPT_SEPARATOR.join(url_context)
     if doc_context:
-        prompt += "\nDocuments:\n" + PROMPT_SEPARATOR.join(doc_context)
+        prefix += "\nDocuments:\n" + PROMPT_SEPARATOR.join(doc_context)
+    return prefix
+
+def build_prompt_suffix(user_message, last_msgs, summary=None):
+    suffix = ""
+    if summary:
+        suffix += "\n\nConversation Summary:\n" + summary
     if last_msgs:
-        prompt += "\n\nChat History:\n" + "\n".join([m["message"] for m in last_msgs])
-    return prompt
+        suffix += "\n\nChat History:\n" + "\n".join([m["message"] for m in last_msgs])
+    suffix += f"\n\nUser Question: {user_message}\n"
+    return suffix
+
+def build_prompt(user_message, qna_context, note_context, url_context, doc_context, last_msgs):
+    return build_prompt_prefix(qna_context, note_context, url_context, doc_context) + build_prompt_suffix(user_message, last_msgs)
 
 async def get_app(app_id: str):
     app = await app_collection.find_one({"_id": app_id})
@@ -115,6 +222,12 @@ async def get_app(app_id: str):
     return app
 
 async def get_session(app_id: str, session_id: Optional[str]):
+    # Active conversations are served from the in-process session cache
+    if session_id:
+        cached = session_cache.get(app_id, session_id)
+        if cached is not None:
+            return cached
+
     # Get app-specific collections
     app, collections = await get_app_and_collections(app_id)
     chat_sessions_collection = collections['chat_sessions']
@@ -122,7 +235,7 @@ async def get_session(app_id: str, session_id: Optional[str]):
     if session_id:
         session = await chat_sessions_collection.find_one({"_id": session_id, "appId": app_id})
         if session:
-            return session
+            return await session_cache.put(app_id, session)
     # Create new session
     new_session_id = str(uuid4())
     now = datetime.datetime.now(datetime.timezone.utc)
@@ -132,48 +245,34 @@ async def get_session(app_id: str, session_id: Optional[str]):
         "startedAt": now,
         "lastActiveAt": now,
         "status": "active",
-        "language": None
+        "language": None,
+        RECENT_TURNS_FIELD: []
     }
     await chat_sessions_collection.insert_one(session)
-    return session
-
+    return await session_cache.put(app_id, session)
 
-def _guardrail_result(blocked, rule, response_msg):
-    return {"blocked": blocked, "ruleId": str(rule["_id"]), "message": response_msg}
 
 def _evaluate_rule(rule, text, language, direction):
-    rule_type = rule.get("ruleType")
-    pattern = rule.get("pattern", "")
-    action = rule.get("action", "block_input")
-    response_msg = rule.get("responseMessage", {}).get(language, "Blocked by guardrail.")
-    if rule_type == "blacklist_phrase" and pattern in text:
-        if action in ("block_input", "override_response"):
-            return _guardrail_result(True, rule, response_msg)
-        elif action == "log_only":
-            return _guardrail_result(False, rule, response_msg)
-    if rule_type == "topic_restriction" and pattern in text:
-        if action in ("block_input", "override_response"):
-            return _guardrail_result(True, rule, response_msg)
-        elif action == "log_only":
-            return _guardrail_result(False, rule, response_msg)
-    if direction == "output" and rule_type == "response_filter" and pattern in text:
-        if action in ("override_response", "block_input"):
-            return _guardrail_result(True, rule, response_msg)
-        elif action == "log_only":
-            return _guardrail_result(False, rule, response_msg)
-    return None
-
-async def apply_guardrails(app_id: str, text: str, language: str, direction: str = "input"):
+    """Evaluate a single rule; None when it doesn't match."""
+    result = CompiledGuardrails([rule]).evaluate(text, language, direction)
+    if "ruleId" not in result:
+        return None
+    result.pop("logged", None)
+    return result
+
+async def get_guardrail_matcher(app_id: str):
     # Get app-specific collections
     app, collections = await get_app_and_collections(app_id)
-    app_guardrails_collection = collections['app_guardrails']
+    return await guardrail_matchers.get(
+        app_id, app.get(GUARDRAIL_VERSION_FIELD, 0), collections['app_guardrails']
+    )
 
-    guardrails = await app_guardrails_collection.find({"app_id": app_id, "isActive": True}).to_list(100)
-    for rule in guardrails:
-        result = _evaluate_rule(rule, text, language, direction)
-        if result is not None:
-            return result
-    return {"blocked": False}
+async def apply_guardrails(app_id: str, text: Union[str, NormalizedText], language: str, direction: str = "input", session_id: Optional[str] = None):
+    matcher = await get_guardrail_matcher(app_id)
+    result = matcher.evaluate(text, language, direction)
+    # Hits go to the guardrail_events audit log off the request path
+    record_guardrail_hits(app_id, session_id, direction, result, text, language)
+    return result
 
 async def get_relevant_content(app_id: str, limit: int = 5):
     # Vector similarity search using embedding (cosine similarity)
@@ -185,142 +284,278 @@ async def get_relevant_content(app_id: str, limit: int = 5):
     app, collections = await get_app_and_collections(app_id)
     app_content_collection = collections['app_content']
 
-    # Always include all Q&A, Note, and URL entries for the app
-    qnas = await app_content_collection.find({"appId": app_id, "contentType": "qa"}).to_list(100)
-    notes = await app_content_collection.find({"appId": app_id, "contentType": "note"}).to_list(100)
-    urls = await app_content_collection.find({"appId": app_id, "contentType": "url"}).to_list(100)
-    # For documents, always fetch by updatedAt (embedding parameter removed)
-    docs = await app_content_collection.find({"appId": app_id, "contentType": "document"}).sort("updatedAt", -1).to_list(limit)
+    # Always include all Q&A, Note, and URL entries for the app; the four reads run concurrently
+    qnas, notes, urls, docs = await asyncio.gather(
+        app_content_collection.find({"appId": app_id, "contentType": "qa"}).to_list(100),
+        app_content_collection.find({"appId": app_id, "contentType": "note"}).to_list(100),
+        app_content_collection.find({"appId": app_id, "contentType": "url"}).to_list(100),
+        # For documents, always fetch by updatedAt (embedding parameter removed)
+        app_content_collection.find({"appId": app_id, "contentType": "document"}).sort("updatedAt", -1).to_list(limit)
+    )
     # Combine all for context
     return qnas + notes + urls + docs
 
-async def get_last_messages(app_id: str, session_id: str, limit: int = 10):
-    # Get app-specific collections
-    app, collections = await get_app_and_collections(app_id)
-    chat_messages_collection = collections['chat_messages']
-
-    msgs = await chat_messages_collection.find({"appId": app_id, "sessionId": session_id}).sort("timestamp", -1).to_list(limit)
-    return list(reversed(msgs))
-
-async def call_gemma_api(api_key: str, prompt: str, model: str = "gemini-1.5-flash", temperature: float = 0.2, max_tokens: int = 512):
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-    payload = {
-        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": temperature, "maxOutputTokens": max_tokens}
-    }
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(url, json=payload)
-        try:
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as exc:
-            # Return error details for 400/404
-            return {"error": f"Gemma API error: {exc.response.status_code} {exc.response.reason_phrase}", "details": exc.response.text}
-        data = resp.json()
-        return data["candidates"][0]["content"]["parts"][0]["text"]
-
-@router.post("/message", response_model=ChatMessageResponse)
-async def chat_message(request: Request, body: ChatMessageRequest = Body(...), x_app_id: str = Header(...), x_session_id: Optional[str] = Header(None)):
-    logging.info(f"[chat_message] Called with app_id={x_app_id} session_id={x_session_id} message={body.message}")
-    app = await get_app(x_app_id)
-    session = await get_session(x_app_id, x_session_id)
+async def get_last_messages(app_id: str, session: Dict, limit: int = 10, after=None):
+    # History comes with the session read: the recentTurns ring is pushed in the same write as lastActiveAt
+    recent = session.get(RECENT_TURNS_FIELD)
+    if recent is None:
+        recent = await backfill_recent_turns(app_id, session)
+    return messages_after(recent, after)[-limit:]
 
-    # Get app-specific collections
-    app_data, collections = await get_app_and_collections(x_app_id)
-    chat_sessions_collection = collections['chat_sessions']
-    chat_messages_collection = collections['chat_messages']
+async def backfill_recent_turns(app_id: str, session: Dict):
+    # Sessions started before the ring existed: fill it once from the full message log
+    app, collections = await get_app_and_collections(app_id)
+    query = message_filter(collections['chat_messages_layout'], app_id, session["_id"])
+    msgs = await collections['chat_messages'].find(query).sort("timestamp", -1).to_list(recent_turns_size())
+    recent = [recent_turn(m) for m in reversed(msgs)]
+    # A turn stored meanwhile already created the field; don't overwrite it
+    await collections['chat_sessions'].update_one({"_id": session["_id"], RECENT_TURNS_FIELD: {"$exists": False}}, {"$set": {RECENT_TURNS_FIELD: recent}})
+    session[RECENT_TURNS_FIELD] = recent
+    return recent
+
+def _sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _chat_response(session, message, language, guardrail_result=None):
+    guardrail_result = guardrail_result or {"blocked": False}
+    return ChatMessageResponse(
+        sessionId=session["_id"],
+        message=message,
+        guardrailTriggered=guardrail_result["blocked"],
+        guardrailRuleId=guardrail_result.get("ruleId"),
+        language=language
+    )
 
-    language = session.get("language") or app.get("defaultLanguage", "en")
-    user_message = body.message
+async def prepare_chat_turn(x_app_id: str, x_session_id: Optional[str], user_message: str):
+    """
+    Runs every step of a chat turn that happens before the LLM call.
+
+    Returns:
+        Dict with app, session, language, text (the NormalizedText of the message),
+        early_response, prompt, query_embedding and pipeline (the TurnPipeline
+        holding per-stage timings; the caller adds its own stages and finishes it).
+        early_response is set when the turn is answered without the LLM (welcome,
+        acknowledgment, blocked input, answer cache hit).
+    """
+    pipeline = TurnPipeline(pipeline_metrics)
+    try:
+        return await _prepare_chat_turn(pipeline, x_app_id, x_session_id, user_message)
+    finally:
+        # Stages still running here belong to a turn that ended early (blocked, cache hit, error)
+        pipeline.cancel()
+
+async def _prepare_chat_turn(pipeline: TurnPipeline, x_app_id: str, x_session_id: Optional[str], user_message: str):
     if not user_message:
         raise HTTPException(status_code=400, detail="Message required")
+    # The session read doesn't depend on the app document, so both go out at once
+    pipeline.start("session", get_session(x_app_id, x_session_id))
+    app = await pipeline.run("app", get_app(x_app_id))
+    session = await pipeline.result("session")
+    turn = {"app": app, "session": session, "early_response": None, "prompt": None, "query_embedding": None, "pipeline": pipeline}
 
-    # 1. Language switch detection (simple keyword-based)
-    switch_phrases = [
-        ("switch to spanish", "es"),
-        ("speak in spanish", "es"),
-        ("switch to french", "fr"),
-        ("speak in french", "fr"),
-        ("switch to english", "en"),
-        ("speak in english", "en")
-    ]
-    user_message_lower = user_message.lower()
-    lang_switch = detect_language_switch(user_message_lower, switch_phrases)
+    language = session.get("language") or app.get("defaultLanguage", "en")
+    # Normalized once; every stage below reads its views instead of re-deriving strings
+    turn["text"] = text = NormalizedText(user_message)
+
+    # 1. Intent table (greeting, thanks, language switch, handoff) and automatic language detection
+    intent_table = intent_tables.get(x_app_id, app)
+    intents = intent_table.match(text)
+    lang_switch = intents.get("language_switch") or detect_language(app, text, language)
     if lang_switch:
         language = lang_switch
-        await chat_sessions_collection.update_one({"_id": session["_id"]}, {"$set": {"language": lang_switch}})
+        update = session_cache.record_turn(x_app_id, session["_id"], {"$set": {"language": lang_switch}})
+        if update:
+            await turn_writer.write(x_app_id, session["_id"], [], update)
+    turn["language"] = language
 
     # 2. Welcome message on new session
     is_new_session = not x_session_id or not session.get("lastActiveAt")
+    conversation_analytics.record(x_app_id, language, turns=1, sessions=int(is_new_session))
     if is_new_session:
         welcome = app.get("welcomeMessage", {}).get(language, "Welcome!")
-        now = datetime.datetime.now(datetime.timezone.utc)
-        await chat_messages_collection.insert_one({
-            "appId": x_app_id,
-            "sessionId": session["_id"],
-            "sender": "ai",
-            "message": welcome,
-            "timestamp": now,
-            "language": language
-        })
-        await chat_sessions_collection.update_one({"_id": session["_id"]}, {"$set": {"lastActiveAt": now}})
-        return ChatMessageResponse(
-            sessionId=session["_id"],
-            message=welcome,
-            guardrailTriggered=False,
-            guardrailRuleId=None,
-            language=language
-        )
-
-    # 3. Thank you/acknowledgment detection
-    thank_you_phrases = ["thank you", "thanks", "thx", "gracias", "merci"]
-    if detect_thank_you(user_message_lower, thank_you_phrases):
-        ack = app.get("acknowledgmentMessage", {}).get(language, "You're welcome!")
-        now = datetime.datetime.now(datetime.timezone.utc)
-        await chat_messages_collection.insert_one({
-            "appId": x_app_id,
-            "sessionId": session["_id"],
-            "sender": "ai",
-            "message": ack,
-            "timestamp": now,
-            "language": language
-        })
-        await chat_sessions_collection.update_one({"_id": session["_id"]}, {"$set": {"lastActiveAt": now}})
-        return ChatMessageResponse(
-            sessionId=session["_id"],
-            message=ack,
-            guardrailTriggered=False,
-            guardrailRuleId=None,
-            language=language
-        )
-
-    # Input guardrails
-    guardrail_result = await apply_guardrails(x_app_id, user_message, language, direction="input")
+        await pipeline.run("persist", store_canned_reply(x_app_id, session, welcome, language))
+        turn["early_response"] = _chat_response(session, welcome, language)
+        return turn
+
+    # 3. Trivial turns (thanks, greetings) and handoff requests answered without retrieval or the LLM
+    canned = intent_response(app, intent_table, intents, language)
+    if canned:
+        intent, reply = canned
+        conversation_analytics.record(x_app_id, language, fastPathHits=1)
+        session_set = {"handoffRequestedAt": datetime.datetime.now(datetime.timezone.utc)} if intent == "handoff" else None
+        await pipeline.run("persist", store_canned_reply(x_app_id, session, reply, language, session_set))
+        turn["early_response"] = _chat_response(session, reply, language)
+        return turn
+
+    # 4. Input guardrails, with the query embedding, retrieval and history fetch running alongside;
+    # those are only needed if the message is let through and are cancelled when a rule blocks
+    pipeline.start("embedding", get_query_embedding(app, text))
+    pipeline.start("retrieval", get_relevant_content(x_app_id))
+    pipeline.start("history", get_last_messages(x_app_id, session, limit=recent_turns_size(), after=session.get("summarizedUntil")))
+    guardrail_result = await pipeline.run("guardrails_in", apply_guardrails(x_app_id, text, language, direction="input", session_id=session["_id"]))
     if guardrail_result["blocked"]:
-        return ChatMessageResponse(
-            sessionId=session["_id"],
-            message=guardrail_result["message"],
-            guardrailTriggered=True,
-            guardrailRuleId=guardrail_result["ruleId"],
-            language=language
-        )
+        turn["early_response"] = _chat_response(session, guardrail_result["message"], language, guardrail_result)
+        return turn
+
+    # Semantic answer cache: repeated questions skip retrieval and the LLM. Only turns with no earlier
+    # exchange use it; an answer built on one session's history would be wrong in (and leak it to) another
+    turn["query_embedding"] = await pipeline.result("embedding")
+    last_msgs = await pipeline.result("history")
+    turn["standalone"] = is_standalone_turn(session.get("summary"), last_msgs)
+    if turn["query_embedding"] and turn["standalone"]:
+        cached_answer = answer_cache.lookup(x_app_id, app_cache_version(app), language, turn["query_embedding"])
+        if cached_answer is not None:
+            pipeline.cancel("retrieval")
+            conversation_analytics.record(x_app_id, language, fastPathHits=1)
+            await pipeline.run("persist", store_message_and_response(x_app_id, session, user_message, cached_answer, language))
+            turn["early_response"] = _chat_response(session, cached_answer, language)
+            return turn
 
     # Gather relevant content and build context-aware prompt
-    relevant_content = await get_relevant_content(x_app_id)
+    relevant_content = await pipeline.result("retrieval")
     qna_context = [c["question"] + "\n" + c["answer"] for c in relevant_content if c.get("contentType") == "qa"]
     note_context = [c["text"] for c in relevant_content if c.get("contentType") == "note"]
     url_context = [c["url"] + (" - " + c["description"] if c.get("description") else "") for c in relevant_content if c.get("contentType") == "url"]
     doc_context = [c.get("filename", "") + ": " + c.get("text", "") for c in relevant_content if c.get("contentType") == "document"]
-    last_msgs = await get_last_messages(x_app_id, session["_id"])
-    prompt = build_prompt(user_message, qna_context, note_context, url_context, doc_context, last_msgs)
-    ai_response = await get_llm_response(app, language, x_app_id, prompt)
-    guardrail_result_out = await apply_guardrails(x_app_id, ai_response, language, direction="output")
+    # Pick model tier, output cap and context budgets from cheap local features
+    turn["route"] = route = choose_route(app, text, turn["query_embedding"], relevant_content)
+    qna_context, note_context, url_context, doc_context = trim_context([qna_context, note_context, url_context, doc_context], route["contextTokens"])
+    summary, last_msgs = fit_history(session.get("summary"), last_msgs, route["historyTokens"] or settings.HISTORY_TOKEN_BUDGET)
+    turn["prompt_prefix"] = build_prompt_prefix(qna_context, note_context, url_context, doc_context)
+    turn["prompt_suffix"] = build_prompt_suffix(user_message, last_msgs, summary)
+    turn["prompt"] = turn["prompt_prefix"] + turn["prompt_suffix"]
+    return turn
+
+def remember_answer(x_app_id: str, turn: Dict, ai_response: str, guardrail_result_out: Dict):
+    # Only unfiltered LLM answers to standalone questions are reused; blocked ones depend on the guardrail
+    if turn["query_embedding"] and turn.get("standalone") and not guardrail_result_out["blocked"] and not turn.get("fallback"):
+        answer_cache.store(x_app_id, app_cache_version(turn["app"]), turn["language"], turn["query_embedding"], ai_response)
+
+def _finish_pipeline(turn: Dict, response: Response) -> None:
+    # Per-stage timings go to the pipeline metrics and back to the client as Server-Timing
+    turn["pipeline"].finish()
+    response.headers["Server-Timing"] = turn["pipeline"].server_timing()
+
+@router.post("/message", response_model=ChatMessageResponse)
+async def chat_message(request: Request, response: Response, background_tasks: BackgroundTasks, body: ChatMessageRequest = Body(...), x_app_id: str = Header(...), x_session_id: Optional[str] = Header(None)):
+    logging.info(f"[chat_message] Called with app_id={x_app_id} session_id={x_session_id} message={body.message}")
+    start_latency_budget(settings.CHAT_LATENCY_BUDGET_SECONDS)
+    user_message = body.message
+    turn = await prepare_chat_turn(x_app_id, x_session_id, user_message)
+    if turn["early_response"]:
+        _finish_pipeline(turn, response)
+        return turn["early_response"]
+
+    app, session, language, pipeline = turn["app"], turn["session"], turn["language"], turn["pipeline"]
+    ai_response = await pipeline.run("llm", get_llm_response(app, language, x_app_id, turn["prompt"], turn))
+    guardrail_result_out = await pipeline.run("guardrails_out", apply_guardrails(x_app_id, ai_response, language, direction="output", session_id=session["_id"]))
     if guardrail_result_out["blocked"]:
         ai_response = guardrail_result_out["message"]
-    await store_message_and_response(x_app_id, session, user_message, ai_response, language)
-    return ChatMessageResponse(
-        sessionId=session["_id"],
-        message=ai_response,
-        guardrailTriggered=guardrail_result_out["blocked"],
-        guardrailRuleId=guardrail_result_out.get("ruleId"),
-        language=language
+    remember_answer(x_app_id, turn, ai_response, guardrail_result_out)
+    # In async persistence mode this only queues the turn, so the write overlaps the response;
+    # sync mode keeps its promise that the turn is stored before the client hears back
+    await pipeline.run("persist", store_message_and_response(x_app_id, session, user_message, ai_response, language, turn.get("usage")))
+    background_tasks.add_task(update_rolling_summary, x_app_id, session["_id"], app["googleApiKey"])
+    _finish_pipeline(turn, response)
+    return _chat_response(session, ai_response, language, guardrail_result_out)
+
+async def _guarded_tokens(stream, guard, parts):
+    """Relay upstream chunks through the streaming guardrail, closing upstream as soon as a rule blocks."""
+    try:
+        async for text in stream:
+            parts.append(text)
+            released = guard.feed(text)
+            if guard.blocked:
+                return
+            if released:
+                yield released
+    finally:
+        await stream.aclose()
+
+async def _stream_chat_events(x_app_id, user_message, turn):
+    # Closed explicitly so a client disconnect closes the upstream stream now, not at garbage collection
+    async with aclosing(_stream_turn_events(x_app_id, user_message, turn)) as events:
+        try:
+            async for event in events:
+                yield event
+        finally:
+            turn["pipeline"].finish()
+
+async def _stream_turn_events(x_app_id, user_message, turn):
+    app, session, language = turn["app"], turn["session"], turn["language"]
+    yield _sse_event("session", {"sessionId": session["_id"], "language": language})
+    if turn["early_response"]:
+        yield _sse_event("token", {"text": turn["early_response"].message})
+        yield _sse_event("guardrail", turn["early_response"].dict())
+        return
+
+    route = turn["route"]
+    model, max_tokens = route["model"], route["maxOutputTokens"]
+    guard = StreamingGuardrail(await get_guardrail_matcher(x_app_id), language, direction="output")
+    started = time.monotonic()
+    parts = []
+    try:
+        cache_name = await resolve_cached_prefix(app, x_app_id, turn, model)
+        try:
+            stream = stream_gemma_api(app["googleApiKey"], turn["prompt_suffix"] if cache_name else turn["prompt"], model=model, max_tokens=max_tokens, cached_content=cache_name)
+            async with aclosing(_guarded_tokens(stream, guard, parts)) as tokens:
+                async for text in tokens:
+                    yield _sse_event("token", {"text": text})
+        except httpx.HTTPStatusError:
+            if not cache_name or parts:
+                raise
+            # Cache expired or evicted upstream: register again next turn, stream the full prompt now
+            context_cache.invalidate(x_app_id, model)
+            stream = stream_gemma_api(app["googleApiKey"], turn["prompt"], model=model, max_tokens=max_tokens)
+            async with aclosing(_guarded_tokens(stream, guard, parts)) as tokens:
+                async for text in tokens:
+                    yield _sse_event("token", {"text": text})
+    except (CircuitOpenError, DeadlineExceeded) as exc:
+        if parts:
+            yield _sse_event("error", {"error": f"Gemma API unavailable: {exc}"})
+            return
+        # Nothing streamed yet: answer like the non-streaming endpoint does when upstream is unhealthy
+        turn["fallback"] = True
+        fallback = fallback_answer(app, language, x_app_id, turn)
+        parts.append(fallback)
+        released = guard.feed(fallback)
+        if released:
+            yield _sse_event("token", {"text": released})
+    except httpx.HTTPError as exc:
+        logging.error(f"[chat_message_stream] Gemma streaming error for app_id={x_app_id}: {exc}")
+        yield _sse_event("error", {"error": f"Gemma API error: {exc}"})
+        return
+
+    ai_response = "".join(parts)
+    turn["pipeline"].timings["llm"] = round((time.monotonic() - started) * 1000, 3)
+    if not turn.get("fallback"):
+        record_llm_usage(x_app_id, language, turn, route, model, time.monotonic() - started, turn["prompt"], ai_response)
+    tail = guard.finish()
+    if tail:
+        yield _sse_event("token", {"text": tail})
+    guardrail_result_out = guard.result
+    record_guardrail_hits(x_app_id, session["_id"], "output", guardrail_result_out, ai_response, language)
+    if guardrail_result_out["blocked"]:
+        ai_response = guardrail_result_out["message"]
+    remember_answer(x_app_id, turn, ai_response, guardrail_result_out)
+    # Final event carries the verdict; when blocked, clients replace the streamed text with `message`.
+    # Blocked text itself is never streamed: the guard holds back any tail that could still match.
+    yield _sse_event("guardrail", _chat_response(session, ai_response, language, guardrail_result_out).dict())
+    # Stored after the final event so the write overlaps the client rendering it
+    await turn["pipeline"].run("persist", store_message_and_response(x_app_id, session, user_message, ai_response, language, turn.get("usage")))
+
+@router.post("/message/stream")
+async def chat_message_stream(request: Request, background_tasks: BackgroundTasks, body: ChatMessageRequest = Body(...), x_app_id: str = Header(...), x_session_id: Optional[str] = Header(None)):
+    logging.info(f"[chat_message_stream] Called with app_id={x_app_id} session_id={x_session_id} message={body.message}")
+    start_latency_budget(settings.CHAT_LATENCY_BUDGET_SECONDS)
+    user_message = body.message
+    turn = await prepare_chat_turn(x_app_id, x_session_id, user_message)
+    if turn["prompt"]:
+        # Runs once the stream (and the message persistence inside it) has finished
+        background_tasks.add_task(update_rolling_summary, x_app_id, turn["session"]["_id"], turn["app"]["googleApiKey"])
+    return StreamingResponse(
+        _stream_chat_events(x_app_id, user_message, turn),
+        media_type="text/event-stream",
+        # Only the stages before the first byte can be reported in a header
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Server-Timing": turn["pipeline"].server_timing()}
     )
@@ -0,0 +1,123 @@
+# app/services/analytics.py
+from typing import Dict, Optional, Tuple
+import asyncio
+import datetime
+import logging
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.config import settings
+from app.db_manager import db_manager
+
+logger = logging.getLogger(__name__)
+
+# Counters kept per tenant, UTC day and language:
+#   turns              user messages handled, including ones blocked by a guardrail
+#   messages           chat messages stored (user, AI and canned replies)
+#   sessions           sessions started
+#   guardrailTriggers  guardrail results with a blocking or log_only hit, input and output
+#   guardrailBlocks    of those, results that blocked the message or answer
+#   guardrailInputTriggers, guardrailOutputTriggers   guardrailTriggers split by direction;
+#                      each is at most one per turn, so it can be read as a rate over turns
+#   fastPathHits       turns answered without the LLM (intent replies, answer cache)
+#   llmCalls, inputTokens, outputTokens   LLM usage
+COUNTERS = ("turns", "messages", "sessions", "guardrailTriggers", "guardrailBlocks",
+            "guardrailInputTriggers", "guardrailOutputTriggers", "fastPathHits", "llmCalls", "inputTokens", "outputTokens")
+
+_rollups = db_manager.get_main_db()["analytics_rollups"]
+
+
+def utc_day(now: Optional[datetime.datetime] = None) -> str:
+    return (now or datetime.datetime.now(datetime.timezone.utc)).strftime("%Y-%m-%d")
+
+
+def rollup_id(app_id: str, day: str, language: str) -> str:
+    return f"{app_id}:{day}:{language}"
+
+
+class ConversationAnalytics:
+    """
+    Pre-aggregated conversation counters. Chat handlers bump counters in memory;
+    every `interval` seconds they go out as one bulk_write of $inc upserts into
+    `analytics_rollups`, one document per tenant, day and language, so reading a
+    date range touches days x languages documents regardless of chat volume.
+    """
+
+    def __init__(self, collection, interval: float = 10.0, enabled: bool = True):
+        self.collection = collection
+        self.interval = interval
+        self.enabled = enabled
+        self._pending: Dict[Tuple[str, str, str], Dict[str, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._indexed = False
+
+    def record(self, app_id: str, language: Optional[str], now: Optional[datetime.datetime] = None, **counts: int) -> None:
+        if not self.enabled:
+            return
+        pending = self._pending.setdefault((app_id, utc_day(now), language or "unknown"), {})
+        for field, value in counts.items():
+            if value:
+                pending[field] = pending.get(field, 0) + value
+
+    def record_guardrail(self, app_id: str, language: Optional[str], direction: str, result: Dict) -> None:
+        blocked = bool(result.get("blocked"))
+        if blocked or result.get("logged"):
+            by_direction = "guardrailOutputTriggers" if direction == "output" else "guardrailInputTriggers"
+            self.record(app_id, language, guardrailTriggers=1, guardrailBlocks=int(blocked), **{by_direction: 1})
+
+    def pending(self, app_id: str) -> Dict[Tuple[str, str], Dict[str, int]]:
+        """Counters recorded by this worker but not flushed yet, keyed by (day, language)."""
+        return {(day, language): dict(counts) for (pending_app, day, language), counts in self._pending.items()
+                if pending_app == app_id}
+
+    async def ensure_indexes(self) -> None:
+        if not self._indexed:
+            await self.collection.create_index([("appId", ASCENDING), ("day", ASCENDING)])
+            self._indexed = True
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        pending = {key: counts for key, counts in pending.items() if counts}
+        if not pending:
+            return
+        keys = list(pending)
+        ops = [
+            UpdateOne(
+                {"_id": rollup_id(app_id, day, language)},
+                {"$inc": pending[(app_id, day, language)], "$setOnInsert": {"appId": app_id, "day": day, "language": language}},
+                upsert=True,
+            )
+            for app_id, day, language in keys
+        ]
+        try:
+            await self.ensure_indexes()
+            await self.collection.bulk_write(ops, ordered=False)
+            return
+        except BulkWriteError as e:
+            error, failed = e, [keys[err["index"]] for err in e.details.get("writeErrors", [])]
+        except Exception as e:
+            error, failed = e, keys
+        # Unwritten counts go back into the buffer for the next flush
+        logger.warning(f"Analytics rollup flush failed for {len(failed)} of {len(keys)} rollups: {error!r}")
+        for app_id, day, language in failed:
+            self.record(app_id, language, datetime.datetime.strptime(day, "%Y-%m-%d"), **pending[(app_id, day, language)])
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+# Global rollup counters; started and flushed in the app lifespan
+conversation_analytics = ConversationAnalytics(
+    _rollups, interval=settings.ANALYTICS_FLUSH_SECONDS, enabled=settings.ANALYTICS_ENABLED
+)
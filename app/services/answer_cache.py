@@ -0,0 +1,128 @@
+# app/services/answer_cache.py
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import time
+import numpy as np
+from app.config import settings
+
+
+class SemanticAnswerCache:
+    """
+    Per-tenant cache of LLM answers keyed by query embedding.
+
+    A lookup is a hit when a cached query in the same language is at least
+    `threshold` cosine-similar to the new one. Each tenant bucket is tagged with
+    the app's (contentVersion, guardrailVersion); when either changes the bucket
+    is dropped, so answers never outlive the knowledge base they were built from.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries_per_app: int = 500):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_app = max_entries_per_app
+        self._buckets: Dict[str, Dict] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _bucket(self, app_id: str, version: Tuple) -> Dict:
+        bucket = self._buckets.get(app_id)
+        if bucket is not None and bucket["version"] != version:
+            self.invalidations += 1
+            bucket = None
+        if bucket is None:
+            bucket = {"version": version, "entries": OrderedDict()}
+            self._buckets[app_id] = bucket
+        return bucket
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> Optional[np.ndarray]:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if not vec.size or norm == 0:
+            return None
+        return vec / norm
+
+    def lookup(self, app_id: str, version: Tuple, language: str, embedding: List[float], threshold: Optional[float] = None) -> Optional[str]:
+        query = self._unit(embedding)
+        entries = self._bucket(app_id, version)["entries"]
+        if query is None or not entries:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        expired = [key for key, entry in entries.items() if now - entry["createdAt"] > self.ttl_seconds]
+        for key in expired:
+            del entries[key]
+        self.expirations += len(expired)
+
+        candidates = [(key, entry) for key, entry in entries.items()
+                      if entry["language"] == language and entry["vector"].shape == query.shape]
+        if not candidates:
+            self.misses += 1
+            return None
+        scores = np.stack([entry["vector"] for _, entry in candidates]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < (self.threshold if threshold is None else threshold):
+            self.misses += 1
+            return None
+        key, entry = candidates[best]
+        entries.move_to_end(key)
+        self.hits += 1
+        return entry["answer"]
+
+    def store(self, app_id: str, version: Tuple, language: str, embedding: List[float], answer: str) -> None:
+        vector = self._unit(embedding)
+        if vector is None:
+            return
+        entries = self._bucket(app_id, version)["entries"]
+        self._next_id += 1
+        entries[self._next_id] = {"vector": vector, "language": language, "answer": answer, "createdAt": time.monotonic()}
+        self.stores += 1
+        while len(entries) > self.max_entries_per_app:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, app_id: str) -> None:
+        if self._buckets.pop(app_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "apps": len(self._buckets),
+            "entries": sum(len(b["entries"]) for b in self._buckets.values())
+        }
+
+
+def app_cache_version(app: Dict) -> Tuple:
+    """Version tag for everything that can change an answer: knowledge base content and guardrails."""
+    return (app.get("contentVersion", 0), app.get("guardrailVersion", 0))
+
+
+def is_standalone_turn(summary: Optional[str], history: List[Dict]) -> bool:
+    """
+    Whether an answer depends on the question alone, so it may be cached and reused
+    across sessions: no rolling summary and no earlier user message. Welcome and
+    intent replies are canned and carry nothing from the conversation.
+    """
+    return not summary and not any(m.get("sender") == "user" for m in history)
+
+
+# Global answer cache instance
+answer_cache = SemanticAnswerCache(
+    threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries_per_app=settings.ANSWER_CACHE_MAX_ENTRIES_PER_APP
+)
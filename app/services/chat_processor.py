@@ -0,0 +1,96 @@
+# app/services/chat_processor.py
+from typing import Any, Awaitable, Dict, Optional, Set
+import asyncio
+import time
+from app.services.resilience import LatencyTracker
+
+
+class PipelineMetrics:
+    """Per-stage latency percentiles and cancellation counts for chat turns."""
+
+    def __init__(self):
+        self._stages: Dict[str, Dict] = {}
+
+    def record(self, timings: Dict[str, float], cancelled: Set[str]) -> None:
+        for name, ms in timings.items():
+            entry = self._stages.setdefault(name, {"runs": 0, "cancelled": 0, "latency": LatencyTracker(min_samples=1)})
+            entry["runs"] += 1
+            entry["latency"].record(ms)
+        for name in cancelled:
+            entry = self._stages.setdefault(name, {"runs": 0, "cancelled": 0, "latency": LatencyTracker(min_samples=1)})
+            entry["cancelled"] += 1
+
+    def stats(self) -> Dict:
+        return {
+            name: {"runs": e["runs"], "cancelled": e["cancelled"], "latencyMs": e["latency"].stats()}
+            for name, e in self._stages.items()
+        }
+
+
+class TurnPipeline:
+    """
+    Stages of one chat turn, run inline or as concurrent tasks, with timings.
+
+    ``start`` launches a stage that later steps depend on; ``result`` waits
+    for it. Stages a turn no longer needs (the input was blocked, the answer
+    cache hit) are dropped with ``cancel``. ``finish`` cancels anything still
+    running and records the timings, in milliseconds, into the metrics.
+    """
+
+    def __init__(self, metrics: Optional[PipelineMetrics] = None):
+        self.metrics = metrics
+        self.timings: Dict[str, float] = {}
+        self.cancelled: Set[str] = set()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._started = time.perf_counter()
+        self._finished = False
+
+    async def _timed(self, name: str, awaitable: Awaitable) -> Any:
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            self.cancelled.add(name)
+            raise
+        self.timings[name] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def start(self, name: str, awaitable: Awaitable) -> None:
+        self._tasks[name] = asyncio.create_task(self._timed(name, awaitable))
+
+    async def result(self, name: str) -> Any:
+        return await self._tasks.pop(name)
+
+    async def run(self, name: str, awaitable: Awaitable) -> Any:
+        return await self._timed(name, awaitable)
+
+    def cancel(self, *names: str) -> None:
+        """Cancel the named stages, or every stage still pending."""
+        for name in names or list(self._tasks):
+            task = self._tasks.pop(name, None)
+            if task is None:
+                continue
+            if task.done():
+                # Nobody will await it now; retrieve a failure so it isn't reported as unhandled
+                if not task.cancelled():
+                    task.exception()
+            else:
+                task.cancel()
+                self.cancelled.add(name)
+
+    def finish(self) -> Dict[str, float]:
+        if not self._finished:
+            self._finished = True
+            self.cancel()
+            self.timings["total"] = round((time.perf_counter() - self._started) * 1000, 3)
+            if self.metrics is not None:
+                self.metrics.record(self.timings, self.cancelled)
+        return self.timings
+
+    def server_timing(self) -> str:
+        """Timings as a Server-Timing header value."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.timings.items())
+
+
+# Global chat pipeline metrics
+pipeline_metrics = PipelineMetrics()
@@ -0,0 +1,111 @@
+# app/services/context_cache.py
+from typing import Dict, Optional, Tuple
+import hashlib
+import logging
+import time
+from app.config import settings
+from app.services.gemini_client import get_http_client
+from app.services.resilience import call_timeout
+from app.services.single_flight import SingleFlight
+from app.services.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class ContextCacheRegistry:
+    """
+    Registers each tenant's stable prompt prefix with Gemini's cachedContents API.
+
+    Entries are keyed by (app_id, model) and tagged with the app's content version
+    plus a hash of the prefix text; a new version or prefix registers a fresh cache
+    and deletes the old one. Generation calls then send only the variable suffix
+    together with the cache name.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self._creating = SingleFlight(wait_timeout=settings.GEMINI_TIMEOUT_SECONDS)
+        self.created = 0
+        self.reused = 0
+        self.failures = 0
+        self.skipped = 0
+
+    def eligible(self, prefix: str) -> bool:
+        # Gemini rejects caches below a minimum size; very large tenants aren't worth pinning
+        tokens = estimate_tokens(prefix)
+        return settings.CONTEXT_CACHE_MIN_TOKENS <= tokens <= settings.CONTEXT_CACHE_MAX_TOKENS
+
+    async def resolve(self, app_id: str, api_key: str, model: str, content_version: int, prefix: str) -> Optional[str]:
+        """Return the cachedContents name for this prefix, registering it if needed; None means send the full prompt."""
+        if not settings.CONTEXT_CACHE_ENABLED or not self.eligible(prefix):
+            self.skipped += 1
+            return None
+
+        tag = (content_version, hashlib.sha256(prefix.encode()).hexdigest())
+        entry = self._entries.get((app_id, model))
+        now = time.monotonic()
+        if entry and entry["tag"] == tag:
+            if entry["name"] is None and now < entry["retryAt"]:
+                return None
+            # Refresh a little before the upstream TTL runs out
+            if entry["name"] is not None and now < entry["expiresAt"] - 60:
+                self.reused += 1
+                return entry["name"]
+
+        return await self._creating.do(
+            f"{app_id}:{model}:{tag[0]}:{tag[1]}",
+            lambda: self._register(app_id, api_key, model, tag, prefix)
+        )
+
+    async def _register(self, app_id: str, api_key: str, model: str, tag: Tuple, prefix: str) -> Optional[str]:
+        url = f"{settings.GEMINI_API_BASE_URL}/cachedContents?key={api_key}"
+        payload = {
+            "model": f"models/{model}",
+            "contents": [{"role": "user", "parts": [{"text": prefix}]}],
+            "ttl": f"{settings.CONTEXT_CACHE_TTL_SECONDS}s"
+        }
+        old = self._entries.get((app_id, model))
+        try:
+            resp = await get_http_client().post(url, json=payload, timeout=call_timeout(settings.GEMINI_TIMEOUT_SECONDS))
+            resp.raise_for_status()
+            name = resp.json()["name"]
+        except Exception as e:
+            # Don't retry on every message; fall back to full prompts for a while
+            self.failures += 1
+            logger.warning(f"Context cache registration failed for app {app_id}: {e!r}")
+            self._entries[(app_id, model)] = {"tag": tag, "name": None, "retryAt": time.monotonic() + settings.CONTEXT_CACHE_RETRY_SECONDS}
+            return None
+
+        self.created += 1
+        self._entries[(app_id, model)] = {
+            "tag": tag,
+            "name": name,
+            "expiresAt": time.monotonic() + settings.CONTEXT_CACHE_TTL_SECONDS
+        }
+        if old and old.get("name") and old["name"] != name:
+            await self._delete(api_key, old["name"])
+        return name
+
+    async def _delete(self, api_key: str, name: str) -> None:
+        try:
+            await get_http_client().delete(f"{settings.GEMINI_API_BASE_URL}/{name}?key={api_key}")
+        except Exception as e:
+            # Upstream TTL cleans it up anyway
+            logger.info(f"Could not delete stale context cache {name}: {e!r}")
+
+    def invalidate(self, app_id: str, model: str) -> None:
+        """Forget an entry Gemini no longer knows about (expired or evicted upstream)."""
+        self._entries.pop((app_id, model), None)
+
+    def stats(self) -> Dict:
+        return {
+            "entries": sum(1 for e in self._entries.values() if e.get("name")),
+            "created": self.created,
+            "reused": self.reused,
+            "failures": self.failures,
+            "skipped": self.skipped
+        }
+
+
+# Global context cache registry
+context_cache = ContextCacheRegistry()
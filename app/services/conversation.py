@@ -0,0 +1,136 @@
+# app/services/conversation.py
+from typing import Dict, List, Optional, Tuple
+import datetime
+import logging
+from app.config import settings
+from app.services.llm import call_gemma_api
+from app.services.resilience import clear_latency_budget
+from app.services.session_cache import session_cache
+from app.services.tokens import estimate_tokens, token_accountant
+from app.utils.chat_messages import message_filter
+from app.utils.database import get_app_and_collections
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = "gemini-1.5-flash"
+
+# Sessions with a summary update in flight in this process
+_summarizing = set()
+
+# Session document field holding the last few messages, so prompt history comes with the session read
+RECENT_TURNS_FIELD = "recentTurns"
+
+def recent_turns_size() -> int:
+    """
+    Messages read back as prompt history (and kept in the session ring). Folding into
+    the summary waits until a batch is due, so up to this many messages can be unsummarized.
+    """
+    return 2 * (settings.HISTORY_RECENT_TURNS + settings.SUMMARY_BATCH_TURNS)
+
+def recent_turn(msg: Dict) -> Dict:
+    """The part of a chat_messages document kept on the session."""
+    return {"sender": msg["sender"], "message": msg["message"], "timestamp": msg["timestamp"]}
+
+def recent_turns_push(messages: List[Dict]) -> Dict:
+    """$push clause appending a turn's messages to the session ring, capped with $slice."""
+    return {RECENT_TURNS_FIELD: {"$each": [recent_turn(m) for m in messages], "$slice": -recent_turns_size()}}
+
+def _utc(ts: datetime.datetime) -> datetime.datetime:
+    # MongoDB hands back naive UTC datetimes; turns recorded in this process carry a timezone
+    return ts.replace(tzinfo=datetime.timezone.utc) if ts.tzinfo is None else ts
+
+def messages_after(msgs: List[Dict], after: Optional[datetime.datetime]) -> List[Dict]:
+    if after is None:
+        return list(msgs)
+    return [m for m in msgs if _utc(m["timestamp"]) > _utc(after)]
+
+def fit_history(summary: Optional[str], msgs: List[Dict], budget_tokens: int) -> Tuple[Optional[str], List[Dict]]:
+    """
+    Trim prompt history to `budget_tokens`: the summary is kept, and the oldest
+    recent messages are dropped until summary plus messages fit.
+    """
+    summary_tokens = estimate_tokens(summary or "")
+    if summary_tokens > budget_tokens:
+        summary = summary[:int(budget_tokens * len(summary) / summary_tokens)]
+        summary_tokens = budget_tokens
+    kept = []
+    used = summary_tokens
+    for msg in reversed(msgs):
+        cost = estimate_tokens(msg["message"])
+        if used + cost > budget_tokens:
+            break
+        kept.append(msg)
+        used += cost
+    return summary, list(reversed(kept))
+
+def build_summary_prompt(summary: Optional[str], msgs: List[Dict]) -> str:
+    lines = "\n".join(f"{'User' if m.get('sender') == 'user' else 'Assistant'}: {m['message']}" for m in msgs)
+    return (
+        "Maintain a running summary of a conversation between a user and an assistant. "
+        "Merge the new messages into the current summary. Keep facts, names, user preferences and open questions; "
+        f"drop greetings and pleasantries. Reply with the updated summary only, at most {settings.SUMMARY_MAX_WORDS} words.\n\n"
+        f"Current summary:\n{summary or '(none)'}\n\n"
+        f"New messages:\n{lines}\n"
+    )
+
+def split_for_summary(msgs: List[Dict], keep_messages: int) -> List[Dict]:
+    """
+    Messages (oldest first) that should be folded into the summary, leaving the last
+    `keep_messages` verbatim. The cut never splits messages that share a timestamp,
+    since a turn's user and AI messages are stored with the same one.
+    """
+    cut = len(msgs) - keep_messages
+    if cut <= 0:
+        return []
+    while cut < len(msgs) and msgs[cut]["timestamp"] == msgs[cut - 1]["timestamp"]:
+        cut += 1
+    return msgs[:cut]
+
+async def update_rolling_summary(app_id: str, session_id: str, api_key: str) -> None:
+    """
+    Fold messages older than the last HISTORY_RECENT_TURNS turns into the session's summary.
+
+    Runs after the response is sent. Messages are folded in batches so one
+    summarization call covers several turns.
+    """
+    if session_id in _summarizing:
+        return
+    _summarizing.add(session_id)
+    # Scheduled from a chat request; its latency budget doesn't apply here
+    clear_latency_budget()
+    try:
+        app, collections = await get_app_and_collections(app_id)
+        chat_sessions_collection = collections['chat_sessions']
+        chat_messages_collection = collections['chat_messages']
+
+        session = await chat_sessions_collection.find_one({"_id": session_id, "appId": app_id})
+        if not session:
+            return
+        query = message_filter(collections.get('chat_messages_layout', "documents"), app_id, session_id)
+        if session.get("summarizedUntil"):
+            query["timestamp"] = {"$gt": session["summarizedUntil"]}
+        keep_messages = 2 * settings.HISTORY_RECENT_TURNS
+        # History reads at most recent_turns_size() unsummarized messages; fold before more pile up
+        if await chat_messages_collection.count_documents(query) < recent_turns_size():
+            return
+
+        msgs = await chat_messages_collection.find(query).sort("timestamp", 1).to_list(None)
+        folded = split_for_summary(msgs, keep_messages)
+        if not folded:
+            return
+        prompt = build_summary_prompt(session.get("summary"), folded)
+        summary = await call_gemma_api(
+            api_key, prompt,
+            model=SUMMARY_MODEL, temperature=0.0, max_tokens=settings.SUMMARY_MAX_TOKENS
+        )
+        if isinstance(summary, dict):
+            logger.warning(f"Summary update failed for session {session_id}: {summary.get('error')}")
+            return
+        token_accountant.record(app_id, estimate_tokens(prompt), estimate_tokens(summary))
+        fields = {"summary": summary.strip(), "summarizedUntil": folded[-1]["timestamp"]}
+        await chat_sessions_collection.update_one({"_id": session_id}, {"$set": fields})
+        session_cache.patch(app_id, session_id, fields)
+    except Exception as e:
+        logger.warning(f"Summary update failed for session {session_id}: {e!r}")
+    finally:
+        _summarizing.discard(session_id)
@@ -1,8 +1,8 @@
 # Embedding service for Google Gemma
 
-import httpx
 import os
 from app.config import settings
+from app.services.gemini_client import GEMINI_API_BASE_URL, resilient_post
 
 GEMMA_EMBEDDING_MODEL = os.getenv("GEMMA_EMBEDDING_MODEL", "embedding-001")
 
@@ -13,18 +13,46 @@ async def generate_embedding(text: str, api_key: str = None) -> list:
 	"""
 	if api_key is None:
 		api_key = settings.GOOGLE_API_KEY
-	url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMMA_EMBEDDING_MODEL}:embedContent?key={api_key}"
+	url = f"{GEMINI_API_BASE_URL}/models/{GEMMA_EMBEDDING_MODEL}:embedContent?key={api_key}"
 	payload = {
 		"content": {"parts": [{"text": text}]}
 	}
-	async with httpx.AsyncClient() as client:
-		resp = await client.post(url, json=payload)
+	resp = await resilient_post(api_key, GEMMA_EMBEDDING_MODEL, url, payload)
+	try:
+		resp.raise_for_status()
+	except Exception:
+		print("[Embedding API ERROR] Status:", resp.status_code)
+		print("[Embedding API ERROR] Response:", resp.text)
+		raise
+	data = resp.json()
+	# The actual path to the embedding vector may differ; adjust as needed
+	return data["embedding"]["values"]
+
+# batchEmbedContents accepts at most this many texts per call
+EMBEDDING_BATCH_LIMIT = 100
+
+async def generate_embeddings(texts: list, api_key: str = None) -> list:
+	"""
+	Embeds several texts with one batchEmbedContents call per EMBEDDING_BATCH_LIMIT texts.
+	Returns the embedding vectors in the order of `texts`.
+	"""
+	if api_key is None:
+		api_key = settings.GOOGLE_API_KEY
+	url = f"{GEMINI_API_BASE_URL}/models/{GEMMA_EMBEDDING_MODEL}:batchEmbedContents?key={api_key}"
+	vectors = []
+	for start in range(0, len(texts), EMBEDDING_BATCH_LIMIT):
+		payload = {
+			"requests": [
+				{"model": f"models/{GEMMA_EMBEDDING_MODEL}", "content": {"parts": [{"text": text}]}}
+				for text in texts[start:start + EMBEDDING_BATCH_LIMIT]
+			]
+		}
+		resp = await resilient_post(api_key, GEMMA_EMBEDDING_MODEL, url, payload)
 		try:
 			resp.raise_for_status()
 		except Exception:
 			print("[Embedding API ERROR] Status:", resp.status_code)
 			print("[Embedding API ERROR] Response:", resp.text)
 			raise
-		data = resp.json()
-		# The actual path to the embedding vector may differ; adjust as needed
-		return data["embedding"]["values"]
+		vectors.extend(e["values"] for e in resp.json()["embeddings"])
+	return vectors
@@ -0,0 +1,120 @@
+# app/services/gemini_client.py
+from typing import Dict, Optional, Tuple
+import hashlib
+import logging
+import time
+import httpx
+from app.config import settings
+from app.services.resilience import (
+    CircuitBreaker, CircuitOpenError, LatencyTracker, call_timeout, hedged
+)
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_BASE_URL = settings.GEMINI_API_BASE_URL
+
+# Statuses that mean the key or upstream is unhealthy (as opposed to a bad request)
+BREAKER_FAILURE_STATUSES = {401, 403, 429}
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared client so Gemini calls reuse pooled connections instead of a new TLS handshake per call."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.GEMINI_TIMEOUT_SECONDS, connect=settings.GEMINI_CONNECT_TIMEOUT_SECONDS)
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Stable, non-reversible label for an API key, safe to expose in metrics."""
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+
+
+class GeminiHealth:
+    """Circuit breakers per (API key, model) and latency trackers per model."""
+
+    def __init__(self):
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyTracker] = {}
+
+    def breaker(self, api_key: str, model: str) -> CircuitBreaker:
+        key = (key_fingerprint(api_key), model)
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(
+                failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.CIRCUIT_BREAKER_RESET_SECONDS
+            )
+        return self._breakers[key]
+
+    def latency(self, model: str) -> LatencyTracker:
+        if model not in self._latency:
+            self._latency[model] = LatencyTracker()
+        return self._latency[model]
+
+    def stats(self) -> Dict:
+        return {
+            "breakers": [dict(key=fingerprint, model=model, **breaker.stats())
+                         for (fingerprint, model), breaker in self._breakers.items()],
+            "latency": {model: tracker.stats() for model, tracker in self._latency.items()}
+        }
+
+
+# Global upstream health registry
+gemini_health = GeminiHealth()
+
+
+def is_breaker_failure(status_code: int) -> bool:
+    return status_code >= 500 or status_code in BREAKER_FAILURE_STATUSES
+
+async def resilient_post(api_key: str, model: str, url: str, payload: Dict) -> httpx.Response:
+    """
+    POST to Gemini with a deadline, an optional hedge, and the (key, model) circuit breaker.
+
+    Raises:
+        CircuitOpenError: the breaker is open, no request was sent
+        DeadlineExceeded: the request's latency budget is already spent
+        httpx.TransportError: network failure or timeout
+    """
+    breaker = gemini_health.breaker(api_key, model)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit open for model {model} (key {key_fingerprint(api_key)})")
+    trial = breaker.is_trial()
+    tracker = gemini_health.latency(model)
+
+    async def attempt():
+        started = time.monotonic()
+        resp = await get_http_client().post(url, json=payload, timeout=call_timeout(settings.GEMINI_TIMEOUT_SECONDS))
+        tracker.record(time.monotonic() - started)
+        return resp
+
+    try:
+        try:
+            if settings.GEMINI_HEDGING_ENABLED:
+                delay = max(settings.GEMINI_HEDGE_MIN_DELAY_SECONDS,
+                            tracker.percentile(0.95, default=settings.GEMINI_HEDGE_MIN_DELAY_SECONDS))
+                resp = await hedged(attempt, delay)
+            else:
+                resp = await attempt()
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            logger.warning(f"Gemini {model} call failed: {e!r}")
+            raise
+
+        if is_breaker_failure(resp.status_code):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return resp
+    finally:
+        # DeadlineExceeded, cancellation or anything unexpected: don't leave the trial in flight
+        if trial:
+            breaker.abandon_trial()
@@ -0,0 +1,699 @@
+# app/services/guardrail.py
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple, Union
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+from app.config import settings
+from app.services.single_flight import SingleFlight
+from app.utils.text import NormalizedText
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse, sre_constants
+
+import re2  # google-re2: linear-time matching, so no rule can stall a scan
+
+logger = logging.getLogger(__name__)
+
+# Which directions each phrase-style rule type applies to
+RULE_DIRECTIONS = {
+    "blacklist_phrase": ("input", "output"),
+    "topic_restriction": ("input", "output"),
+    "response_filter": ("output",),
+    "regex": ("input", "output"),
+}
+REGEX_RULE_TYPE = "regex"
+BLOCKING_ACTIONS = ("block_input", "override_response")
+DEFAULT_BLOCK_MESSAGE = "Blocked by guardrail."
+
+
+def normalize_for_match(text: Union[str, NormalizedText]) -> str:
+    """NFKC-fold and casefold text so patterns match regardless of case or compatibility forms."""
+    if isinstance(text, NormalizedText):
+        return text.folded
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+
+def guardrail_result(blocked: bool, rule: Dict, language: str) -> Dict:
+    response_msg = (rule.get("responseMessage") or {}).get(language, DEFAULT_BLOCK_MESSAGE)
+    return {"blocked": blocked, "ruleId": str(rule["_id"]), "message": response_msg}
+
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) + (
+    (sre_constants.POSSESSIVE_REPEAT,) if hasattr(sre_constants, "POSSESSIVE_REPEAT") else ()
+)
+# Repeats above this bound are treated like `*` when looking for nested quantifiers
+_LARGE_REPEAT = 100
+# Characters tried when checking whether two character tests can match the same character
+_PROBE_CHARS = "".join(chr(c) for c in range(32, 127)) + "\t\n\r\xa0éßİıſÅ٣५中ｆ_"
+
+_CATEGORY_TESTS = {
+    sre_constants.CATEGORY_DIGIT: str.isdecimal,
+    sre_constants.CATEGORY_NOT_DIGIT: lambda ch: not ch.isdecimal(),
+    sre_constants.CATEGORY_SPACE: str.isspace,
+    sre_constants.CATEGORY_NOT_SPACE: lambda ch: not ch.isspace(),
+    sre_constants.CATEGORY_WORD: lambda ch: ch.isalnum() or ch == "_",
+    sre_constants.CATEGORY_NOT_WORD: lambda ch: not (ch.isalnum() or ch == "_"),
+}
+
+
+def _is_large(high) -> bool:
+    return high == sre_constants.MAXREPEAT or high > _LARGE_REPEAT
+
+
+def _class_item_test(op, av):
+    if op == sre_constants.LITERAL:
+        return lambda ch: ch == chr(av)
+    if op == sre_constants.RANGE:
+        return lambda ch: av[0] <= ord(ch) <= av[1]
+    if op == sre_constants.CATEGORY:
+        return _CATEGORY_TESTS.get(av, lambda ch: True)
+    return lambda ch: True
+
+
+def _char_test(op, av):
+    """Predicate for the characters one consuming node can match, or None for other nodes."""
+    if op == sre_constants.LITERAL:
+        return lambda ch: ch == chr(av)
+    if op == sre_constants.NOT_LITERAL:
+        return lambda ch: ch != chr(av)
+    if op == sre_constants.ANY:
+        return lambda ch: ch != "\n"
+    if op == sre_constants.IN:
+        negate = bool(av) and av[0][0] == sre_constants.NEGATE
+        tests = [_class_item_test(item_op, item_av) for item_op, item_av in av if item_op != sre_constants.NEGATE]
+        return lambda ch: any(t(ch) for t in tests) != negate
+    return None
+
+
+def _overlap(tests_a, tests_b) -> bool:
+    """Whether some character matches a test on each side; rules match case-insensitively."""
+    for ch in _PROBE_CHARS:
+        variants = {v for v in (ch, ch.lower(), ch.upper(), ch.casefold()) if len(v) == 1}
+        if any(t(v) for t in tests_a for v in variants) and any(t(v) for t in tests_b for v in variants):
+            return True
+    return False
+
+
+def _nullable(subpattern) -> bool:
+    """Whether the sequence can match the empty string."""
+    for op, av in subpattern:
+        if op in _REPEATS:
+            if av[0] > 0 and not _nullable(av[2]):
+                return False
+        elif op == sre_constants.SUBPATTERN:
+            if not _nullable(av[-1]):
+                return False
+        elif op == sre_constants.BRANCH:
+            if not any(_nullable(branch) for branch in av[1]):
+                return False
+        elif getattr(sre_constants, "ATOMIC_GROUP", None) == op:
+            if not _nullable(av):
+                return False
+        elif _char_test(op, av) is not None:
+            return False
+    return True
+
+
+def _first(subpattern) -> list:
+    """Tests for the characters the sequence can start with."""
+    tests = []
+    for op, av in subpattern:
+        test = _char_test(op, av)
+        if test is not None:
+            tests.append(test)
+        elif op in _REPEATS:
+            tests += _first(av[2])
+        elif op == sre_constants.SUBPATTERN:
+            tests += _first(av[-1])
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                tests += _first(branch)
+        elif getattr(sre_constants, "ATOMIC_GROUP", None) == op:
+            tests += _first(av)
+        if not _nullable([(op, av)]):
+            break
+    return tests
+
+
+def _chars(subpattern) -> list:
+    """Tests for every character the sequence can consume."""
+    tests = []
+    for op, av in subpattern:
+        test = _char_test(op, av)
+        if test is not None:
+            tests.append(test)
+        elif op in _REPEATS:
+            tests += _chars(av[2])
+        elif op == sre_constants.SUBPATTERN:
+            tests += _chars(av[-1])
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                tests += _chars(branch)
+        elif getattr(sre_constants, "ATOMIC_GROUP", None) == op:
+            tests += _chars(av)
+    return tests
+
+
+def _unbounded_chars(subpattern) -> list:
+    """Tests for the characters consumed by unbounded repeats anywhere in the sequence."""
+    tests = []
+    for op, av in subpattern:
+        if op in _REPEATS:
+            tests += _chars(av[2]) if _is_large(av[1]) else _unbounded_chars(av[2])
+        elif op == sre_constants.SUBPATTERN:
+            tests += _unbounded_chars(av[-1])
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                tests += _unbounded_chars(branch)
+        elif getattr(sre_constants, "ATOMIC_GROUP", None) == op:
+            tests += _unbounded_chars(av)
+    return tests
+
+
+def _check_regex_tree(subpattern, inside_repeat: bool, follow=()):
+    """
+    Walk a parsed pattern and reject constructs that backtrack super-linearly.
+
+    ``follow`` holds tests for what can come right after the sequence, so an
+    alternation inside an unbounded repeat is rejected when two alternatives can
+    start the same way, counting the next iteration for alternatives that can be
+    empty: ``(a|a)*``, ``(a|aa)+``. Two unbounded repeats that can consume the
+    same characters are rejected unless something between them can't be consumed
+    by the first one: ``\\w*\\w*`` and ``.*a.*b`` are, ``\\w+@\\w+`` is not.
+    """
+    subpattern = list(subpattern)
+    open_repeats = []
+    for i, (op, av) in enumerate(subpattern):
+        rest = subpattern[i + 1:]
+        after = _first(rest) + (list(follow) if _nullable(rest) else [])
+        if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            raise ValueError("backreferences are not allowed")
+        if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            raise ValueError("lookahead and lookbehind assertions are not allowed")
+        unbounded = _unbounded_chars([(op, av)])
+        if unbounded and any(_overlap(unbounded, previous) for previous in open_repeats):
+            raise ValueError("unbounded quantifiers that can match the same characters, such as \\w*\\w* or .*a.*b, "
+                             "are not allowed; use a bounded repeat such as .{0,50}")
+        if op in _REPEATS:
+            _, high, body = av
+            large = _is_large(high)
+            if large and inside_repeat:
+                raise ValueError("nested unbounded quantifiers such as (a+)+ are not allowed")
+            if not large and high > 1 and _unbounded_chars(body):
+                raise ValueError("repeating a group that holds an unbounded quantifier, such as (?:.*,){3}, is not allowed")
+            # After one iteration the repeat either loops or moves on
+            _check_regex_tree(body, inside_repeat or large, _first(body) + after if large else after)
+        elif op == sre_constants.SUBPATTERN:
+            body = av[-1]
+            # The parser merges single-character alternatives into one class: (\w|\d) becomes [\w\d]
+            if inside_repeat and len(body) == 1 and body[0][0] == sre_constants.IN:
+                items = [(o, a) for o, a in body[0][1] if o != sre_constants.NEGATE]
+                if len(items) == len(body[0][1]) and any(
+                        _overlap([_class_item_test(*x)], [_class_item_test(*y)])
+                        for n, x in enumerate(items) for y in items[n + 1:]):
+                    raise ValueError("overlapping alternatives inside an unbounded quantifier are not allowed")
+            _check_regex_tree(body, inside_repeat, after)
+        elif op == sre_constants.BRANCH:
+            if inside_repeat:
+                starts = [_first(branch) + (after if _nullable(branch) else []) for branch in av[1]]
+                if any(_overlap(a, b) for n, a in enumerate(starts) for b in starts[n + 1:]):
+                    raise ValueError("overlapping alternatives inside an unbounded quantifier such as (a|aa)+ are not allowed")
+            for branch in av[1]:
+                _check_regex_tree(branch, inside_repeat, after)
+        elif getattr(sre_constants, "ATOMIC_GROUP", None) == op:
+            _check_regex_tree(av, inside_repeat, after)
+        if not _nullable([(op, av)]):
+            # A required element ends an earlier repeat only if that repeat can't consume it
+            node_chars = _chars([(op, av)])
+            open_repeats = [previous for previous in open_repeats if _overlap(previous, node_chars)]
+        if unbounded:
+            open_repeats.append(unbounded)
+
+
+def validate_regex_pattern(pattern: str) -> str:
+    """
+    Reject regex rules that could backtrack catastrophically or can't be combined.
+
+    Raises ValueError with a client-facing reason; returns the pattern otherwise.
+    """
+    if not pattern:
+        raise ValueError("pattern must not be empty")
+    if len(pattern) > settings.GUARDRAIL_REGEX_MAX_PATTERN_LENGTH:
+        raise ValueError(f"pattern is longer than {settings.GUARDRAIL_REGEX_MAX_PATTERN_LENGTH} characters")
+    try:
+        parsed = sre_parse.parse(pattern)
+        compiled = re.compile(pattern)
+    except re.error as exc:
+        raise ValueError(f"invalid regular expression: {exc}")
+    if parsed.state.groupdict:
+        raise ValueError("named groups are not allowed")
+    if parsed.state.flags & ~re.UNICODE:
+        raise ValueError("global inline flags are not allowed; matching is already case-insensitive")
+    _check_regex_tree(parsed, False)
+    if compiled.fullmatch(""):
+        raise ValueError("pattern matches the empty string")
+    return pattern
+
+
+class RegexRuleSet:
+    """
+    All of a tenant's regex rules as one combined alternation, ``(?P<r0>...)|(?P<r1>...)``.
+
+    Clean text costs a single scan whatever the rule count. Matching runs on
+    google-re2, whose time is linear in the text for any pattern, so no single
+    match can run away; GUARDRAIL_REGEX_TIME_LIMIT_MS only ends scans that find
+    many matches. Patterns are still screened by ``validate_regex_pattern``.
+    """
+
+    def __init__(self, patterns: List[Tuple[int, str]]):
+        self.rule_indexes: List[int] = []
+        self._single = {}
+        parts = []
+        for rule_index, pattern in patterns:
+            try:
+                validate_regex_pattern(pattern)
+                single = re2.compile("(?i)" + pattern)
+            except Exception as exc:
+                # Rules written straight to the database skip API validation
+                logger.warning("Skipping invalid regex guardrail %r: %s", pattern, exc)
+                continue
+            self._single[rule_index] = single
+            parts.append(f"(?P<r{rule_index}>{pattern})")
+            self.rule_indexes.append(rule_index)
+        self._combined = re2.compile("(?i)" + "|".join(parts)) if parts else None
+        self.timeouts = 0
+
+    def __len__(self):
+        return len(self.rule_indexes)
+
+    def search(self, text: str) -> Set[int]:
+        """Rule indexes with a match in text, from one scan of the combined pattern."""
+        hits = set()
+        if self._combined is None:
+            return hits
+        deadline = time.perf_counter() + settings.GUARDRAIL_REGEX_TIME_LIMIT_MS / 1000
+        for match in self._combined.finditer(text):
+            hits.update(int(name[1:]) for name, value in match.groupdict().items() if value is not None)
+            if time.perf_counter() > deadline:
+                self.timeouts += 1
+                logger.warning("Regex guardrail scan hit the %sms cap", settings.GUARDRAIL_REGEX_TIME_LIMIT_MS)
+                break
+        return hits
+
+    def confirm(self, text: str, rule_indexes) -> Set[int]:
+        """Check rules one by one; used only for rules the combined scan could have shadowed."""
+        return {i for i in rule_indexes if i in self._single and self._single[i].search(text)}
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher: one pass over the text finds every pattern.
+
+    ``step`` is exposed so callers can carry the automaton state across chunks
+    of a stream instead of re-scanning the whole text.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._depth: List[int] = [0]
+        self.max_length = 0
+        for index, pattern in enumerate(patterns):
+            self._add(pattern, index)
+        self._link()
+
+    def _add(self, pattern: str, index: int):
+        if not pattern:
+            return
+        self.max_length = max(self.max_length, len(pattern))
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._depth.append(self._depth[state] + 1)
+            state = nxt
+        self._out[state] = self._out[state] + (index,)
+
+    def _link(self):
+        # Breadth-first so each state's fail target is already resolved
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def step(self, state: int, ch: str) -> Tuple[int, Tuple[int, ...]]:
+        """Advance by one character; returns the new state and the pattern indexes ending here."""
+        goto, fail = self._goto, self._fail
+        while state and ch not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(ch, 0)
+        return state, self._out[state]
+
+    def depth(self, state: int) -> int:
+        """Length of the longest pattern prefix the text seen so far ends with."""
+        return self._depth[state]
+
+    def search(self, text: str) -> set:
+        """Return the indexes of all patterns occurring in text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class CompiledGuardrails:
+    """
+    All of a tenant's active rules: phrases in a single automaton, regex rules
+    in a single combined pattern.
+
+    Text is normalized with ``normalize_for_match`` (phrases too). When
+    several rules hit, the first blocking rule (in stored order) wins; log_only
+    hits never stop evaluation and are reported under ``logged``.
+    """
+
+    def __init__(self, rules: List[Dict], version: int = 0):
+        self.version = version
+        self.rules: List[Dict] = []
+        patterns: Dict[str, int] = {}
+        # pattern index -> rule indexes; several rules may share a phrase
+        self._pattern_rules: List[List[int]] = []
+        regexes: List[Tuple[int, str]] = []
+        for rule in rules:
+            if rule.get("ruleType") not in RULE_DIRECTIONS:
+                continue
+            if rule["ruleType"] == REGEX_RULE_TYPE:
+                if rule.get("pattern"):
+                    regexes.append((len(self.rules), rule["pattern"]))
+                    self.rules.append(rule)
+                continue
+            pattern = normalize_for_match(rule.get("pattern", ""))
+            if not pattern:
+                continue
+            rule_index = len(self.rules)
+            self.rules.append(rule)
+            if pattern not in patterns:
+                patterns[pattern] = len(patterns)
+                self._pattern_rules.append([])
+            self._pattern_rules[patterns[pattern]].append(rule_index)
+        self.automaton = AhoCorasick(list(patterns))
+        self.regex = RegexRuleSet(regexes) if regexes else None
+
+    def __len__(self):
+        return len(self.rules)
+
+    def rules_for_patterns(self, pattern_indexes) -> List[int]:
+        return sorted({r for p in pattern_indexes for r in self._pattern_rules[p]})
+
+    def applies(self, rule: Dict, direction: str) -> bool:
+        return direction in RULE_DIRECTIONS[rule["ruleType"]]
+
+    def decide(self, rule_indexes: List[int], language: str, direction: str) -> Dict:
+        """Turn matched rule indexes into the guardrail result returned to callers."""
+        logged = []
+        blocking = None
+        for index in rule_indexes:
+            rule = self.rules[index]
+            if not self.applies(rule, direction):
+                continue
+            action = rule.get("action", "block_input")
+            if action in BLOCKING_ACTIONS:
+                blocking = blocking or guardrail_result(True, rule, language)
+            elif action == "log_only":
+                logged.append(guardrail_result(False, rule, language))
+        result = blocking or (dict(logged[0]) if logged else {"blocked": False})
+        if logged:
+            result["logged"] = logged
+        return result
+
+    def match_regex(self, normalized: str, matched: Set[int], language: str, direction: str) -> Dict:
+        """Add regex hits to matched and decide; re-checks earlier regex rules a combined match may have hidden."""
+        matched |= self.regex.search(normalized)
+        result = self.decide(sorted(matched), language, direction)
+        if result["blocked"] and matched & set(self.regex.rule_indexes):
+            winner = next(i for i in sorted(matched) if str(self.rules[i]["_id"]) == result["ruleId"])
+            shadowed = [i for i in self.regex.rule_indexes if i < winner and i not in matched]
+            found = self.regex.confirm(normalized, shadowed)
+            if found:
+                matched |= found
+                result = self.decide(sorted(matched), language, direction)
+        return result
+
+    def match(self, text: Union[str, NormalizedText]) -> Set[int]:
+        """Every rule with a hit in text, regardless of direction or action."""
+        normalized = normalize_for_match(text)
+        matched = set(self.rules_for_patterns(self.automaton.search(normalized)))
+        if self.regex is not None:
+            hits = self.regex.search(normalized)
+            if hits:
+                matched |= hits | self.regex.confirm(normalized, set(self.regex.rule_indexes) - hits)
+        return matched
+
+    def evaluate(self, text: Union[str, NormalizedText], language: str, direction: str = "input") -> Dict:
+        if not self.rules:
+            return {"blocked": False}
+        normalized = normalize_for_match(text)
+        matched = set(self.rules_for_patterns(self.automaton.search(normalized)))
+        if self.regex is not None:
+            return self.match_regex(normalized, matched, language, direction)
+        return self.decide(sorted(matched), language, direction)
+
+
+class StreamingGuardrail:
+    """
+    Evaluates a response while it streams in.
+
+    The automaton state carries across chunks, so a phrase split over two
+    chunks is still caught. ``feed`` returns the text that is safe to send:
+    everything except the tail that could still grow into a match, which is
+    never longer than the longest pattern. The first blocking hit stops the
+    stream and ``result`` then holds the rule's verdict.
+
+    Text is NFKC-folded a run at a time, where a run is a starter and the
+    combining marks after it. The last run is held back unmatched until the
+    next chunk, since a mark or a conjoining jamo arriving there can still
+    change how it normalizes; runs that compose with each other are folded
+    together.
+
+    Regex rules have no such bound: each chunk is scanned together with the
+    last GUARDRAIL_REGEX_STREAM_HOLD_CHARS characters, which are held back.
+    A longer regex match is still caught by the full scan in ``finish``,
+    after part of it may already have been sent.
+    """
+
+    def __init__(self, matcher: CompiledGuardrails, language: str, direction: str = "output"):
+        self.matcher = matcher
+        self.language = language
+        self.direction = direction
+        self.result: Optional[Dict] = None
+        self._state = 0
+        self._pending: List[str] = []
+        # Raw offset within _pending of the run each character fed to the automaton came from
+        self._offsets: List[int] = []
+        # _pending[:_fed] has been fed to the automaton; the rest is the held-back last run
+        self._fed = 0
+        self._matched = set()
+        self._seen = ""
+        self._hold = settings.GUARDRAIL_REGEX_STREAM_HOLD_CHARS if matcher.regex is not None else 0
+
+    @property
+    def blocked(self) -> bool:
+        return bool(self.result and self.result["blocked"])
+
+    def feed(self, chunk: str) -> str:
+        if self.blocked:
+            return ""
+        self._pending.extend(chunk)
+        if self._step(self._ready_runs()):
+            return self._block()
+        if self._hold:
+            self._seen += chunk
+            window = normalize_for_match(self._seen[-(len(chunk) + self._hold):])
+            if self.matcher.match_regex(window, self._matched, self.language, self.direction)["blocked"]:
+                return self._block()
+        keep = self.matcher.automaton.depth(self._state)
+        cut = self._offsets[-keep] if keep else self._fed
+        return self._release(min(cut, max(0, len(self._pending) - self._hold)))
+
+    def _ready_runs(self) -> List[Tuple[int, int]]:
+        """Split the unfed text into runs that normalize independently, all but the last one."""
+        text = self._pending
+        starters = [i for i in range(self._fed + 1, len(text)) if not unicodedata.combining(text[i])]
+        nfkc = lambda t: unicodedata.normalize("NFKC", t)
+        runs, begin = [], self._fed
+        for start, end in zip(starters, starters[1:] + [len(text)]):
+            left, right = "".join(text[begin:start]), "".join(text[start:end])
+            if nfkc(left + right) == nfkc(left) + nfkc(right):
+                runs.append((begin, start))
+                begin = start
+        return runs
+
+    def _step(self, runs: List[Tuple[int, int]]) -> bool:
+        """Feed runs to the automaton; True once a blocking rule matches."""
+        automaton = self.matcher.automaton
+        for begin, end in runs:
+            self._fed = end
+            for folded in normalize_for_match("".join(self._pending[begin:end])):
+                self._state, hits = automaton.step(self._state, folded)
+                self._offsets.append(begin)
+                if not hits:
+                    continue
+                rules = self.matcher.rules_for_patterns(hits)
+                self._matched.update(rules)
+                if self.matcher.decide(rules, self.language, self.direction)["blocked"]:
+                    return True
+        return False
+
+    def _block(self) -> str:
+        self.result = self.matcher.decide(sorted(self._matched), self.language, self.direction)
+        self._pending, self._offsets, self._fed = [], [], 0
+        return ""
+
+    def _release(self, cut: int) -> str:
+        released = "".join(self._pending[:cut])
+        self._pending = self._pending[cut:]
+        self._offsets = [o - cut for o in self._offsets if o >= cut]
+        self._fed -= cut
+        return released
+
+    def finish(self) -> str:
+        """End of stream: release the held-back tail and settle the verdict."""
+        if self.blocked:
+            return ""
+        if self._fed < len(self._pending) and self._step([(self._fed, len(self._pending))]):
+            return self._block()
+        if self._hold:
+            self.result = self.matcher.match_regex(normalize_for_match(self._seen), self._matched, self.language, self.direction)
+            if self.blocked:
+                return self._block()
+        else:
+            self.result = self.matcher.decide(sorted(self._matched), self.language, self.direction)
+        return self._release(len(self._pending))
+
+
+SAMPLE_TEXT_CHARS = 200
+
+
+async def evaluate_corpus(matcher: CompiledGuardrails, corpus: AsyncIterator[Dict], batch_size: int = 500, sample_size: int = 5) -> Dict:
+    """
+    Dry-run a rule set over a corpus without touching live traffic.
+
+    ``corpus`` yields dicts with ``text`` and ``direction`` (plus optional
+    ``sessionId``/``timestamp`` kept on samples). Items are consumed as they
+    arrive, so a database cursor is never materialized; the loop yields to the
+    event loop after every batch.
+    """
+    per_rule = [{"hits": 0, "samples": []} for _ in matcher.rules]
+    scanned = blocked = logged = 0
+    started = time.perf_counter()
+    async for item in corpus:
+        text, direction = item.get("text") or "", item.get("direction", "input")
+        hits = [i for i in sorted(matcher.match(text)) if matcher.applies(matcher.rules[i], direction)]
+        verdict = matcher.decide(hits, "en", direction)
+        blocked += verdict["blocked"]
+        logged += bool(verdict.get("logged"))
+        for index in hits:
+            stats = per_rule[index]
+            stats["hits"] += 1
+            if len(stats["samples"]) < sample_size:
+                sample = {"text": text[:SAMPLE_TEXT_CHARS], "direction": direction}
+                sample.update({k: item[k] for k in ("sessionId", "timestamp") if k in item})
+                stats["samples"].append(sample)
+        scanned += 1
+        if scanned % batch_size == 0:
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    return {
+        "scanned": scanned,
+        "blocked": blocked,
+        "logged": logged,
+        "rules": [
+            {"ruleId": str(rule["_id"]), "ruleName": rule.get("ruleName"), "ruleType": rule["ruleType"], "action": rule.get("action", "block_input"), **per_rule[i]}
+            for i, rule in enumerate(matcher.rules)
+        ],
+        "elapsedMs": round(elapsed * 1000, 3),
+        "messagesPerSecond": round(scanned / elapsed) if elapsed > 0 else None,
+    }
+
+
+class GuardrailMatcherCache:
+    """
+    Per-tenant compiled matchers, rebuilt when the app's guardrailVersion moves.
+
+    The version counter lives on the app document, so every worker notices a
+    rule change on its next request without any extra round trip.
+    """
+
+    def __init__(self):
+        self._matchers: Dict[str, CompiledGuardrails] = {}
+        self._compiling = SingleFlight(wait_timeout=30.0)
+        self.hits = 0
+        self.compiles = 0
+        self.last_compile_ms = 0.0
+
+    def cached(self, app_id: str, version: int) -> Optional[CompiledGuardrails]:
+        matcher = self._matchers.get(app_id)
+        if matcher is not None and matcher.version == version:
+            return matcher
+        return None
+
+    async def get(self, app_id: str, version: int, guardrails_collection) -> CompiledGuardrails:
+        matcher = self.cached(app_id, version)
+        if matcher is not None:
+            self.hits += 1
+            return matcher
+        return await self._compiling.do(
+            f"{app_id}:{version}",
+            lambda: self._compile(app_id, version, guardrails_collection)
+        )
+
+    async def _compile(self, app_id: str, version: int, guardrails_collection) -> CompiledGuardrails:
+        rules = await guardrails_collection.find({"app_id": app_id, "isActive": True}).to_list(None)
+        started = time.perf_counter()
+        matcher = CompiledGuardrails(rules, version)
+        self.last_compile_ms = round((time.perf_counter() - started) * 1000, 3)
+        self.compiles += 1
+        self._matchers[app_id] = matcher
+        logger.info("Compiled %d guardrail rules for app %s (v%s) in %.1fms", len(matcher), app_id, version, self.last_compile_ms)
+        return matcher
+
+    def invalidate(self, app_id: str):
+        self._matchers.pop(app_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            "apps": len(self._matchers),
+            "rules": sum(len(m) for m in self._matchers.values()),
+            "regexRules": sum(len(m.regex) for m in self._matchers.values() if m.regex is not None),
+            "regexTimeouts": sum(m.regex.timeouts for m in self._matchers.values() if m.regex is not None),
+            "regexEngine": "re2" if re2 is not None else "re",
+            "hits": self.hits,
+            "compiles": self.compiles,
+            "lastCompileMs": self.last_compile_ms,
+        }
+
+
+guardrail_matchers = GuardrailMatcherCache()
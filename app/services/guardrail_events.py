@@ -0,0 +1,53 @@
+# app/services/guardrail_events.py
+from typing import Dict, Optional
+import datetime
+import uuid
+from app.config import settings
+from app.services.analytics import conversation_analytics
+from app.services.write_behind import WriteBehindBuffer
+from app.utils.database import get_app_collection_by_name
+
+SNIPPET_CHARS = 200
+
+
+async def _events_collection(app_id: str):
+    return await get_app_collection_by_name(app_id, "guardrail_events")
+
+
+def record_guardrail_hits(app_id: str, session_id: Optional[str], direction: str, result: Dict, text, language: str) -> int:
+    """
+    Queue one guardrail_events document per hit in a guardrail result: the
+    blocking rule (if any) and every log_only rule, and count the result in the
+    analytics rollups. Returns how many events were queued.
+    """
+    conversation_analytics.record_guardrail(app_id, language, direction, result)
+    if not settings.GUARDRAIL_EVENTS_ENABLED:
+        return 0
+    hits = [(result["ruleId"], "blocked")] if result.get("blocked") else []
+    hits += [(hit["ruleId"], "logged") for hit in result.get("logged", [])]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    snippet = str(text)[:SNIPPET_CHARS]
+    queued = 0
+    for rule_id, outcome in hits:
+        queued += guardrail_events.put(app_id, {
+            "_id": str(uuid.uuid4()),
+            "appId": app_id,
+            "sessionId": session_id,
+            "ruleId": rule_id,
+            "outcome": outcome,
+            "direction": direction,
+            "language": language,
+            "snippet": snippet,
+            "timestamp": now,
+        })
+    return queued
+
+
+# Global audit log buffer; started and flushed in the app lifespan
+guardrail_events = WriteBehindBuffer(
+    "guardrail_events",
+    _events_collection,
+    max_size=settings.GUARDRAIL_EVENTS_MAX_QUEUE,
+    batch_size=settings.GUARDRAIL_EVENTS_BATCH_SIZE,
+    interval=settings.GUARDRAIL_EVENTS_FLUSH_SECONDS,
+)
@@ -0,0 +1,148 @@
+# app/services/intents.py
+from typing import Any, Dict, List, Optional, Tuple
+import json
+from app.config import settings
+from app.services.language_id import language_identifier
+from app.utils.text import NormalizedText
+
+INTENT_TYPES = ("greeting", "thanks", "language_switch", "handoff")
+
+# Used for any intent an app hasn't configured; language_switch maps phrase -> language code
+DEFAULT_INTENTS = {
+    "greeting": {"phrases": ["hi", "hello", "hey", "good morning", "good afternoon", "good evening", "hola", "buenos días", "bonjour", "salut"]},
+    "thanks": {"phrases": ["thank you", "thanks", "thx", "thank you so much", "thanks so much", "thanks a lot",
+                           "gracias", "muchas gracias", "merci", "merci beaucoup"]},
+    "language_switch": {"phrases": {
+        "switch to spanish": "es",
+        "speak in spanish": "es",
+        "switch to french": "fr",
+        "speak in french": "fr",
+        "switch to english": "en",
+        "speak in english": "en",
+    }},
+    "handoff": {"phrases": []},
+}
+# Greetings and thanks are only answered directly when they are (nearly) the whole message:
+# a short message with no question mark and at most this many words outside the phrases
+DEFAULT_MAX_TRIVIAL_TOKENS = 5
+MAX_EXTRA_TRIVIAL_TOKENS = 1
+# Intents whose phrases count towards a trivial message
+TRIVIAL_INTENTS = ("greeting", "thanks")
+DEFAULT_HANDOFF_MESSAGE = "I'll connect you with a member of our team."
+
+_END = "$"
+
+
+class IntentTable:
+    """
+    Phrase trie over word tokens for one app's intents.
+
+    Phrases only match on whole words ("hi" does not fire inside "this"), and
+    matching walks the trie from each token of the message, so the cost is a
+    handful of dict lookups per token.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.max_trivial_tokens = config.get("maxTrivialTokens", DEFAULT_MAX_TRIVIAL_TOKENS)
+        self.responses: Dict[str, Dict[str, str]] = {}
+        self._trie: Dict = {}
+        for intent in INTENT_TYPES:
+            entry = config.get(intent) or DEFAULT_INTENTS[intent]
+            self.responses[intent] = entry.get("responses") or {}
+            phrases = entry.get("phrases") or []
+            if isinstance(phrases, dict):
+                items = list(phrases.items())
+            else:
+                items = [(phrase, True) for phrase in phrases]
+            for phrase, value in items:
+                self._add(NormalizedText(phrase).tokens, intent, value)
+
+    def _add(self, tokens: List[str], intent: str, value: Any):
+        if not tokens:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(_END, []).append((intent, value))
+
+    def match(self, text: NormalizedText) -> Dict[str, Any]:
+        """Intents found in the message (first value per intent) plus whether the turn is trivial."""
+        tokens = text.tokens
+        found: Dict[str, Any] = {}
+        covered = set()
+        for start in range(len(tokens)):
+            node = self._trie
+            for end, token in enumerate(tokens[start:], start + 1):
+                node = node.get(token)
+                if node is None:
+                    break
+                for intent, value in node.get(_END, ()):
+                    found.setdefault(intent, value)
+                    if intent in TRIVIAL_INTENTS:
+                        covered.update(range(start, end))
+        # "hi where is my order" or "hello, what are your hours?" carry a real request
+        found["trivial"] = (0 < len(tokens) <= self.max_trivial_tokens and "?" not in text.raw
+                            and len(tokens) - len(covered) <= MAX_EXTRA_TRIVIAL_TOKENS)
+        return found
+
+    def response(self, intent: str, language: str, default: Optional[str]) -> Optional[str]:
+        return self.responses[intent].get(language) or default
+
+
+class IntentTableCache:
+    """Compiled intent tables per app, rebuilt when the app's `intents` setting changes."""
+
+    def __init__(self):
+        self._tables: Dict[str, Tuple[str, IntentTable]] = {}
+
+    def get(self, app_id: str, app: Dict) -> IntentTable:
+        config = app.get("intents") or {}
+        tag = json.dumps(config, sort_keys=True, default=str)
+        cached = self._tables.get(app_id)
+        if cached is not None and cached[0] == tag:
+            return cached[1]
+        table = IntentTable(config)
+        self._tables[app_id] = (tag, table)
+        return table
+
+
+def intent_response(app: Dict, table: IntentTable, found: Dict[str, Any], language: str) -> Optional[Tuple[str, str]]:
+    """(intent, message) when the turn can be answered without retrieval or the LLM."""
+    if found.get("handoff"):
+        return "handoff", table.response("handoff", language, DEFAULT_HANDOFF_MESSAGE)
+    if not found["trivial"]:
+        return None
+    if found.get("thanks"):
+        return "thanks", table.response("thanks", language, app.get("acknowledgmentMessage", {}).get(language, "You're welcome!"))
+    if found.get("greeting"):
+        return "greeting", table.response("greeting", language, app.get("welcomeMessage", {}).get(language, "Welcome!"))
+    return None
+
+
+def language_detection_config(app: Dict) -> Dict[str, Any]:
+    return {
+        "enabled": settings.LANGUAGE_DETECTION_ENABLED,
+        "minChars": settings.LANGUAGE_DETECTION_MIN_CHARS,
+        "minConfidence": settings.LANGUAGE_DETECTION_MIN_CONFIDENCE,
+        **(app.get("languageDetection") or {}),
+    }
+
+
+def detect_language(app: Dict, text: NormalizedText, current: str) -> Optional[str]:
+    """
+    A different language the message is confidently written in, chosen among
+    the app's availableLanguages; None to keep the session language.
+    """
+    config = language_detection_config(app)
+    candidates = app.get("availableLanguages") or []
+    if not config["enabled"] or len(candidates) < 2 or len(text.clean) < config["minChars"]:
+        return None
+    language, confidence = language_identifier.detect(text.folded, candidates)
+    if language is None or language == current or confidence < config["minConfidence"]:
+        return None
+    return language
+
+
+# Global per-app intent tables
+intent_tables = IntentTableCache()
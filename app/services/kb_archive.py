@@ -0,0 +1,241 @@
+# app/services/kb_archive.py
+"""
+Portable export/import of a tenant's knowledge base.
+
+An archive is a tar file (gzip-compressed when the name ends in .gz/.tgz) holding:
+
+    manifest.json     format, version, source appId, counts, embedding model and shape
+    app.json          app settings (no connection string, version counters or, by default, API key)
+    guardrails.jsonl  one guardrail per line
+    embeddings.npy    float32 matrix, one row per content item that has an embedding
+    content.jsonl     one content item per line, without its embedding; ``embeddingRow``
+                      points at its row in embeddings.npy
+
+Documents are written as MongoDB extended JSON, so ObjectIds and dates survive.
+Both directions stream: export writes rows to scratch files next to the target
+before packing them, and import memory-maps the matrix and loads content in
+batches with idempotent upserts, so tenants larger than RAM can be moved and
+an interrupted import can simply be rerun. Embeddings are never recomputed.
+"""
+from typing import Any, Dict, Optional
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import uuid
+import numpy as np
+from bson import ObjectId, json_util
+from pymongo import ReplaceOne
+from app.db_manager import app_collection
+from app.services.embedding import GEMMA_EMBEDDING_MODEL
+from app.utils.chat_messages import LAYOUT_FIELD, MIGRATION_FIELD
+from app.utils.database import (
+    get_app_and_collections, bump_app_version, CONTENT_VERSION_FIELD, GUARDRAIL_VERSION_FIELD
+)
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "kge-kb"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+SETTINGS = "app.json"
+GUARDRAILS = "guardrails.jsonl"
+EMBEDDINGS = "embeddings.npy"
+CONTENT = "content.jsonl"
+# embeddings.npy precedes content.jsonl so a compressed archive is read front to back
+MEMBERS = (MANIFEST, SETTINGS, GUARDRAILS, EMBEDDINGS, CONTENT)
+EMBEDDING_ROW_FIELD = "embeddingRow"
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+IMPORT_BATCH_SIZE = 1000
+
+# App fields tied to the source deployment: never exported, and dropped from older
+# archives on import. The API key is only exported on request.
+LOCAL_APP_FIELDS = ("_id", "mongodbConnectionString", CONTENT_VERSION_FIELD, GUARDRAIL_VERSION_FIELD,
+                    LAYOUT_FIELD, MIGRATION_FIELD, "tokenUsage")
+SECRET_APP_FIELDS = ("googleApiKey",)
+# Content and guardrails carry the app id under either spelling
+APP_ID_FIELDS = ("app_id", "appId")
+
+
+def _tar_mode(path: str, write: bool) -> str:
+    if not write:
+        return "r:*"
+    return "w:gz" if path.endswith((".gz", ".tgz")) else "w"
+
+
+def _app_query(app_id: str) -> Dict:
+    return {"$or": [{field: app_id} for field in APP_ID_FIELDS]}
+
+
+def target_id(source_id, app_id: str):
+    """
+    _id of a document copied into another app: derived from (app, source _id),
+    so a rerun replaces the same copies, and of the same type as the source.
+    """
+    digest = hashlib.sha1(f"{app_id}:{type(source_id).__name__}:{source_id}".encode()).digest()
+    if isinstance(source_id, ObjectId):
+        return ObjectId(digest[:12])
+    return str(uuid.UUID(bytes=digest[:16], version=5))
+
+
+def _retarget(doc: Dict, app_id: str, new_ids: bool) -> Dict:
+    for field in APP_ID_FIELDS:
+        if field in doc:
+            doc[field] = app_id
+    if new_ids:
+        # app_content/app_guardrails are shared by tenants of one database; reusing the
+        # source _ids would overwrite (and move) the source app's documents
+        doc["_id"] = target_id(doc["_id"], app_id)
+    return doc
+
+
+def _dumps(doc: Dict) -> str:
+    return json_util.dumps(doc, json_options=JSON_OPTIONS) + "\n"
+
+
+async def export_kb(app_id: str, path: str, include_secrets: bool = False) -> Dict[str, Any]:
+    """Write the app's content, embeddings, guardrails and settings to the archive at `path`."""
+    app, collections = await get_app_and_collections(app_id)
+    settings_doc = {k: v for k, v in app.items()
+                    if k not in LOCAL_APP_FIELDS and (include_secrets or k not in SECRET_APP_FIELDS)}
+    counts = {"content": 0, "embeddings": 0, "guardrails": 0}
+    dim = None
+
+    # Scratch files sit next to the archive so large tenants don't fill /tmp
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as scratch:
+        staged = lambda name: os.path.join(scratch, name)
+        with open(staged(SETTINGS), "w", encoding="utf-8") as out:
+            out.write(_dumps(settings_doc))
+
+        with open(staged(GUARDRAILS), "w", encoding="utf-8") as out:
+            async for rule in collections['app_guardrails'].find(_app_query(app_id)).sort("_id", 1):
+                out.write(_dumps(rule))
+                counts["guardrails"] += 1
+
+        raw_rows = staged("embeddings.f32")
+        with open(staged(CONTENT), "w", encoding="utf-8") as out, open(raw_rows, "wb") as rows:
+            async for doc in collections['app_content'].find(_app_query(app_id)).sort("_id", 1):
+                embedding = doc.pop("embedding", None)
+                if embedding:
+                    if dim is None:
+                        dim = len(embedding)
+                    if len(embedding) != dim:
+                        raise ValueError(f"Content {doc['_id']} has a {len(embedding)}-dim embedding, expected {dim}")
+                    rows.write(np.asarray(embedding, dtype="<f4").tobytes())
+                    doc[EMBEDDING_ROW_FIELD] = counts["embeddings"]
+                    counts["embeddings"] += 1
+                out.write(_dumps(doc))
+                counts["content"] += 1
+
+        # The row count is only known now; prepend the .npy header to the raw rows
+        with open(staged(EMBEDDINGS), "wb") as out, open(raw_rows, "rb") as rows:
+            header = {"descr": "<f4", "fortran_order": False, "shape": (counts["embeddings"], dim or 0)}
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(rows, out)
+        os.remove(raw_rows)
+
+        manifest = {
+            "format": FORMAT,
+            "version": FORMAT_VERSION,
+            "appId": app_id,
+            "exportedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "counts": counts,
+            "embedding": {"model": GEMMA_EMBEDDING_MODEL, "dtype": "float32", "dim": dim or 0},
+            "includesSecrets": include_secrets,
+        }
+        with open(staged(MANIFEST), "w", encoding="utf-8") as out:
+            json.dump(manifest, out, indent=2)
+
+        with tarfile.open(path, _tar_mode(path, write=True)) as tar:
+            for name in MEMBERS:
+                tar.add(staged(name), arcname=name)
+    return manifest
+
+
+def _read_manifest(tar: tarfile.TarFile) -> Dict[str, Any]:
+    manifest = json.load(tar.extractfile(MANIFEST))
+    if manifest.get("format") != FORMAT or manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Not a {FORMAT} v{FORMAT_VERSION} archive: {manifest.get('format')} v{manifest.get('version')}")
+    return manifest
+
+
+def _lines(tar: tarfile.TarFile, name: str):
+    for line in tar.extractfile(name):
+        if line.strip():
+            yield json_util.loads(line)
+
+
+async def _upsert(collection, docs) -> int:
+    if docs:
+        await collection.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs], ordered=False)
+    return len(docs)
+
+
+async def import_kb(path: str, app_id: Optional[str] = None, mongodb_uri: Optional[str] = None,
+                    force: bool = False) -> Dict[str, Any]:
+    """
+    Load an archive into `app_id` (default: the exported app). A missing app is
+    created from the archived settings, which needs `mongodb_uri`. Rerunning an
+    import replaces the same documents instead of duplicating them. Importing
+    into an app other than the exported one gives every document a new _id (see
+    target_id), so cloning a tenant within one database leaves the source intact.
+    """
+    imported = {"content": 0, "embeddings": 0, "guardrails": 0}
+    with tarfile.open(path, _tar_mode(path, write=False)) as tar, tempfile.TemporaryDirectory(
+            dir=os.path.dirname(os.path.abspath(path))) as scratch:
+        manifest = _read_manifest(tar)
+        model = manifest["embedding"]["model"]
+        if model != GEMMA_EMBEDDING_MODEL and not force:
+            raise ValueError(f"Archive embeddings come from {model}, this deployment uses {GEMMA_EMBEDDING_MODEL}")
+        app_id = app_id or manifest["appId"]
+        new_ids = app_id != manifest["appId"]
+
+        settings_doc = {k: v for k, v in json_util.loads(tar.extractfile(SETTINGS).read()).items()
+                        if k not in LOCAL_APP_FIELDS}
+        if await app_collection.find_one({"_id": app_id}, {"_id": 1}):
+            if mongodb_uri:
+                settings_doc["mongodbConnectionString"] = mongodb_uri
+            if settings_doc:
+                await app_collection.update_one({"_id": app_id}, {"$set": settings_doc})
+        else:
+            if not mongodb_uri:
+                raise ValueError(f"App {app_id} does not exist; a MongoDB connection string is needed to create it")
+            await app_collection.insert_one({**settings_doc, "_id": app_id, "mongodbConnectionString": mongodb_uri})
+        app, collections = await get_app_and_collections(app_id)
+
+        batch = []
+        for rule in _lines(tar, GUARDRAILS):
+            batch.append(_retarget(rule, app_id, new_ids))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                imported["guardrails"] += await _upsert(collections['app_guardrails'], batch)
+                batch = []
+        imported["guardrails"] += await _upsert(collections['app_guardrails'], batch)
+
+        # Memory-mapped, so only the rows of the current batch are paged in
+        tar.extract(EMBEDDINGS, scratch)
+        matrix = np.load(os.path.join(scratch, EMBEDDINGS), mmap_mode="r")
+        expected = (manifest["counts"]["embeddings"], manifest["embedding"]["dim"])
+        if matrix.dtype != np.float32 or matrix.shape != expected:
+            raise ValueError(f"embeddings.npy is {matrix.dtype} {matrix.shape}, manifest says float32 {expected}")
+
+        batch = []
+        for doc in _lines(tar, CONTENT):
+            row = doc.pop(EMBEDDING_ROW_FIELD, None)
+            if row is not None:
+                doc["embedding"] = matrix[row].tolist()
+                imported["embeddings"] += 1
+            batch.append(_retarget(doc, app_id, new_ids))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                imported["content"] += await _upsert(collections['app_content'], batch)
+                batch = []
+        imported["content"] += await _upsert(collections['app_content'], batch)
+        del matrix
+
+    await bump_app_version(app_id, CONTENT_VERSION_FIELD)
+    await bump_app_version(app_id, GUARDRAIL_VERSION_FIELD)
+    logger.info("Imported %s into app %s: %s", path, app_id, imported)
+    return {"appId": app_id, **imported}
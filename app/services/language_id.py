@@ -0,0 +1,129 @@
+# app/services/language_id.py
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import math
+import re
+
+# Short samples of the kind of text customers type into a support chat. Character
+# trigram profiles built from them are enough to tell these languages apart on
+# a sentence or two; no model files or network calls are involved.
+SEED_TEXT = {
+    "en": """
+        hello i would like to know how i can return the order i placed last week.
+        what are your opening hours and where is the nearest store? thank you for the help.
+        can you tell me the price of the shipping and when my package will arrive?
+        i have a problem with my account and i cannot log in. please help me with this.
+        do you have this product in another size or colour? which one would you recommend?
+        the payment did not go through and i was charged twice, what should i do now?
+        is it possible to change the delivery address after the order has been shipped?
+        i want to cancel my subscription and get a refund for this month.
+    """,
+    "es": """
+        hola quisiera saber cómo puedo devolver el pedido que hice la semana pasada.
+        cuál es el horario de atención y dónde está la tienda más cercana? gracias por la ayuda.
+        me puede decir el precio del envío y cuándo llegará mi paquete?
+        tengo un problema con mi cuenta y no puedo iniciar sesión. por favor ayúdeme con esto.
+        tienen este producto en otra talla o color? cuál me recomienda usted?
+        el pago no se realizó y me cobraron dos veces, qué debo hacer ahora?
+        es posible cambiar la dirección de entrega después de que el pedido fue enviado?
+        quiero cancelar mi suscripción y recibir un reembolso de este mes.
+    """,
+    "fr": """
+        bonjour je voudrais savoir comment je peux retourner la commande passée la semaine dernière.
+        quels sont vos horaires d'ouverture et où se trouve le magasin le plus proche? merci pour votre aide.
+        pouvez-vous me dire le prix de la livraison et quand mon colis arrivera?
+        j'ai un problème avec mon compte et je ne peux pas me connecter. aidez-moi s'il vous plaît.
+        avez-vous ce produit dans une autre taille ou une autre couleur? lequel me conseillez-vous?
+        le paiement n'est pas passé et j'ai été débité deux fois, que dois-je faire maintenant?
+        est-il possible de changer l'adresse de livraison après l'expédition de la commande?
+        je veux annuler mon abonnement et être remboursé pour ce mois.
+    """,
+    "de": """
+        hallo ich möchte wissen wie ich die bestellung von letzter woche zurückgeben kann.
+        wie sind ihre öffnungszeiten und wo ist das nächste geschäft? vielen dank für die hilfe.
+        können sie mir den preis für den versand sagen und wann mein paket ankommt?
+        ich habe ein problem mit meinem konto und kann mich nicht anmelden. bitte helfen sie mir.
+        haben sie dieses produkt in einer anderen größe oder farbe? welches würden sie empfehlen?
+        die zahlung ist nicht durchgegangen und mir wurde zweimal abgebucht, was soll ich jetzt tun?
+        ist es möglich die lieferadresse zu ändern nachdem die bestellung verschickt wurde?
+        ich möchte mein abonnement kündigen und eine erstattung für diesen monat bekommen.
+    """,
+    "it": """
+        ciao vorrei sapere come posso restituire l'ordine che ho fatto la settimana scorsa.
+        quali sono i vostri orari di apertura e dov'è il negozio più vicino? grazie per l'aiuto.
+        mi potete dire il prezzo della spedizione e quando arriverà il mio pacco?
+        ho un problema con il mio account e non riesco ad accedere. per favore aiutatemi.
+        avete questo prodotto in un'altra taglia o colore? quale mi consigliate?
+        il pagamento non è andato a buon fine e mi hanno addebitato due volte, cosa devo fare adesso?
+        è possibile cambiare l'indirizzo di consegna dopo che l'ordine è stato spedito?
+        voglio annullare il mio abbonamento e avere un rimborso per questo mese.
+    """,
+    "pt": """
+        olá gostaria de saber como posso devolver a encomenda que fiz na semana passada.
+        qual é o horário de funcionamento e onde fica a loja mais próxima? obrigado pela ajuda.
+        pode me dizer o preço do envio e quando o meu pacote vai chegar?
+        tenho um problema com a minha conta e não consigo entrar. por favor me ajude com isso.
+        vocês têm este produto em outro tamanho ou cor? qual você recomenda?
+        o pagamento não foi concluído e fui cobrado duas vezes, o que devo fazer agora?
+        é possível mudar o endereço de entrega depois que a encomenda foi enviada?
+        quero cancelar a minha assinatura e receber um reembolso deste mês.
+    """,
+}
+
+_NON_LETTERS = re.compile(r"[^\w']+|\d+|_")
+
+
+def _trigrams(text: str) -> Iterable[str]:
+    for word in _NON_LETTERS.sub(" ", text).split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3]
+
+
+class LanguageIdentifier:
+    """
+    Naive-Bayes over character trigrams with add-one smoothing.
+
+    ``detect`` returns (language, confidence) where confidence is the posterior
+    of the best language among the candidates, or (None, 0.0) when there is
+    nothing to score.
+    """
+
+    def __init__(self, samples: Dict[str, str]):
+        self._logprob: Dict[str, Dict[str, float]] = {}
+        self._unseen: Dict[str, float] = {}
+        vocabulary = set()
+        counts = {}
+        for language, text in samples.items():
+            counts[language] = Counter(_trigrams(text.casefold()))
+            vocabulary.update(counts[language])
+        for language, counter in counts.items():
+            total = sum(counter.values()) + len(vocabulary) + 1
+            self._logprob[language] = {g: math.log((c + 1) / total) for g, c in counter.items()}
+            self._unseen[language] = math.log(1 / total)
+
+    @property
+    def languages(self) -> List[str]:
+        return list(self._logprob)
+
+    def scores(self, folded_text: str, candidates: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        languages = [l for l in (candidates or self._logprob) if l in self._logprob]
+        grams = list(_trigrams(folded_text))
+        if not grams or not languages:
+            return {}
+        return {
+            language: sum(self._logprob[language].get(g, self._unseen[language]) for g in grams)
+            for language in languages
+        }
+
+    def detect(self, folded_text: str, candidates: Optional[Iterable[str]] = None) -> Tuple[Optional[str], float]:
+        scores = self.scores(folded_text, candidates)
+        if not scores:
+            return None, 0.0
+        best = max(scores, key=scores.get)
+        total = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1.0 / total
+
+
+# Global identifier built once from the seed samples
+language_identifier = LanguageIdentifier(SEED_TEXT)
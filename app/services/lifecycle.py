@@ -0,0 +1,363 @@
+# app/services/lifecycle.py
+from typing import Any, Dict, Iterable, List, Optional
+import asyncio
+import datetime
+import gzip
+import io
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from bson import json_util
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from app.config import settings
+from app.db_manager import db_manager, app_collection
+from app.utils.chat_messages import from_storage, message_filter, to_storage
+from app.utils.database import get_app_and_collections
+
+try:
+    # Optional: zstd archives are smaller and cheaper to write; gzip is used otherwise
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Extended JSON keeps dates and ObjectIds intact through archive and restore
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+DAY_SECONDS = 86400
+RESTORE_BATCH_SIZE = 1000
+
+_leases = db_manager.get_main_db()["lifecycle_leases"]
+_owner = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def archive_extension() -> str:
+    return ".jsonl.zst" if zstandard is not None else ".jsonl.gz"
+
+
+def open_archive_writer(path: str):
+    if path.endswith(".zst"):
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb")), encoding="utf-8")
+    return gzip.open(path, "wt", encoding="utf-8")
+
+
+def open_archive_reader(path: str):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Reading .zst archives needs the zstandard package")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    return gzip.open(path, "rt", encoding="utf-8")
+
+
+class LocalArchiveStore:
+    """Archive files under a local or mounted directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    async def put(self, local_path: str, key: str) -> None:
+        dest = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        await asyncio.to_thread(shutil.move, local_path, dest)
+
+    async def fetch(self, key: str, scratch_dir: str) -> str:
+        return os.path.join(self.root, key)
+
+
+class S3ArchiveStore:
+    """Archive files in an S3-compatible bucket; needs boto3 (endpoint and credentials come from the AWS_* environment)."""
+
+    def __init__(self, bucket: str, prefix: str = ""):
+        import boto3
+        self.client = boto3.client("s3")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    async def put(self, local_path: str, key: str) -> None:
+        await asyncio.to_thread(self.client.upload_file, local_path, self.bucket, self.prefix + key)
+
+    async def fetch(self, key: str, scratch_dir: str) -> str:
+        path = os.path.join(scratch_dir, os.path.basename(key))
+        await asyncio.to_thread(self.client.download_file, self.bucket, self.prefix + key, path)
+        return path
+
+
+def archive_store(uri: str):
+    """A directory path, or s3://bucket/prefix."""
+    if uri.startswith("s3://"):
+        bucket, _, prefix = uri[len("s3://"):].partition("/")
+        return S3ArchiveStore(bucket, prefix)
+    return LocalArchiveStore(uri)
+
+
+async def _ttl_index(collection, field: str, seconds: int) -> None:
+    try:
+        await collection.create_index([(field, 1)], expireAfterSeconds=seconds)
+    except OperationFailure as e:
+        if e.code not in (85, 86):
+            raise
+        # Retention changed since the index was built: update it in place
+        await collection.database.command("collMod", collection.name, index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds})
+
+
+async def ensure_lifecycle_indexes(collections: Dict[str, Any]) -> None:
+    """Index for the idle/archive scans, plus TTL backstops where configured."""
+    await collections['chat_sessions'].create_index([("status", 1), ("lastActiveAt", 1)])
+    if settings.GUARDRAIL_EVENTS_TTL_DAYS > 0:
+        await _ttl_index(collections['guardrail_events'], "timestamp", settings.GUARDRAIL_EVENTS_TTL_DAYS * DAY_SECONDS)
+    if settings.CHAT_DATA_TTL_DAYS <= 0:
+        return
+    if settings.CHAT_ARCHIVE_ENABLED and settings.CHAT_DATA_TTL_DAYS <= settings.CHAT_ARCHIVE_AFTER_DAYS:
+        logger.warning("[lifecycle] CHAT_DATA_TTL_DAYS must exceed CHAT_ARCHIVE_AFTER_DAYS; chat data TTL not applied")
+        return
+    seconds = settings.CHAT_DATA_TTL_DAYS * DAY_SECONDS
+    await _ttl_index(collections['chat_sessions'], "lastActiveAt", seconds)
+    messages = collections['chat_messages']
+    if collections['chat_messages_layout'] == "timeseries":
+        # Time-series collections expire whole buckets through a collection option, not an index
+        await messages.database.command("collMod", messages.name, expireAfterSeconds=seconds)
+    else:
+        await _ttl_index(messages, "timestamp", seconds)
+
+
+async def acquire_lease(name: str, seconds: float) -> bool:
+    """Hold `name` for `seconds` across workers; False while someone else holds it."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    try:
+        await _leases.find_one_and_update(
+            {"_id": name, "until": {"$lt": now}},
+            {"$set": {"until": now + datetime.timedelta(seconds=seconds), "owner": _owner}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def expire_idle_sessions(app_id: str, collections: Dict[str, Any], idle_seconds: float, now: datetime.datetime) -> int:
+    result = await collections['chat_sessions'].update_many(
+        {"appId": app_id, "status": "active", "lastActiveAt": {"$lt": now - datetime.timedelta(seconds=idle_seconds)}},
+        {"$set": {"status": "closed", "closedAt": now}}
+    )
+    return result.modified_count
+
+
+def archive_query(app_id: str, cutoff: datetime.datetime) -> Dict:
+    # Recently restored sessions stay hot until they age out again
+    return {
+        "appId": app_id, "status": "closed", "lastActiveAt": {"$lt": cutoff},
+        "$or": [{"restoredAt": {"$exists": False}}, {"restoredAt": {"$lt": cutoff}}],
+    }
+
+
+async def archive_sessions(app_id: str, collections: Dict[str, Any], store, cutoff: datetime.datetime,
+                           batch_sessions: int = 500, should_stop=lambda: False) -> Dict[str, int]:
+    """
+    Stream closed sessions last active before `cutoff`, with their messages, into
+    compressed JSONL archives (one file per batch), then delete them from the hot
+    collections. Each file is recorded in chat_archives for restore.
+    """
+    sessions_collection = collections['chat_sessions']
+    messages_collection = collections['chat_messages']
+    layout = collections['chat_messages_layout']
+    totals = {"files": 0, "sessions": 0, "messages": 0}
+    while not should_stop():
+        sessions = await sessions_collection.find(archive_query(app_id, cutoff)).sort("lastActiveAt", 1).to_list(batch_sessions)
+        if not sessions:
+            break
+        ids = [s["_id"] for s in sessions]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        key = f"{app_id}/{now:%Y/%m/%d}/sessions-{now:%H%M%S}-{uuid.uuid4().hex[:8]}{archive_extension()}"
+        messages = 0
+        with tempfile.TemporaryDirectory() as scratch:
+            path = os.path.join(scratch, os.path.basename(key))
+            with open_archive_writer(path) as out:
+                for session in sessions:
+                    out.write(json_util.dumps({"type": "session", "doc": session}, json_options=JSON_OPTIONS) + "\n")
+                cursor = messages_collection.find(message_filter(layout, app_id, {"$in": ids})).sort("timestamp", 1)
+                async for msg in cursor:
+                    out.write(json_util.dumps({"type": "message", "doc": from_storage(msg)}, json_options=JSON_OPTIONS) + "\n")
+                    messages += 1
+            await store.put(path, key)
+        await collections['chat_archives'].insert_one({
+            "_id": key, "appId": app_id, "sessionIds": ids, "sessions": len(ids), "messages": messages,
+            "from": sessions[0]["lastActiveAt"], "to": sessions[-1]["lastActiveAt"], "createdAt": now,
+        })
+        # Only once the archive is stored; anything newer than the cutoff (a resumed session) stays
+        await messages_collection.delete_many(message_filter(layout, app_id, {"$in": ids}, timestamp={"$lt": cutoff}))
+        await sessions_collection.delete_many({"_id": {"$in": ids}, "status": "closed", "lastActiveAt": {"$lt": cutoff}})
+        totals["files"] += 1
+        totals["sessions"] += len(ids)
+        totals["messages"] += messages
+        logger.info(f"[lifecycle] Archived {len(ids)} sessions / {messages} messages of app {app_id} to {key}")
+    return totals
+
+
+async def _restore_messages(app_id: str, collections: Dict[str, Any], docs: List[Dict]) -> int:
+    # Skip messages already present, so restoring the same archive twice is harmless
+    layout = collections['chat_messages_layout']
+    session_ids = list({d["sessionId"] for d in docs})
+    existing = {
+        d["_id"] async for d in collections['chat_messages'].find(
+            message_filter(layout, app_id, {"$in": session_ids}, _id={"$in": [d["_id"] for d in docs]}), {"_id": 1}
+        )
+    }
+    missing = [to_storage(d, layout) for d in docs if d["_id"] not in existing]
+    if missing:
+        await collections['chat_messages'].insert_many(missing, ordered=False)
+    return len(missing)
+
+
+async def restore_archive(app_id: str, collections: Dict[str, Any], store, key: str,
+                          session_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Load an archive (or only some of its sessions) back into the hot collections."""
+    wanted = set(session_ids) if session_ids else None
+    now = datetime.datetime.now(datetime.timezone.utc)
+    restored = {"sessions": 0, "messages": 0}
+    batch: List[Dict] = []
+    with tempfile.TemporaryDirectory() as scratch:
+        path = await store.fetch(key, scratch)
+        with open_archive_reader(path) as lines:
+            for line in lines:
+                record = json_util.loads(line)
+                doc = record["doc"]
+                session_id = doc["_id"] if record["type"] == "session" else doc.get("sessionId")
+                if doc.get("appId") != app_id or (wanted is not None and session_id not in wanted):
+                    continue
+                if record["type"] == "session":
+                    doc["restoredAt"] = now
+                    await collections['chat_sessions'].replace_one({"_id": doc["_id"]}, doc, upsert=True)
+                    restored["sessions"] += 1
+                else:
+                    batch.append(doc)
+                    if len(batch) >= RESTORE_BATCH_SIZE:
+                        restored["messages"] += await _restore_messages(app_id, collections, batch)
+                        batch = []
+    if batch:
+        restored["messages"] += await _restore_messages(app_id, collections, batch)
+    await collections['chat_archives'].update_one({"_id": key}, {"$set": {"lastRestoredAt": now}})
+    return restored
+
+
+class ChatLifecycle:
+    """
+    Periodic chat data lifecycle across tenants: close sessions idle for
+    ``idle_seconds``, and (when archival is enabled) archive and delete closed
+    sessions older than ``archive_after_days``. A lease per app keeps several
+    workers from processing the same tenant in one interval.
+    """
+
+    def __init__(self, interval: float = 3600, idle_seconds: float = 24 * 3600, archive_enabled: bool = False,
+                 archive_after_days: float = 30, archive_uri: str = "archive", batch_sessions: int = 500):
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self.archive_enabled = archive_enabled
+        self.archive_after_days = archive_after_days
+        self.archive_uri = archive_uri
+        self.batch_sessions = batch_sessions
+        self._store = None
+        self._indexed = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.runs = 0
+        self.sessions_closed = 0
+        self.sessions_archived = 0
+        self.messages_archived = 0
+        self.files_written = 0
+        self.failures = 0
+        self.last_run_seconds = 0.0
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = archive_store(self.archive_uri)
+        return self._store
+
+    async def run_app(self, app_id: str) -> Dict[str, int]:
+        app, collections = await get_app_and_collections(app_id)
+        if app_id not in self._indexed:
+            await ensure_lifecycle_indexes(collections)
+            self._indexed.add(app_id)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        result = {"closed": await expire_idle_sessions(app_id, collections, self.idle_seconds, now)}
+        self.sessions_closed += result["closed"]
+        if self.archive_enabled:
+            cutoff = now - datetime.timedelta(days=self.archive_after_days)
+            archived = await archive_sessions(app_id, collections, self.store, cutoff, self.batch_sessions, lambda: self._stopping)
+            self.files_written += archived["files"]
+            self.sessions_archived += archived["sessions"]
+            self.messages_archived += archived["messages"]
+            result.update(archived)
+        return result
+
+    async def run_once(self) -> None:
+        started = time.perf_counter()
+        async for app in app_collection.find({"mongodbConnectionString": {"$exists": True, "$ne": None}}, {"_id": 1}):
+            if self._stopping:
+                break
+            if not await acquire_lease(f"lifecycle:{app['_id']}", self.interval):
+                continue
+            try:
+                await self.run_app(app["_id"])
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"[lifecycle] Run failed for app {app['_id']}: {e!r}")
+        self.runs += 1
+        self.last_run_seconds = round(time.perf_counter() - started, 3)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                break
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"[lifecycle] Run failed: {e!r}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Let the batch in progress finish so no archive is written without its delete
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "intervalSeconds": self.interval,
+            "archiveEnabled": self.archive_enabled,
+            "archiveFormat": archive_extension(),
+            "runs": self.runs,
+            "sessionsClosed": self.sessions_closed,
+            "sessionsArchived": self.sessions_archived,
+            "messagesArchived": self.messages_archived,
+            "filesWritten": self.files_written,
+            "failures": self.failures,
+            "lastRunSeconds": self.last_run_seconds,
+        }
+
+
+# Global chat data lifecycle job; started and stopped in the app lifespan
+chat_lifecycle = ChatLifecycle(
+    interval=settings.CHAT_LIFECYCLE_INTERVAL_SECONDS,
+    idle_seconds=settings.SESSION_IDLE_EXPIRY_HOURS * 3600,
+    archive_enabled=settings.CHAT_ARCHIVE_ENABLED,
+    archive_after_days=settings.CHAT_ARCHIVE_AFTER_DAYS,
+    archive_uri=settings.CHAT_ARCHIVE_URI,
+    batch_sessions=settings.CHAT_ARCHIVE_BATCH_SESSIONS,
+)
@@ -0,0 +1,78 @@
+# app/services/llm.py
+from typing import Dict, Optional
+import asyncio
+import json
+import httpx
+from app.config import settings
+from app.services.gemini_client import GEMINI_API_BASE_URL, gemini_health, get_http_client, is_breaker_failure, resilient_post
+from app.services.resilience import CircuitOpenError, DeadlineExceeded, call_timeout
+from app.services.single_flight import llm_single_flight, request_key
+
+
+def _generate_payload(prompt: str, temperature: float, max_tokens: int, cached_content: Optional[str]):
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {"temperature": temperature, "maxOutputTokens": max_tokens}
+    }
+    if cached_content:
+        payload["cachedContent"] = cached_content
+    return payload
+
+async def call_gemma_api(api_key: str, prompt: str, model: str = "gemini-1.5-flash", temperature: float = 0.2, max_tokens: int = 512, cached_content: Optional[str] = None):
+    payload = _generate_payload(prompt, temperature, max_tokens, cached_content)
+    # Identical concurrent prompts (e.g. a campaign's first question) share one upstream call
+    key = request_key(api_key, model, payload)
+    try:
+        return await llm_single_flight.do(key, lambda: _post_generate_content(api_key, model, payload))
+    except asyncio.TimeoutError:
+        return {"error": "Gemma API error: timed out waiting for an identical in-flight request", "unavailable": True}
+
+async def _post_generate_content(api_key: str, model: str, payload: Dict):
+    url = f"{GEMINI_API_BASE_URL}/models/{model}:generateContent?key={api_key}"
+    try:
+        resp = await resilient_post(api_key, model, url, payload)
+    except (CircuitOpenError, DeadlineExceeded, httpx.TransportError) as exc:
+        # Upstream unhealthy or out of time: callers answer with a fallback instead of failing the request
+        return {"error": f"Gemma API unavailable: {exc!r}", "unavailable": True}
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as exc:
+        # Return error details for 400/404
+        return {"error": f"Gemma API error: {exc.response.status_code} {exc.response.reason_phrase}", "details": exc.response.text,
+                "unavailable": is_breaker_failure(exc.response.status_code)}
+    data = resp.json()
+    return data["candidates"][0]["content"]["parts"][0]["text"]
+
+async def stream_gemma_api(api_key: str, prompt: str, model: str = "gemini-1.5-flash", temperature: float = 0.2, max_tokens: int = 512, cached_content: Optional[str] = None):
+    # Same request as call_gemma_api, but yields text deltas as Gemini produces them (SSE framing via alt=sse)
+    url = f"{GEMINI_API_BASE_URL}/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
+    payload = _generate_payload(prompt, temperature, max_tokens, cached_content)
+    breaker = gemini_health.breaker(api_key, model)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit open for model {model}")
+    trial = breaker.is_trial()
+    try:
+        async with get_http_client().stream("POST", url, json=payload, timeout=call_timeout(settings.GEMINI_TIMEOUT_SECONDS)) as resp:
+            # Same accounting as resilient_post: only 5xx and BREAKER_FAILURE_STATUSES count against upstream health
+            if is_breaker_failure(resp.status_code):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if resp.is_error:
+                await resp.aread()
+                resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = json.loads(line[len("data:"):].strip())
+                for candidate in data.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+    except httpx.TransportError:
+        breaker.record_failure()
+        raise
+    finally:
+        # Deadline spent, request cancelled or client gone before a response: release the half-open trial
+        if trial:
+            breaker.abandon_trial()
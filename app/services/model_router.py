@@ -0,0 +1,141 @@
+# app/services/model_router.py
+from typing import Dict, List, Optional, Union
+import copy
+import re
+import numpy as np
+from app.config import settings
+from app.services.resilience import LatencyTracker
+from app.services.tokens import estimate_tokens
+from app.utils.text import NormalizedText, normalized
+
+# The standard tier is what every message used before routing existed; None budgets mean no extra trimming
+DEFAULT_TIERS = {
+    "simple": {"model": "gemini-1.5-flash-8b", "maxOutputTokens": 256, "contextTokens": 2000, "historyTokens": 400},
+    "standard": {"model": "gemini-1.5-flash", "maxOutputTokens": 512, "contextTokens": None, "historyTokens": None},
+    "complex": {"model": "gemini-1.5-pro", "maxOutputTokens": 1024, "contextTokens": None, "historyTokens": 3000},
+}
+
+DEFAULT_THRESHOLDS = {
+    # A near-duplicate of a stored question is answered by the cheap tier
+    "simpleQnaSimilarity": 0.85,
+    "simpleMaxWords": 8,
+    "complexMinWords": 60,
+    "complexMinQuestions": 3,
+    # Below this best-match similarity the answer needs more reasoning over weak context
+    "complexMaxRetrievalScore": 0.5,
+}
+
+_MULTI_PART = re.compile(r"\b(and also|as well as|additionally|compare|difference between|step by step)\b|^\s*(\d+[.)]|[-*])\s", re.IGNORECASE | re.MULTILINE)
+
+
+def message_features(user_message: Union[str, NormalizedText], query_embedding: Optional[List[float]], content: List[Dict]) -> Dict:
+    """Cheap local features: size, question count, and similarity to the tenant's content."""
+    text = normalized(user_message)
+    features = {
+        "words": len(text.clean.split()),
+        "questions": max(1, text.nfkc.count("?")) + len(_MULTI_PART.findall(text.nfkc)),
+        "retrievalScore": None,
+        "qnaScore": None,
+    }
+    if not query_embedding:
+        return features
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    scored = [c for c in content if c.get("embedding") and len(c["embedding"]) == len(query)]
+    if not scored or query_norm == 0:
+        return features
+    matrix = np.asarray([c["embedding"] for c in scored], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1)
+    scores = (matrix @ query) / np.where(norms == 0, 1, norms) / query_norm
+    features["retrievalScore"] = float(scores.max())
+    qna_scores = [s for s, c in zip(scores, scored) if c.get("contentType") == "qa"]
+    if qna_scores:
+        features["qnaScore"] = float(max(qna_scores))
+    return features
+
+def classify(features: Dict, thresholds: Dict) -> str:
+    if features["qnaScore"] is not None and features["qnaScore"] >= thresholds["simpleQnaSimilarity"] and features["questions"] <= 1:
+        return "simple"
+    if features["words"] <= thresholds["simpleMaxWords"] and features["questions"] <= 1:
+        return "simple"
+    if features["words"] >= thresholds["complexMinWords"] or features["questions"] >= thresholds["complexMinQuestions"]:
+        return "complex"
+    if features["retrievalScore"] is not None and features["retrievalScore"] < thresholds["complexMaxRetrievalScore"]:
+        return "complex"
+    return "standard"
+
+def routing_config(app: Dict) -> Dict:
+    """Effective routing config: defaults overlaid with the app's `modelRouting` settings."""
+    overrides = app.get("modelRouting") or {}
+    tiers = copy.deepcopy(DEFAULT_TIERS)
+    for tier, values in (overrides.get("tiers") or {}).items():
+        if tier in tiers:
+            tiers[tier].update(values)
+    return {
+        "enabled": overrides.get("enabled", settings.MODEL_ROUTING_ENABLED),
+        "tiers": tiers,
+        "thresholds": {**DEFAULT_THRESHOLDS, **(overrides.get("thresholds") or {})},
+    }
+
+def choose_route(app: Dict, user_message: Union[str, NormalizedText], query_embedding: Optional[List[float]], content: List[Dict]) -> Dict:
+    """Pick the tier, model, output cap and context budgets for one message."""
+    config = routing_config(app)
+    if not config["enabled"]:
+        return {"tier": "standard", **config["tiers"]["standard"], "features": None}
+    features = message_features(user_message, query_embedding, content)
+    tier = classify(features, config["thresholds"])
+    return {"tier": tier, **config["tiers"][tier], "features": features}
+
+def trim_context(sections: List[List[str]], budget_tokens: Optional[int]) -> List[List[str]]:
+    """
+    Keep context entries in their stored order until `budget_tokens` is reached.
+
+    Stored order (not per-question ranking) keeps the trimmed block identical
+    across messages, so it still benefits from prefix caching.
+    """
+    if budget_tokens is None:
+        return sections
+    used = 0
+    trimmed = []
+    for section in sections:
+        kept = []
+        for entry in section:
+            cost = estimate_tokens(entry)
+            if used + cost > budget_tokens:
+                break
+            kept.append(entry)
+            used += cost
+        trimmed.append(kept)
+    return trimmed
+
+
+class RoutingMetrics:
+    """Per-tier request counts, latency percentiles and token totals."""
+
+    def __init__(self):
+        self._tiers: Dict[str, Dict] = {}
+
+    def record(self, tier: str, model: str, seconds: float, input_tokens: int, output_tokens: int) -> None:
+        entry = self._tiers.setdefault(tier, {"requests": 0, "inputTokens": 0, "outputTokens": 0, "models": {}, "latency": LatencyTracker(min_samples=1)})
+        entry["requests"] += 1
+        entry["inputTokens"] += input_tokens
+        entry["outputTokens"] += output_tokens
+        entry["models"][model] = entry["models"].get(model, 0) + 1
+        entry["latency"].record(seconds)
+
+    def stats(self) -> Dict:
+        return {
+            tier: {
+                "requests": e["requests"],
+                "inputTokens": e["inputTokens"],
+                "outputTokens": e["outputTokens"],
+                "avgOutputTokens": e["outputTokens"] / e["requests"],
+                "models": dict(e["models"]),
+                "latency": e["latency"].stats()
+            }
+            for tier, e in self._tiers.items()
+        }
+
+
+# Global routing metrics
+routing_metrics = RoutingMetrics()
@@ -0,0 +1,171 @@
+# app/services/persistence.py
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import time
+from pymongo import UpdateOne
+from app.config import settings
+from app.utils.chat_messages import to_storage
+from app.utils.database import get_app_and_collections
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("sync", "async")
+
+
+def merge_session_update(target: Dict, update: Dict) -> Dict:
+    """Fold one session update into another: $set last-wins, $inc sums, $push $each lists append."""
+    for field, value in update.get("$set", {}).items():
+        target.setdefault("$set", {})[field] = value
+    for field, value in update.get("$inc", {}).items():
+        incs = target.setdefault("$inc", {})
+        incs[field] = incs.get(field, 0) + value
+    for field, value in update.get("$push", {}).items():
+        pushes = target.setdefault("$push", {})
+        if field in pushes:
+            pushes[field] = {**value, "$each": pushes[field]["$each"] + value["$each"]}
+        else:
+            pushes[field] = {**value, "$each": list(value["$each"])}
+    return target
+
+
+async def _chat_collections(app_id: str) -> Dict[str, Any]:
+    app, collections = await get_app_and_collections(app_id)
+    return collections
+
+
+class TurnWriter:
+    """
+    Group-commit queue for chat turn writes.
+
+    Each turn submits its chat_messages documents and one session update.
+    Pending turns are grouped per tenant and written with a single
+    ``insert_many`` plus a single ``bulk_write`` of session updates (updates
+    to the same session are merged first).
+
+    Durability mode:
+        sync   the caller awaits its turn's write before responding; turns
+               submitted while a flush is running share the next one
+        async  the caller returns immediately and turns are written every
+               ``interval`` seconds; once ``max_backlog`` turns are waiting,
+               callers wait for a flush instead, so nothing is dropped
+    """
+
+    def __init__(self, resolve_collections: Callable[[str], Awaitable[Dict[str, Any]]] = _chat_collections,
+                 mode: str = "sync", interval: float = 0.2, max_backlog: int = 5000):
+        self.resolve_collections = resolve_collections
+        self.mode = mode
+        self.interval = interval
+        self.max_backlog = max_backlog
+        self._pending: Dict[str, Dict] = {}
+        self._backlog = 0
+        self._oldest: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._flushing = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.turns = 0
+        self.flushes = 0
+        self.messages_written = 0
+        self.failed_turns = 0
+        self.last_flush_ms = 0.0
+
+    async def write(self, app_id: str, session_id: str, messages: List[Dict], session_update: Optional[Dict],
+                    mode: Optional[str] = None) -> None:
+        """Queue one turn; waits for it to be stored unless running in async mode with room in the backlog."""
+        future = asyncio.get_running_loop().create_future()
+        group = self._pending.setdefault(app_id, {"messages": [], "sessions": {}, "futures": []})
+        group["messages"].extend(messages)
+        if session_update:
+            merge_session_update(group["sessions"].setdefault(session_id, {}), session_update)
+        group["futures"].append(future)
+        self._backlog += 1
+        self.turns += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+
+        if (mode or self.mode) == "async" and self._backlog < self.max_backlog and self._task is not None:
+            # Failures are logged and counted by the flusher; nobody is waiting on this future
+            future.add_done_callback(lambda f: f.exception())
+            return
+        if self._task is None:
+            await self.flush()
+        else:
+            self._wakeup.set()
+        await future
+
+    async def flush(self) -> None:
+        async with self._flushing:
+            pending, self._pending = self._pending, {}
+            self._backlog, self._oldest = 0, None
+            if not pending:
+                return
+            started = time.perf_counter()
+            for app_id, group in pending.items():
+                try:
+                    collections = await self.resolve_collections(app_id)
+                    if group["messages"]:
+                        layout = collections.get('chat_messages_layout', "documents")
+                        await collections['chat_messages'].insert_many([to_storage(m, layout) for m in group["messages"]], ordered=True)
+                    if group["sessions"]:
+                        await collections['chat_sessions'].bulk_write(
+                            [UpdateOne({"_id": session_id}, update) for session_id, update in group["sessions"].items()],
+                            ordered=False
+                        )
+                except Exception as e:
+                    self.failed_turns += len(group["futures"])
+                    logger.error(f"[persistence] Failed to store {len(group['futures'])} turns for app {app_id}: {e!r}")
+                    for future in group["futures"]:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.messages_written += len(group["messages"])
+                for future in group["futures"]:
+                    if not future.done():
+                        future.set_result(None)
+            self.flushes += 1
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Drain instead of cancelling so queued turns are not lost on shutdown
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "backlogTurns": self._backlog,
+            "backlogMessages": sum(len(g["messages"]) for g in self._pending.values()),
+            "oldestPendingSeconds": round(time.monotonic() - self._oldest, 3) if self._oldest is not None else 0,
+            "turns": self.turns,
+            "flushes": self.flushes,
+            "messagesWritten": self.messages_written,
+            "failedTurns": self.failed_turns,
+            "lastFlushMs": self.last_flush_ms,
+        }
+
+
+# Global chat turn writer; started and drained in the app lifespan
+turn_writer = TurnWriter(
+    mode=settings.CHAT_PERSISTENCE_MODE,
+    interval=settings.CHAT_PERSISTENCE_FLUSH_SECONDS,
+    max_backlog=settings.CHAT_PERSISTENCE_MAX_BACKLOG,
+)
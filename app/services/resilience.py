@@ -0,0 +1,152 @@
+# app/services/resilience.py
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the current request's latency budget is spent before an upstream call starts."""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that its circuit breaker considers unhealthy."""
+
+
+# Absolute time.monotonic() deadline of the request being served, if any
+_request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+def start_latency_budget(seconds: float) -> None:
+    """Start a latency budget for the current request; upstream calls made from it share the deadline."""
+    _request_deadline.set(time.monotonic() + seconds)
+
+def clear_latency_budget() -> None:
+    """Drop the deadline, e.g. for background work that outlives the request that scheduled it."""
+    _request_deadline.set(None)
+
+def remaining_budget() -> Optional[float]:
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def call_timeout(default: float) -> float:
+    """Timeout for the next upstream call: the per-call default, capped by the remaining request budget."""
+    remaining = remaining_budget()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        raise DeadlineExceeded("Request latency budget exhausted")
+    return min(default, remaining)
+
+
+class LatencyTracker:
+    """Rolling window of call latencies, used to pick the hedging delay."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float, default: Optional[float] = None) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return default
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> Dict:
+        return {"samples": len(self._samples), "p50": self.percentile(0.5), "p95": self.percentile(0.95)}
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed -> open after `failure_threshold` failures in a row; open -> half_open
+    once `reset_timeout` has passed, letting a single trial call through; the
+    trial's outcome closes or re-opens the circuit. A trial that ends without an
+    outcome (deadline, cancellation) must call `abandon_trial`, or the breaker
+    would wait for it forever.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def is_trial(self) -> bool:
+        """Whether the call just admitted by allow() is the half-open trial."""
+        return self.state == "half_open" and self._trial_in_flight
+
+    def abandon_trial(self) -> None:
+        """The half-open trial ended without a success: re-open rather than stay half-open with no trial left."""
+        if self.state == "half_open" and self._trial_in_flight:
+            self.record_failure()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutiveFailures": self.failures,
+            "openForSeconds": time.monotonic() - self.opened_at if self.opened_at else None,
+            "rejected": self.rejected
+        }
+
+
+async def hedged(attempt: Callable[[], Awaitable[Any]], delay: float) -> Any:
+    """
+    Run `attempt`, and start a second identical attempt if the first hasn't finished after `delay` seconds.
+
+    The first attempt to succeed wins and the other is cancelled. If one attempt
+    fails, the other one is still awaited. The call raises only when both fail.
+    """
+    first = asyncio.ensure_future(attempt())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    second = asyncio.ensure_future(attempt())
+    pending = {first, second}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,170 @@
+# app/services/session_cache.py
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+from app.config import settings
+from app.services.persistence import merge_session_update, turn_writer
+
+logger = logging.getLogger(__name__)
+
+
+def apply_update(session: Dict, update: Dict) -> None:
+    """Mirror a MongoDB $set/$inc/$push update onto the in-memory session document."""
+    session.update(update.get("$set", {}))
+    for field, value in update.get("$inc", {}).items():
+        session[field] = session.get(field, 0) + value
+    for field, value in update.get("$push", {}).items():
+        items = list(session.get(field) or []) + list(value["$each"])
+        if "$slice" in value:
+            items = items[value["$slice"]:] if value["$slice"] < 0 else items[:value["$slice"]]
+        session[field] = items
+
+
+class SessionCache:
+    """
+    Bounded LRU of active chat sessions keyed by (app_id, session_id).
+
+    Each entry holds the session document (including its recentTurns ring,
+    kept current as turns are stored) and any session update not yet written.
+
+    With ``coalesce_seconds`` of 0 every session update is written through
+    with its turn. Otherwise lastActiveAt/language/token/recentTurns updates
+    are merged in the entry and written at most once per window per session, and on
+    eviction and shutdown. Entries idle for ``idle_seconds`` are evicted;
+    entries older than ``max_age_seconds`` are re-read so another worker's
+    writes show up.
+    """
+
+    def __init__(self, max_entries: int = 10000, idle_seconds: float = 1800, max_age_seconds: float = 60,
+                 coalesce_seconds: float = 0, writer=turn_writer):
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self.max_age_seconds = max_age_seconds
+        self.coalesce_seconds = coalesce_seconds
+        self.writer = writer
+        self._entries: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.deferred_updates = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, app_id: str, session_id: str) -> Optional[Dict]:
+        entry = self._entries.get((app_id, session_id))
+        now = time.monotonic()
+        if entry is None or (not entry["dirty"] and now - entry["loadedAt"] > self.max_age_seconds):
+            self.misses += 1
+            return None
+        self._entries.move_to_end((app_id, session_id))
+        entry["usedAt"] = now
+        self.hits += 1
+        return entry["session"]
+
+    async def put(self, app_id: str, session: Dict) -> Dict:
+        now = time.monotonic()
+        key = (app_id, session["_id"])
+        previous = self._entries.get(key)
+        self._entries[key] = {
+            "session": session,
+            "dirty": previous["dirty"] if previous else {},
+            "writtenAt": previous["writtenAt"] if previous else now,
+            "loadedAt": now,
+            "usedAt": now,
+        }
+        if previous and previous["dirty"]:
+            apply_update(session, previous["dirty"])
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.evictions += 1
+            await self._write_dirty(evicted_key, evicted)
+        return session
+
+    def record_turn(self, app_id: str, session_id: str, update: Dict) -> Optional[Dict]:
+        """
+        Apply a turn to the cached session. Returns the session update to write
+        with the turn now, or None when it was deferred into the coalescing window.
+        """
+        entry = self._entries.get((app_id, session_id))
+        if entry is None:
+            return update
+        apply_update(entry["session"], update)
+        now = time.monotonic()
+        if self.coalesce_seconds <= 0:
+            return update
+        merge_session_update(entry["dirty"], update)
+        if now - entry["writtenAt"] < self.coalesce_seconds:
+            self.deferred_updates += 1
+            return None
+        pending, entry["dirty"] = entry["dirty"], {}
+        entry["writtenAt"] = now
+        return pending
+
+    def patch(self, app_id: str, session_id: str, fields: Dict) -> None:
+        """Reflect fields already written to the session document by someone else (e.g. the summarizer)."""
+        entry = self._entries.get((app_id, session_id))
+        if entry is not None:
+            entry["session"].update(fields)
+
+    async def _write_dirty(self, key: Tuple[str, str], entry: Dict) -> None:
+        if not entry["dirty"]:
+            return
+        pending, entry["dirty"] = entry["dirty"], {}
+        entry["writtenAt"] = time.monotonic()
+        try:
+            await self.writer.write(key[0], key[1], [], pending, mode="async")
+        except Exception as e:
+            logger.warning(f"[session_cache] Deferred session update failed for {key[1]}: {e!r}")
+
+    async def sweep(self) -> None:
+        """Write updates whose window has passed and evict idle sessions."""
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if now - entry["usedAt"] > self.idle_seconds:
+                self._entries.pop(key, None)
+                self.evictions += 1
+                await self._write_dirty(key, entry)
+            elif entry["dirty"] and now - entry["writtenAt"] >= self.coalesce_seconds:
+                await self._write_dirty(key, entry)
+
+    async def _run(self) -> None:
+        interval = max(1.0, min(self.coalesce_seconds or 30.0, 30.0))
+        while True:
+            await asyncio.sleep(interval)
+            await self.sweep()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for key, entry in list(self._entries.items()):
+            await self._write_dirty(key, entry)
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "deferredUpdates": self.deferred_updates,
+            "dirtySessions": sum(1 for e in self._entries.values() if e["dirty"]),
+        }
+
+
+# Global session cache; swept in the app lifespan
+session_cache = SessionCache(
+    max_entries=settings.SESSION_CACHE_MAX_ENTRIES,
+    idle_seconds=settings.SESSION_CACHE_IDLE_SECONDS,
+    max_age_seconds=settings.SESSION_CACHE_MAX_AGE_SECONDS,
+    coalesce_seconds=settings.SESSION_LAST_ACTIVE_COALESCE_SECONDS,
+)
@@ -0,0 +1,72 @@
+# app/services/single_flight.py
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import hashlib
+import json
+from app.config import settings
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one upstream call.
+
+    The first caller starts the call as its own task; later callers with the same
+    key await that task instead of issuing another request. Results and exceptions
+    are delivered to every waiter. Followers wait at most `wait_timeout` seconds and
+    get asyncio.TimeoutError after that. The shared call keeps running for the others.
+    Cancelling one waiter never cancels the shared call.
+    """
+
+    def __init__(self, wait_timeout: float = 30.0):
+        self.wait_timeout = wait_timeout
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.calls += 1
+            return await asyncio.shield(task)
+
+        self.coalesced += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved so it isn't reported again when no follower awaited it
+        if not task.cancelled() and task.exception() is not None:
+            self.failures += 1
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "inFlight": len(self._inflight)
+        }
+
+
+def request_key(api_key: str, model: str, payload: Dict) -> str:
+    """
+    Key for an upstream generation request.
+
+    The API key is part of the key so identical prompts from different tenants are never shared.
+    """
+    body = json.dumps({"apiKey": api_key, "model": model, "payload": payload}, sort_keys=True)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+# Global single-flight group for Gemini generateContent calls
+llm_single_flight = SingleFlight(wait_timeout=settings.LLM_SINGLE_FLIGHT_WAIT_SECONDS)
@@ -0,0 +1,123 @@
+# app/services/tokens.py
+from typing import Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import re
+from app.db import app_collection
+
+logger = logging.getLogger(__name__)
+
+# Word pieces and individual symbols; one pass of a compiled regex over the text
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# Words longer than this are split into several tokens by the tokenizer
+LONG_WORD_CHARS = 8
+
+# Default coefficients for (words, symbols, non-ASCII chars, chars beyond LONG_WORD_CHARS in
+# long words), from Google's published rule of thumb for Gemini (about 4 characters per
+# token, 100 tokens for 60-80 English words): about 1.3 tokens per word, one per symbol,
+# one per 4 extra characters of a long word. Replaced by token_calibration.json, which
+# scripts/record_token_fixture.py fits to recorded countTokens results. No recording has
+# been committed yet, so until one is, these defaults are what ships and estimates are
+# uncalibrated.
+DEFAULT_COEFFICIENTS = [1.3, 1.0, 0.5, 0.25]
+CALIBRATION_FILE = os.path.join(os.path.dirname(__file__), "token_calibration.json")
+
+
+def _features(text: str) -> List[int]:
+    pieces = _PIECES.findall(text)
+    symbols = 0
+    long_chars = 0
+    for p in pieces:
+        if len(p) > LONG_WORD_CHARS:
+            long_chars += len(p) - LONG_WORD_CHARS
+        elif len(p) == 1 and not p.isalnum():
+            symbols += 1
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return [len(pieces) - symbols, symbols, non_ascii, long_chars]
+
+def _load_coefficients() -> List[float]:
+    try:
+        with open(CALIBRATION_FILE) as f:
+            return json.load(f)["coefficients"]
+    except FileNotFoundError:
+        return DEFAULT_COEFFICIENTS
+
+COEFFICIENTS = _load_coefficients()
+
+def estimate_tokens(text: str) -> int:
+    """Local estimate of Gemini's token count for `text` (see calibrate())."""
+    if not text:
+        return 0
+    return max(1, round(sum(c * f for c, f in zip(COEFFICIENTS, _features(text)))))
+
+def calibrate(samples: List[Dict]) -> Dict:
+    """
+    Fit estimator coefficients to recorded countTokens results.
+
+    Args:
+        samples: [{"text": ..., "totalTokens": ...}], as written by scripts/record_token_fixture.py
+
+    Returns:
+        {"coefficients": [...], "meanAbsPctError": ...}; save it as token_calibration.json to use it
+    """
+    import numpy as np
+    features = np.asarray([_features(s["text"]) for s in samples], dtype=np.float64)
+    actual = np.asarray([s["totalTokens"] for s in samples], dtype=np.float64)
+    coefficients, *_ = np.linalg.lstsq(features, actual, rcond=None)
+    predicted = features @ coefficients
+    error = float(np.mean(np.abs(predicted - actual) / np.maximum(actual, 1)))
+    return {"coefficients": [float(c) for c in coefficients], "meanAbsPctError": error}
+
+
+class TokenAccountant:
+    """
+    Per-tenant token totals, accumulated in memory and flushed to the app
+    document's `tokenUsage` with one $inc per tenant every `interval` seconds.
+    """
+
+    def __init__(self, interval: float = 10.0):
+        self.interval = interval
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, app_id: str, input_tokens: int, output_tokens: int, llm_calls: int = 1) -> None:
+        pending = self._pending.setdefault(app_id, {"llmCalls": 0, "inputTokens": 0, "outputTokens": 0})
+        pending["llmCalls"] += llm_calls
+        pending["inputTokens"] += input_tokens
+        pending["outputTokens"] += output_tokens
+
+    def pending(self, app_id: str) -> Dict[str, int]:
+        return dict(self._pending.get(app_id, {}))
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        for app_id, counts in pending.items():
+            try:
+                await app_collection.update_one(
+                    {"_id": app_id},
+                    {"$inc": {f"tokenUsage.{field}": value for field, value in counts.items()}}
+                )
+            except Exception as e:
+                logger.warning(f"Token usage flush failed for app {app_id}: {e!r}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+# Global per-tenant token accounting
+token_accountant = TokenAccountant()
@@ -0,0 +1,119 @@
+# app/services/write_behind.py
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-process buffer of documents written to MongoDB off the request path.
+
+    ``put`` never awaits: documents are grouped per key (usually the app id)
+    and flushed with ``insert_many`` every ``interval`` seconds, or sooner once
+    a key has ``batch_size`` documents waiting. The target collection for a key
+    is looked up at flush time through ``resolve_collection``.
+
+    Under pressure the buffer degrades instead of growing: past
+    ``sample_above`` of ``max_size`` only one document in ``sample_rate`` is
+    kept (tagged with ``sampleRate`` so counts can be scaled back up), and at
+    ``max_size`` new documents are dropped. Both are counted in ``stats``.
+    """
+
+    def __init__(self, name: str, resolve_collection: Callable[[str], Awaitable[Any]], max_size: int = 10000,
+                 batch_size: int = 500, interval: float = 2.0, sample_above: float = 0.8, sample_rate: int = 10):
+        self.name = name
+        self.resolve_collection = resolve_collection
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.sample_above = sample_above
+        self.sample_rate = sample_rate
+        self._buffers: Dict[str, List[Dict]] = {}
+        self._size = 0
+        self._seen_under_pressure = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flushing = asyncio.Lock()
+        self.accepted = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    def __len__(self):
+        return self._size
+
+    def put(self, key: str, doc: Dict) -> bool:
+        """Queue one document; returns False when it was sampled out or dropped."""
+        if self._size >= self.max_size:
+            self.dropped += 1
+            return False
+        if self._size >= self.max_size * self.sample_above:
+            self._seen_under_pressure += 1
+            if self._seen_under_pressure % self.sample_rate:
+                self.sampled_out += 1
+                return False
+            doc = {**doc, "sampleRate": self.sample_rate}
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(doc)
+        self._size += 1
+        self.accepted += 1
+        if len(buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def flush(self) -> None:
+        async with self._flushing:
+            buffers, self._buffers = self._buffers, {}
+            self._size = 0
+            self._seen_under_pressure = 0
+            for key, docs in buffers.items():
+                done = 0
+                try:
+                    collection = await self.resolve_collection(key)
+                    for start in range(0, len(docs), self.batch_size):
+                        batch = docs[start:start + self.batch_size]
+                        await collection.insert_many(batch, ordered=False)
+                        done += len(batch)
+                        self.written += len(batch)
+                except Exception as e:
+                    # Best effort: what's left is counted and dropped rather than retried forever
+                    self.failed += len(docs) - done
+                    logger.warning(f"[{self.name}] write-behind flush failed for {key}: {e!r}")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Let an in-progress flush finish instead of cancelling it mid-insert
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._size,
+            "maxSize": self.max_size,
+            "accepted": self.accepted,
+            "sampledOut": self.sampled_out,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+        }
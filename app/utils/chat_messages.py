@@ -0,0 +1,95 @@
+# app/utils/chat_messages.py
+"""
+Storage layouts for a tenant's chat messages.
+
+    documents   chat_messages, one regular document per message with top-level
+                appId and sessionId (the original layout)
+    timeseries  chat_messages_ts, a MongoDB time-series collection with
+                timestamp as the timeField and {appId, sessionId} as the
+                metaField, so those are stored once per bucket instead of once
+                per message
+
+The app document's chatMessagesLayout field picks the layout; apps without it
+use "documents". scripts/migrate_chat_messages.py moves a tenant over.
+"""
+from typing import Any, Dict, Optional
+import logging
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+LAYOUT_FIELD = "chatMessagesLayout"
+# Checkpoint of scripts/migrate_chat_messages.py on the app document
+MIGRATION_FIELD = "chatMessagesMigration"
+LAYOUTS = ("documents", "timeseries")
+COLLECTION_NAMES = {"documents": "chat_messages", "timeseries": "chat_messages_ts"}
+META_FIELD = "meta"
+META_KEYS = ("appId", "sessionId")
+
+# Secondary indexes for session history reads and per-app scans, per layout
+INDEXES = {
+    "documents": [[("appId", 1), ("sessionId", 1), ("timestamp", -1)], [("appId", 1), ("timestamp", -1)]],
+    "timeseries": [[("meta.appId", 1), ("meta.sessionId", 1), ("timestamp", -1)], [("meta.appId", 1), ("timestamp", -1)]],
+}
+
+# Databases whose chat message collection was already created/indexed by this process
+_ensured = set()
+
+
+def messages_layout(app: Dict) -> str:
+    layout = app.get(LAYOUT_FIELD) or "documents"
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown {LAYOUT_FIELD} '{layout}'; expected one of {LAYOUTS}")
+    return layout
+
+
+def to_storage(doc: Dict, layout: str) -> Dict:
+    """A chat message as written in `layout`."""
+    if layout != "timeseries":
+        return doc
+    stored = {k: v for k, v in doc.items() if k not in META_KEYS}
+    stored[META_FIELD] = {k: doc[k] for k in META_KEYS if k in doc}
+    return stored
+
+
+def from_storage(doc: Dict) -> Dict:
+    """A stored chat message in the documents shape, whichever layout it came from."""
+    meta = doc.get(META_FIELD)
+    if not isinstance(meta, dict):
+        return doc
+    flat = {k: v for k, v in doc.items() if k != META_FIELD}
+    flat.update(meta)
+    return flat
+
+
+def message_filter(layout: str, app_id: str, session_id: Optional[str] = None, **fields: Any) -> Dict:
+    """Query on appId/sessionId (plus any other message fields) for `layout`."""
+    prefix = META_FIELD + "." if layout == "timeseries" else ""
+    query = {prefix + "appId": app_id}
+    if session_id is not None:
+        query[prefix + "sessionId"] = session_id
+    query.update(fields)
+    return query
+
+
+async def ensure_messages_collection(db, layout: str) -> Any:
+    """
+    Create the layout's collection and its indexes if missing; returns the collection.
+
+    A time-series collection has to be created explicitly: the first insert
+    into a missing collection would create a regular one.
+    """
+    name = COLLECTION_NAMES[layout]
+    key = (id(db), name)
+    if key not in _ensured:
+        if layout == "timeseries" and name not in await db.list_collection_names(filter={"name": name}):
+            try:
+                await db.create_collection(name, timeseries={"timeField": "timestamp", "metaField": META_FIELD, "granularity": "seconds"})
+                logger.info(f"Created time-series collection {db.name}.{name}")
+            except CollectionInvalid:
+                # Another worker created it first
+                pass
+        for keys in INDEXES[layout]:
+            await db[name].create_index(keys)
+        _ensured.add(key)
+    return db[name]
@@ -1,6 +1,7 @@
 # app/utils/database.py
 from typing import Dict, Tuple, Any
 from ..db_manager import db_manager, app_collection
+from .chat_messages import ensure_messages_collection, messages_layout
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,6 +31,13 @@ async def get_app_and_collections(app_id: str) -> Tuple[Dict, Dict[str, Any]]:
 
     collections = await db_manager.get_app_collections(mongodb_connection)
 
+    # chat_messages is the collection for the app's message layout; readers and writers
+    # shape documents and queries with chat_messages_layout (see app/utils/chat_messages.py)
+    layout = messages_layout(app)
+    collections['chat_messages_layout'] = layout
+    if layout == "timeseries":
+        collections['chat_messages'] = await ensure_messages_collection(collections['chat_messages'].database, layout)
+
     return app, collections
 
 async def get_app_collection_by_name(app_id: str, collection_name: str) -> Any:
@@ -49,3 +57,17 @@ async def get_app_collection_by_name(app_id: str, collection_name: str) -> Any:
         raise ValueError(f"Collection '{collection_name}' not found for app {app_id}")
 
     return collections[collection_name]
+
+# Version counters kept on the app document; caches keyed on them drop stale entries on change
+CONTENT_VERSION_FIELD = "contentVersion"
+GUARDRAIL_VERSION_FIELD = "guardrailVersion"
+
+async def bump_app_version(app_id: str, field: str) -> None:
+    """
+    Increment a version counter on the app document after its content or guardrails change.
+
+    Args:
+        app_id: The app ID
+        field: CONTENT_VERSION_FIELD or GUARDRAIL_VERSION_FIELD
+    """
+    await app_collection.update_one({"_id": app_id}, {"$inc": {field: 1}})
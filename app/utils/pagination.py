@@ -0,0 +1,89 @@
+# app/utils/pagination.py
+"""
+Keyset pagination and NDJSON streaming for the admin list endpoints.
+
+Rows are ordered by ``_id``. A page holds up to ``limit`` rows with
+``_id > after``; when more rows follow, the ``X-Next-After`` response header
+carries the ``after`` value for the next page. String ids are used as is;
+ObjectIds are sent as ``oid:<hex>`` so the next query compares an ObjectId,
+not its string form (MongoDB never orders values of different types against
+each other). With
+``Accept: application/x-ndjson`` the endpoint instead streams every matching
+row (after ``after``, up to ``limit`` if given) as one JSON object per line,
+reading the cursor in batches so memory stays flat for any collection size.
+"""
+from typing import Any, Callable, Dict, Optional
+import json
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_AFTER_HEADER = "X-Next-After"
+# Cursor prefixes: ObjectId ids, and string ids that would otherwise look prefixed
+OBJECTID_CURSOR = "oid:"
+STRING_CURSOR = "str:"
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def encode_cursor(value: Any) -> str:
+    """`after` value for the row with _id `value`."""
+    if isinstance(value, ObjectId):
+        return OBJECTID_CURSOR + str(value)
+    value = str(value)
+    return STRING_CURSOR + value if value.startswith((OBJECTID_CURSOR, STRING_CURSOR)) else value
+
+
+def decode_cursor(after: str) -> Any:
+    if after.startswith(OBJECTID_CURSOR):
+        try:
+            return ObjectId(after[len(OBJECTID_CURSOR):])
+        except InvalidId:
+            raise HTTPException(status_code=400, detail=f"Invalid after cursor: {after}")
+    if after.startswith(STRING_CURSOR):
+        return after[len(STRING_CURSOR):]
+    return after
+
+
+def _after_query(query: Dict, after: str) -> Dict:
+    value = decode_cursor(after)
+    if isinstance(value, ObjectId):
+        return {**query, "_id": {"$gt": value}}
+    # ObjectIds sort after every string, so collections holding both keep paging into them
+    return {"$and": [query, {"$or": [{"_id": {"$gt": value}}, {"_id": {"$type": "objectId"}}]}]}
+
+
+async def _ndjson_rows(cursor, transform: Callable[[Dict], Any]):
+    async for doc in cursor:
+        yield json.dumps(jsonable_encoder(transform(doc))) + "\n"
+
+
+async def paginate(request: Request, collection, query: Dict, after: Optional[str] = None,
+                   limit: Optional[int] = None, transform: Callable[[Dict], Any] = lambda doc: doc):
+    """Page (JSON list) or NDJSON stream of `collection` rows matching `query`, ordered by _id."""
+    if after is not None:
+        query = _after_query(query, after)
+    cursor = collection.find(query).sort("_id", 1)
+
+    if wants_ndjson(request):
+        cursor = cursor.batch_size(STREAM_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+        return StreamingResponse(_ndjson_rows(cursor, transform), media_type=NDJSON_MEDIA_TYPE)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    # One extra row tells whether another page follows
+    docs = await cursor.limit(limit + 1).to_list(limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers[NEXT_AFTER_HEADER] = encode_cursor(docs[-1]["_id"])
+    return JSONResponse(content=jsonable_encoder([transform(d) for d in docs]), headers=headers)
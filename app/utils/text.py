@@ -0,0 +1,59 @@
+# app/utils/text.py
+from functools import cached_property
+from typing import List, Union
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+class NormalizedText:
+    """
+    One user message and its normalized views, built once per turn.
+
+    Every view is computed on first use and then reused, so language/thanks
+    detection, guardrails, routing and cache keys all read the same strings
+    instead of each re-deriving their own:
+
+        raw        the text as received
+        nfkc       Unicode NFKC (compatibility forms folded, e.g. full-width letters)
+        folded     nfkc, casefolded; what guardrail patterns match against
+        clean      nfkc with whitespace collapsed, case kept; sent for embeddings
+        collapsed  folded with whitespace collapsed; keyword/phrase detection
+        tokens     word tokens of folded
+    """
+
+    def __init__(self, raw: str):
+        self.raw = raw or ""
+
+    def __str__(self):
+        return self.raw
+
+    def __repr__(self):
+        return f"NormalizedText({self.raw!r})"
+
+    @cached_property
+    def nfkc(self) -> str:
+        return unicodedata.normalize("NFKC", self.raw)
+
+    @cached_property
+    def folded(self) -> str:
+        return self.nfkc.casefold()
+
+    @cached_property
+    def clean(self) -> str:
+        return _WHITESPACE.sub(" ", self.nfkc).strip()
+
+    @cached_property
+    def collapsed(self) -> str:
+        return _WHITESPACE.sub(" ", self.folded).strip()
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        return _WORD.findall(self.folded)
+
+
+def normalized(text: Union[str, NormalizedText]) -> NormalizedText:
+    """Wrap a plain string; pass an existing NormalizedText through so its views are shared."""
+    return text if isinstance(text, NormalizedText) else NormalizedText(text)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Compare the documents and time-series chat_messages layouts on a scratch database.
+
+    python scripts/benchmark_chat_messages.py --mongo-url mongodb://localhost:27017 \
+        --sessions 2000 --messages-per-session 20 --queries 500
+
+Loads the same synthetic conversations into both layouts (with the indexes the
+app uses), then reports storage and index size from $collStats and the latency
+of the session history query (last 2 x HISTORY_RECENT_TURNS messages of one
+session). The scratch database is dropped afterwards unless --keep is given.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import time
+import uuid
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.config import settings
+from app.utils.chat_messages import COLLECTION_NAMES, LAYOUTS, ensure_messages_collection, message_filter, to_storage
+
+WORDS = ("order refund shipping delivery account password invoice return size color store hours "
+         "warranty discount payment card address tracking exchange policy help please thanks").split()
+APP_ID = "benchmark-app"
+
+def synthetic_messages(sessions, per_session, seed=7):
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    session_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(sessions)]
+    docs = []
+    for i, session_id in enumerate(session_ids):
+        at = start + datetime.timedelta(minutes=i)
+        for n in range(per_session):
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+            docs.append({
+                "appId": APP_ID, "sessionId": session_id, "sender": "user" if n % 2 == 0 else "ai",
+                "message": text, "timestamp": at + datetime.timedelta(seconds=20 * n),
+                "language": "en", "tokens": len(text) // 4,
+            })
+    # Interleave sessions the way concurrent conversations arrive
+    docs.sort(key=lambda d: d["timestamp"])
+    return session_ids, docs
+
+async def storage_stats(collection):
+    stats = await collection.aggregate([{"$collStats": {"storageStats": {}}}]).to_list(1)
+    storage = stats[0]["storageStats"] if stats else {}
+    return {
+        "count": await collection.count_documents({}),
+        "dataBytes": storage.get("size", 0),
+        "storageBytes": storage.get("storageSize", 0),
+        "indexBytes": storage.get("totalIndexSize", 0),
+    }
+
+async def history_latency(collection, layout, session_ids, queries, limit):
+    rng = random.Random(11)
+    samples = []
+    for _ in range(queries):
+        query = message_filter(layout, APP_ID, rng.choice(session_ids))
+        started = time.perf_counter()
+        await collection.find(query).sort("timestamp", -1).to_list(limit)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "meanMs": round(sum(samples) / len(samples), 3),
+        "p50Ms": round(samples[len(samples) // 2], 3),
+        "p95Ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=settings.MONGO_URL)
+    parser.add_argument("--db", default="chat_messages_layout_benchmark")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--messages-per-session", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    await client.drop_database(args.db)
+    db = client[args.db]
+    session_ids, docs = synthetic_messages(args.sessions, args.messages_per_session)
+    results = {}
+    try:
+        for layout in LAYOUTS:
+            collection = await ensure_messages_collection(db, layout)
+            started = time.perf_counter()
+            for i in range(0, len(docs), args.batch_size):
+                await collection.insert_many([to_storage(dict(d), layout) for d in docs[i:i + args.batch_size]], ordered=False)
+            load_seconds = time.perf_counter() - started
+            results[layout] = {
+                "collection": COLLECTION_NAMES[layout],
+                "loadSeconds": round(load_seconds, 3),
+                **await storage_stats(collection),
+                **await history_latency(collection, layout, session_ids, args.queries, 2 * settings.HISTORY_RECENT_TURNS),
+            }
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db)
+        client.close()
+
+    if args.json:
+        print(json.dumps(results, indent=1))
+        return
+    print(f"{len(docs)} messages in {args.sessions} sessions, {args.queries} history queries")
+    fields = ["loadSeconds", "count", "dataBytes", "storageBytes", "indexBytes", "meanMs", "p50Ms", "p95Ms"]
+    print(f"{'':14}" + "".join(f"{layout:>14}" for layout in LAYOUTS))
+    for field in fields:
+        print(f"{field:14}" + "".join(f"{results[layout][field]:>14}" for layout in LAYOUTS))
+
+if __name__ == "__main__":
+    asyncio.run(main())
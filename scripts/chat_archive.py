@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Run the chat data lifecycle by hand, list a tenant's archives, or restore one.
+
+    python scripts/chat_archive.py run --app-id <appId> [--archive] [--after-days 30]
+    python scripts/chat_archive.py list --app-id <appId>
+    python scripts/chat_archive.py restore --app-id <appId> --key <archive key> [--session-id <id> ...]
+    python scripts/chat_archive.py restore --app-id <appId> --session-id <id>
+
+`run` closes idle sessions and, with --archive, archives closed sessions older
+than --after-days to CHAT_ARCHIVE_URI (see app/services/lifecycle.py). `restore`
+loads an archive file back into chat_sessions/chat_messages; with only
+--session-id, the archive holding that session is looked up in chat_archives.
+Restored sessions are kept hot for CHAT_ARCHIVE_AFTER_DAYS before they can be
+archived again.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import asyncio
+import datetime
+from app.config import settings
+from app.db_manager import db_manager
+from app.services.lifecycle import (
+    archive_sessions, archive_store, ensure_lifecycle_indexes, expire_idle_sessions, restore_archive
+)
+from app.utils.database import get_app_and_collections
+
+async def run(args, collections):
+    await ensure_lifecycle_indexes(collections)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    closed = await expire_idle_sessions(args.app_id, collections, settings.SESSION_IDLE_EXPIRY_HOURS * 3600, now)
+    print(f"Closed {closed} idle sessions")
+    if args.archive:
+        cutoff = now - datetime.timedelta(days=args.after_days)
+        totals = await archive_sessions(args.app_id, collections, archive_store(args.uri), cutoff, args.batch_sessions)
+        print(f"Archived {totals['sessions']} sessions / {totals['messages']} messages into {totals['files']} files under {args.uri}")
+
+async def list_archives(args, collections):
+    async for archive in collections['chat_archives'].find({"appId": args.app_id}).sort("createdAt", 1):
+        print(f"{archive['_id']}  sessions={archive['sessions']} messages={archive['messages']} "
+              f"lastActive={archive['from']:%Y-%m-%d}..{archive['to']:%Y-%m-%d}")
+
+async def restore(args, collections):
+    keys = [args.key] if args.key else []
+    if not keys:
+        if not args.session_id:
+            raise SystemExit("restore needs --key or --session-id")
+        archives = collections['chat_archives'].find({"appId": args.app_id, "sessionIds": {"$in": args.session_id}}, {"_id": 1})
+        keys = [a["_id"] async for a in archives]
+        if not keys:
+            raise SystemExit(f"No archive holds sessions {args.session_id}")
+    store = archive_store(args.uri)
+    for key in keys:
+        restored = await restore_archive(args.app_id, collections, store, key, args.session_id)
+        print(f"Restored {restored['sessions']} sessions / {restored['messages']} messages from {key}")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "list", "restore"])
+    parser.add_argument("--app-id", required=True)
+    parser.add_argument("--uri", default=settings.CHAT_ARCHIVE_URI, help="Archive directory or s3://bucket/prefix")
+    parser.add_argument("--archive", action="store_true", help="run: also archive old closed sessions")
+    parser.add_argument("--after-days", type=float, default=settings.CHAT_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-sessions", type=int, default=settings.CHAT_ARCHIVE_BATCH_SESSIONS)
+    parser.add_argument("--key", help="restore: archive key as shown by list")
+    parser.add_argument("--session-id", nargs="+", help="restore: only these sessions")
+    args = parser.parse_args()
+
+    app, collections = await get_app_and_collections(args.app_id)
+    try:
+        await {"run": run, "list": list_archives, "restore": restore}[args.command](args, collections)
+    finally:
+        await db_manager.close_all_connections()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Export a tenant's knowledge base to a portable archive, or import one.
+
+    python scripts/kb_archive.py export --app-id <appId> --file kb.tar.gz [--include-secrets]
+    python scripts/kb_archive.py import --file kb.tar.gz [--app-id <appId>] [--mongodb-uri <uri>] [--force]
+
+The archive holds content metadata as JSONL, embeddings as one float32 .npy
+matrix, guardrails and app settings (see app/services/kb_archive.py). Import
+upserts by _id without re-embedding; it creates the app when it doesn't exist
+yet (needs --mongodb-uri), or loads into a different app with --app-id.
+--force accepts embeddings from a model other than GEMMA_EMBEDDING_MODEL.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import asyncio
+from app.db_manager import db_manager
+from app.services.kb_archive import export_kb, import_kb
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--file", required=True, help="Archive path (.tar, or .tar.gz/.tgz to compress)")
+    parser.add_argument("--app-id", help="export: app to export; import: target app (default: the exported app)")
+    parser.add_argument("--include-secrets", action="store_true", help="export: include the app's Google API key")
+    parser.add_argument("--mongodb-uri", help="import: connection string for the app's database")
+    parser.add_argument("--force", action="store_true", help="import: accept embeddings from another model")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            if not args.app_id:
+                raise SystemExit("export needs --app-id")
+            manifest = await export_kb(args.app_id, args.file, args.include_secrets)
+            counts = manifest["counts"]
+            print(f"Exported {counts['content']} content items ({counts['embeddings']} embeddings, "
+                  f"dim {manifest['embedding']['dim']}) and {counts['guardrails']} guardrails to {args.file}")
+        else:
+            imported = await import_kb(args.file, args.app_id, args.mongodb_uri, args.force)
+            print(f"Imported {imported['content']} content items ({imported['embeddings']} embeddings) "
+                  f"and {imported['guardrails']} guardrails into {imported['appId']}")
+    finally:
+        await db_manager.close_all_connections()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Move a tenant's chat messages to the time-series layout (see app/utils/chat_messages.py).
+
+    python scripts/migrate_chat_messages.py --app-id <appId>
+    python scripts/migrate_chat_messages.py --all --batch-size 2000
+    python scripts/migrate_chat_messages.py --app-id <appId> --dry-run
+    python scripts/migrate_chat_messages.py --app-id <appId> --indexes-only
+
+For each app: create chat_messages_ts (time-series, metaField {appId, sessionId})
+with its secondary indexes, then copy chat_messages in _id order in batches. The
+last copied _id is checkpointed on the app document, so an interrupted run resumes
+where it stopped (a batch interrupted between its insert and its checkpoint is
+copied again; time-series collections don't enforce unique _id). Once the backlog
+is copied the app is switched to the time-series layout; after --settle-seconds
+(turns that resolved the old collection just before the switch land in it) the
+messages written meanwhile are copied too. Only the app's own messages are copied,
+so tenants sharing a database migrate independently.
+
+chat_messages is left in place for verification and rollback (unset
+chatMessagesLayout on the app document); drop it by hand once satisfied.
+--indexes-only just creates the session-read indexes on chat_messages for apps
+that stay on the documents layout.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import asyncio
+import datetime
+from pymongo.errors import BulkWriteError
+from app.db_manager import db_manager, app_collection
+from app.utils.chat_messages import LAYOUT_FIELD, MIGRATION_FIELD, ensure_messages_collection, message_filter, messages_layout, to_storage
+
+async def copy_messages(app_id, source, target, last_id, batch_size):
+    """Copy messages with _id > last_id; returns (last_id, copied, skipped)."""
+    copied = skipped = 0
+    while True:
+        query = message_filter("documents", app_id)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await source.find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return last_id, copied, skipped
+        # The time-series timeField must be a date; anything else can't be bucketed
+        docs = [to_storage(d, "timeseries") for d in batch if isinstance(d.get("timestamp"), datetime.datetime)]
+        skipped += len(batch) - len(docs)
+        if docs:
+            try:
+                await target.insert_many(docs, ordered=False)
+                copied += len(docs)
+            except BulkWriteError as e:
+                copied += e.details.get("nInserted", 0)
+                skipped += len(e.details.get("writeErrors", []))
+        last_id = batch[-1]["_id"]
+        await app_collection.update_one({"_id": app_id}, {"$set": {f"{MIGRATION_FIELD}.lastId": last_id}})
+        print(f"  {app_id}: {copied} copied, {skipped} skipped (last _id {last_id})")
+
+async def migrate_app(app, args):
+    app_id = app["_id"]
+    if not app.get("mongodbConnectionString"):
+        print(f"- {app_id}: no mongodbConnectionString, skipped")
+        return
+    collections = await db_manager.get_app_collections(app["mongodbConnectionString"])
+    source = collections['chat_messages']
+    db = source.database
+
+    if args.indexes_only:
+        await ensure_messages_collection(db, "documents")
+        print(f"- {app_id}: indexes ensured on {db.name}.chat_messages")
+        return
+    total = await source.count_documents(message_filter("documents", app_id))
+    if args.dry_run:
+        print(f"- {app_id}: layout {messages_layout(app)}, {total} messages in {db.name}.chat_messages")
+        return
+
+    target = await ensure_messages_collection(db, "timeseries")
+    last_id = app.get(MIGRATION_FIELD, {}).get("lastId")
+    if messages_layout(app) != "timeseries":
+        print(f"- {app_id}: copying {total} messages into {db.name}.{target.name}" + (f" from _id {last_id}" if last_id else ""))
+        last_id, copied, skipped = await copy_messages(app_id, source, target, last_id, args.batch_size)
+        await app_collection.update_one({"_id": app_id}, {"$set": {
+            LAYOUT_FIELD: "timeseries",
+            f"{MIGRATION_FIELD}.switchedAt": datetime.datetime.now(datetime.timezone.utc),
+        }})
+        print(f"  {app_id}: switched to the time-series layout; waiting {args.settle_seconds}s for in-flight turns")
+        await asyncio.sleep(args.settle_seconds)
+    # Catch-up: messages that reached chat_messages after the checkpoint (also re-run safe)
+    last_id, copied, skipped = await copy_messages(app_id, source, target, last_id, args.batch_size)
+    before = await source.count_documents(message_filter("documents", app_id))
+    after = await target.count_documents(message_filter("timeseries", app_id))
+    print(f"  {app_id}: done; chat_messages has {before}, {target.name} has {after}")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--app-id")
+    target.add_argument("--all", action="store_true", help="Every app in the main database")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--settle-seconds", type=float, default=5.0)
+    parser.add_argument("--dry-run", action="store_true", help="Only report message counts and current layouts")
+    parser.add_argument("--indexes-only", action="store_true", help="Create session-read indexes on chat_messages and stop")
+    args = parser.parse_args()
+
+    query = {} if args.all else {"_id": args.app_id}
+    apps = await app_collection.find(query).to_list(None)
+    if not apps:
+        print(f"No app found for {query}")
+        return
+    try:
+        for app in apps:
+            await migrate_app(app, args)
+    finally:
+        await db_manager.close_all_connections()
+
+if __name__ == "__main__":
+    asyncio.run(main())
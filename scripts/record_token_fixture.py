@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Record Gemini countTokens results for prompt-shaped texts and fit the local token estimator.
+
+    python scripts/record_token_fixture.py --api-key $GOOGLE_API_KEY
+
+writes the recording to tests/fixtures/count_tokens.json and the fitted
+coefficients to app/services/token_calibration.json; commit both together,
+since tests/test_tokens.py checks the coefficients against the recording.
+
+Texts come from build_prompt over the seed content in json_files/ plus the
+chat messages there, so the fixture matches what the estimator sees in production.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import asyncio
+import json
+import httpx
+from app.config import settings
+from app.routers.chat import build_prompt
+from app.services.tokens import CALIBRATION_FILE, calibrate
+
+def sample_texts():
+    root = os.path.join(os.path.dirname(__file__), '..', 'json_files')
+    with open(os.path.join(root, 'app_content.json')) as f:
+        content = json.load(f)
+    with open(os.path.join(root, 'chat_messages.json')) as f:
+        messages = json.load(f)
+    qna = [c["content"]["question"] + "\n" + c["content"]["answer"] for c in content if c["contentType"] == "qa"]
+    notes = [c["content"]["text"] for c in content if c["contentType"] == "note"]
+    texts = [m["message"] for m in messages]
+    texts += [build_prompt(m["message"], qna, notes, [], [], messages[:i]) for i, m in enumerate(messages)]
+    texts += ["¿Cuál es su política de devoluciones?", "Quelle est votre politique de retour ?", "退货政策是什么？"]
+    return texts
+
+async def count_tokens(client, api_key, model, text):
+    url = f"{settings.GEMINI_API_BASE_URL}/models/{model}:countTokens?key={api_key}"
+    resp = await client.post(url, json={"contents": [{"role": "user", "parts": [{"text": text}]}]})
+    resp.raise_for_status()
+    return resp.json()["totalTokens"]
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-key", default=settings.GOOGLE_API_KEY)
+    parser.add_argument("--model", default="gemini-1.5-flash")
+    parser.add_argument("--out", default="tests/fixtures/count_tokens.json")
+    parser.add_argument("--calibration", default=CALIBRATION_FILE, help="Where to write the fitted coefficients")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        samples = [{"text": t, "totalTokens": await count_tokens(client, args.api_key, args.model, t)} for t in sample_texts()]
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"model": args.model, "samples": samples}, f, ensure_ascii=False, indent=1)
+    result = calibrate(samples)
+    print(f"Recorded {len(samples)} samples to {args.out}; mean abs error {result['meanAbsPctError']:.1%}")
+    with open(args.calibration, "w") as f:
+        json.dump(result, f, indent=1)
+    print(f"Wrote calibration to {args.calibration}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Local fake of the Gemini REST endpoints the app calls, for tests and manual runs.
+
+In tests, mount it in-process:
+
+    fake = create_fake_gemini()
+    gemini_client._http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake))
+
+Or serve it and point the app at it:
+
+    uvicorn tests.fake_gemini:app --port 8001
+    GEMINI_API_BASE_URL=http://localhost:8001/v1beta
+"""
+import hashlib
+import json
+import re
+import uuid
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+def _prompt_text(body):
+    return "".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+
+def create_fake_gemini():
+    fake = FastAPI(title="Fake Gemini")
+    # Inspected by tests: registered caches and every generate request seen
+    fake.state.caches = {}
+    fake.state.generate_requests = []
+    # Set to an HTTP status to make every generate request fail with it
+    fake.state.fail_status = None
+
+    @fake.post("/v1beta/cachedContents")
+    async def create_cached_content(request: Request):
+        body = await request.json()
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        fake.state.caches[name] = {"model": body["model"], "text": _prompt_text(body)}
+        return {"name": name, "model": body["model"]}
+
+    @fake.delete("/v1beta/cachedContents/{cache_id}")
+    async def delete_cached_content(cache_id: str):
+        if fake.state.caches.pop(f"cachedContents/{cache_id}", None) is None:
+            raise HTTPException(status_code=404, detail="Cached content not found")
+        return {}
+
+    @fake.post("/v1beta/models/{model_action}")
+    async def model_action(model_action: str, request: Request):
+        model, _, action = model_action.partition(":")
+        body = await request.json()
+
+        if action == "embedContent":
+            digest = hashlib.sha256(_prompt_text(body).encode()).digest()
+            return {"embedding": {"values": [b / 255 for b in digest[:16]]}}
+
+        if action == "countTokens":
+            # Word and punctuation pieces; close enough to a real tokenizer for calibration tests
+            return {"totalTokens": len(re.findall(r"\w+|[^\w\s]", _prompt_text(body)))}
+
+        cached = body.get("cachedContent")
+        if cached and cached not in fake.state.caches:
+            raise HTTPException(status_code=404, detail="Cached content not found")
+        fake.state.generate_requests.append({"model": model, "cachedContent": cached, "prompt": _prompt_text(body)})
+        if fake.state.fail_status:
+            raise HTTPException(status_code=fake.state.fail_status, detail="Injected failure")
+        text = f"answer from {model} (cached={bool(cached)})"
+
+        if action == "generateContent":
+            return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+        if action == "streamGenerateContent":
+            async def events():
+                for word in text.split(" "):
+                    chunk = {"candidates": [{"content": {"parts": [{"text": word + " "}]}}]}
+                    yield f"data: {json.dumps(chunk)}\r\n\r\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        raise HTTPException(status_code=404, detail=f"Unknown action {action}")
+
+    return fake
+
+app = create_fake_gemini()
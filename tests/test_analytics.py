@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the conversation analytics rollups and the analytics endpoint.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.services.analytics import ConversationAnalytics
+from app.routers.admin import analytics as analytics_router
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+class FakeRollups:
+    def __init__(self):
+        self.docs = {}
+        self.bulk_writes = 0
+        self.fail = False
+
+    async def create_index(self, keys):
+        pass
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise ConnectionError("primary stepped down")
+        self.bulk_writes += 1
+        for op in ops:
+            doc = self.docs.setdefault(op._filter["_id"], {"_id": op._filter["_id"], **op._doc["$setOnInsert"]})
+            for field, value in op._doc["$inc"].items():
+                doc[field] = doc.get(field, 0) + value
+
+    def find(self, query):
+        day = query["day"]
+        return Cursor([dict(d) for d in self.docs.values()
+                       if d["appId"] == query["appId"] and day["$gte"] <= d["day"] <= day["$lte"]])
+
+JUNE_1 = datetime.datetime(2024, 6, 1, 12, tzinfo=datetime.timezone.utc)
+JUNE_2 = JUNE_1 + datetime.timedelta(days=1)
+
+def test_flush_batches_increments():
+    rollups = FakeRollups()
+    analytics = ConversationAnalytics(rollups)
+    for _ in range(3):
+        analytics.record("app", "en", JUNE_1, turns=1, messages=2)
+    analytics.record("app", "de", JUNE_1, turns=1, fastPathHits=1)
+    analytics.record("other", None, JUNE_2, sessions=1)
+    asyncio.run(analytics.flush())
+    analytics.record("app", "en", JUNE_1, turns=1)
+    asyncio.run(analytics.flush())
+
+    # One bulk_write per flush, one document per tenant/day/language
+    assert rollups.bulk_writes == 2
+    assert rollups.docs["app:2024-06-01:en"] == {"_id": "app:2024-06-01:en", "appId": "app", "day": "2024-06-01",
+                                                 "language": "en", "turns": 4, "messages": 6}
+    assert rollups.docs["other:2024-06-02:unknown"]["sessions"] == 1
+
+    # A failed flush keeps the counts for the next one
+    rollups.fail = True
+    analytics.record("app", "en", JUNE_1, turns=2)
+    asyncio.run(analytics.flush())
+    rollups.fail = False
+    asyncio.run(analytics.flush())
+    assert rollups.docs["app:2024-06-01:en"]["turns"] == 6
+
+def test_guardrail_results():
+    analytics = ConversationAnalytics(FakeRollups())
+    analytics.record_guardrail("app", "en", "input", {"blocked": True, "ruleId": "r1", "logged": []})
+    analytics.record_guardrail("app", "en", "output", {"blocked": False, "logged": [{"ruleId": "r2"}]})
+    analytics.record_guardrail("app", "en", "output", {"blocked": False, "logged": []})
+    [counts] = analytics.pending("app").values()
+    assert counts == {"guardrailTriggers": 2, "guardrailBlocks": 1, "guardrailInputTriggers": 1, "guardrailOutputTriggers": 1}
+
+def test_endpoint_sums_rollups_and_pending():
+    rollups = FakeRollups()
+    analytics = ConversationAnalytics(rollups)
+    analytics.record("app", "en", JUNE_1, turns=8, messages=14, guardrailTriggers=2, guardrailInputTriggers=1,
+                     guardrailOutputTriggers=1, fastPathHits=1)
+    analytics.record("app", "de", JUNE_1, turns=2, messages=4)
+    analytics.record("app", "en", JUNE_2, turns=5, llmCalls=5, inputTokens=900, outputTokens=300)
+    asyncio.run(analytics.flush())
+    analytics.record("app", "en", JUNE_2, turns=5, guardrailTriggers=1, guardrailOutputTriggers=1)
+    original, analytics_router.conversation_analytics = analytics_router.conversation_analytics, analytics
+
+    api = FastAPI()
+    api.include_router(analytics_router.router)
+    client = TestClient(api)
+    body = client.get("/api/v1/client/app/app/analytics", params={"start": "2024-06-01", "end": "2024-06-02"}).json()
+    assert body["totals"]["turns"] == 20 and body["totals"]["inputTokens"] == 900
+    assert body["totals"]["guardrailInputRate"] == 0.05 and body["totals"]["guardrailOutputRate"] == 0.1
+    first, second = body["days"]
+    assert first["day"] == "2024-06-01" and first["languages"]["de"]["messages"] == 4 and first["fastPathRate"] == 0.1
+    # The second day adds this worker's unflushed counters to the stored rollup
+    assert second["turns"] == 10 and second["guardrailTriggers"] == 1
+
+    only_first = client.get("/api/v1/client/app/app/analytics", params={"start": "2024-06-01", "end": "2024-06-01"}).json()
+    assert [d["day"] for d in only_first["days"]] == ["2024-06-01"]
+    assert client.get("/api/v1/client/app/app/analytics", params={"start": "June 1"}).status_code == 400
+
+    # A turn whose message and answer both trigger a rule counts once per direction, never above 1
+    analytics.record("app", "fr", JUNE_1, turns=1, guardrailTriggers=2, guardrailInputTriggers=1, guardrailOutputTriggers=1)
+    day = client.get("/api/v1/client/app/app/analytics", params={"start": "2024-06-01", "end": "2024-06-01"}).json()["days"][0]
+    assert day["languages"]["fr"]["guardrailTriggers"] == 2
+    assert day["guardrailInputRate"] == day["guardrailOutputRate"] == round(2 / 11, 4)
+    analytics_router.conversation_analytics = original
+
+if __name__ == "__main__":
+    test_flush_batches_increments()
+    test_guardrail_results()
+    test_endpoint_sums_rollups_and_pending()
+    print("✅ Analytics tests passed")
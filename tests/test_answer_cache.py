@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-tenant semantic answer cache.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import datetime
+import time
+from app.routers import chat
+from app.services.answer_cache import SemanticAnswerCache, app_cache_version, is_standalone_turn
+
+VERSION = (1, 1)
+
+def test_similar_query_hits():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("app-1", VERSION, "en", [1.0, 0.0, 0.1], "30 day returns")
+    assert cache.lookup("app-1", VERSION, "en", [0.98, 0.02, 0.1]) == "30 day returns"
+    assert cache.lookup("app-1", VERSION, "en", [0.0, 1.0, 0.0]) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hitRate"] == 0.5
+
+def test_language_and_tenant_isolation():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("app-1", VERSION, "en", [1.0, 0.0], "hello")
+    assert cache.lookup("app-1", VERSION, "es", [1.0, 0.0]) is None
+    assert cache.lookup("app-2", VERSION, "en", [1.0, 0.0]) is None
+
+def test_version_change_invalidates():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("app-1", VERSION, "en", [1.0, 0.0], "old answer")
+    assert cache.lookup("app-1", (2, 1), "en", [1.0, 0.0]) is None
+    assert cache.stats()["invalidations"] == 1
+    assert app_cache_version({"contentVersion": 2}) == (2, 0)
+
+def test_lru_and_ttl_eviction():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries_per_app=2)
+    cache.store("app-1", VERSION, "en", [1.0, 0.0, 0.0], "a")
+    cache.store("app-1", VERSION, "en", [0.0, 1.0, 0.0], "b")
+    assert cache.lookup("app-1", VERSION, "en", [1.0, 0.0, 0.0]) == "a"
+    cache.store("app-1", VERSION, "en", [0.0, 0.0, 1.0], "c")
+    # "b" was least recently used
+    assert cache.lookup("app-1", VERSION, "en", [0.0, 1.0, 0.0]) is None
+    assert cache.stats()["evictions"] == 1
+
+    cache.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert cache.lookup("app-1", VERSION, "en", [1.0, 0.0, 0.0]) is None
+    assert cache.stats()["expirations"] == 2
+
+def test_answers_depending_on_history_are_not_shared():
+    history = {"s1": [], "s2": [{"sender": "user", "message": "Do you sell boots and sandals?"},
+                                 {"sender": "ai", "message": "Yes, both."}], "s3": [{"sender": "ai", "message": "Welcome!"}]}
+
+    def returning(value):
+        async def fake(*args, **kwargs):
+            return value
+        return fake
+
+    async def fake_session(app_id, session_id):
+        return {"_id": session_id, "appId": "app", "language": "en", "lastActiveAt": datetime.datetime.now(datetime.timezone.utc)}
+
+    async def fake_history(app_id, session, **kwargs):
+        return history[session["_id"]]
+
+    names = ("get_app", "get_session", "get_query_embedding", "get_relevant_content", "get_last_messages",
+             "apply_guardrails", "store_message_and_response", "answer_cache")
+    originals = {name: getattr(chat, name) for name in names}
+    chat.get_app = returning({"_id": "app", "defaultLanguage": "en"})
+    chat.get_session = fake_session
+    # "tell me more" embeds like the earlier question, as short follow-ups often do
+    chat.get_query_embedding = returning([1.0, 0.0, 0.0])
+    chat.get_relevant_content = returning([])
+    chat.get_last_messages = fake_history
+    chat.apply_guardrails = returning({"blocked": False})
+    chat.store_message_and_response = returning(None)
+    chat.answer_cache = SemanticAnswerCache(threshold=0.9)
+    try:
+        first = asyncio.run(chat.prepare_chat_turn("app", "s1", "Tell me about your shoes"))
+        chat.remember_answer("app", first, "We sell boots.", {"blocked": False})
+        assert chat.answer_cache.stats()["stores"] == 1
+
+        # A follow-up in another conversation is answered from its own history, and not cached
+        follow_up = asyncio.run(chat.prepare_chat_turn("app", "s2", "tell me more"))
+        assert follow_up["early_response"] is None and not follow_up["standalone"]
+        chat.remember_answer("app", follow_up, "Our sandals are leather.", {"blocked": False})
+        assert chat.answer_cache.stats()["stores"] == 1
+
+        # A canned welcome doesn't make the question depend on the conversation
+        fresh = asyncio.run(chat.prepare_chat_turn("app", "s3", "Tell me about your shoes"))
+        assert fresh["early_response"].message == "We sell boots."
+    finally:
+        for name, value in originals.items():
+            setattr(chat, name, value)
+    assert not is_standalone_turn("user asked about refunds", [])
+
+if __name__ == "__main__":
+    test_similar_query_hits()
+    test_language_and_tenant_isolation()
+    test_version_change_invalidates()
+    test_lru_and_ttl_eviction()
+    test_answers_depending_on_history_are_not_shared()
+    print("✅ Answer cache tests passed")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk content ingestion: streamed parsing, validation, batched embedding and chunked inserts.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import json
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.routers.admin import content as bulk
+
+class FakeApps:
+    async def find_one(self, query):
+        return {"_id": query["_id"], "googleApiKey": "key"}
+
+class FakeContent:
+    def __init__(self):
+        self.docs = []
+        self.batches = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append(len(docs))
+        self.docs.extend(docs)
+
+collection = FakeContent()
+embed_calls = []
+bumps = []
+
+async def fake_get_app_and_collections(app_id):
+    return {"_id": app_id}, {"app_content": collection}
+
+async def fake_generate_embeddings(texts, api_key=None):
+    embed_calls.append(list(texts))
+    if any("explode" in t for t in texts):
+        raise RuntimeError("quota exceeded")
+    return [[float(len(t))] for t in texts]
+
+async def fake_bump(app_id, field):
+    bumps.append(app_id)
+
+bulk.app_collection = FakeApps()
+bulk.get_app_and_collections = fake_get_app_and_collections
+bulk.generate_embeddings = fake_generate_embeddings
+bulk.bump_app_version = fake_bump
+
+api = FastAPI()
+api.include_router(bulk.router)
+client = TestClient(api)
+
+CHUNK_SIZE = settings.BULK_CONTENT_CHUNK_SIZE
+
+def reset(chunk_size=CHUNK_SIZE):
+    settings.BULK_CONTENT_CHUNK_SIZE = chunk_size
+    collection.docs.clear()
+    collection.batches.clear()
+    embed_calls.clear()
+    bumps.clear()
+
+def note(i):
+    return {"contentType": "note", "text": f"note {i} é", "language": "en"}
+
+def test_json_array_in_chunks():
+    reset(chunk_size=10)
+    items = [note(i) for i in range(25)]
+    items[3] = {"contentType": "qa", "question": "Q?", "answer": "A.", "language": "en"}
+    items[7] = {"contentType": "qa", "question": "Q?"}
+    items[9] = {"contentType": "video", "language": "en"}
+    items[12] = {"contentType": "url", "url": "https://example.com", "description": "Example", "language": "en"}
+    resp = client.post("/api/v1/client/app/app-1/content:bulk", content=json.dumps(items).encode())
+    body = resp.json()
+    assert resp.status_code == 200
+    assert (body["created"], body["invalid"], body["failed"]) == (23, 2, 0)
+    assert [r["index"] for r in body["results"]] == list(range(25))
+    assert body["results"][7]["status"] == "invalid" and "answer" in body["results"][7]["error"]
+    assert "contentType" in body["results"][9]["error"]
+    # One embedding call and one insert per chunk of valid items
+    assert sorted(collection.batches) == [3, 10, 10] and len(embed_calls) == 3
+    qa = next(d for d in collection.docs if d["contentType"] == "qa")
+    assert qa["embedding"] == [len("Q? A.")] and qa["content"]["answer"] == "A." and qa["app_id"] == "app-1"
+    assert body["results"][3]["id"] == qa["_id"] and bumps == ["app-1"]
+    reset()
+
+def test_ndjson_with_bad_lines_and_failed_chunk():
+    reset(chunk_size=2)
+    lines = [json.dumps(note(0)), "{not json", json.dumps(note(1)),
+             json.dumps({"contentType": "note", "text": "explode", "language": "en"}), json.dumps(note(2))]
+    resp = client.post("/api/v1/client/app/app-1/content:bulk", content="\n".join(lines).encode(),
+                       headers={"Content-Type": "application/x-ndjson"})
+    body = resp.json()
+    assert (body["created"], body["invalid"], body["failed"]) == (2, 1, 2)
+    assert body["results"][1]["status"] == "invalid"
+    assert [r["status"] for r in body["results"] if r["index"] in (3, 4)] == ["failed", "failed"]
+    assert "quota exceeded" in body["results"][3]["error"]
+    reset()
+
+def test_split_body_chunks():
+    reset()
+    items = json.dumps([note(i) for i in range(5)], ensure_ascii=False).encode()
+
+    async def stream():
+        for i in range(0, len(items), 7):
+            yield items[i:i + 7]
+
+    async def collect():
+        return [item async for item in bulk._json_array_items(stream())]
+    parsed = asyncio.run(collect())
+    assert [p["text"] for p in parsed] == [f"note {i} é" for i in range(5)]
+
+def test_large_elements_are_decoded_once():
+    reset()
+    tricky = {"contentType": "note", "text": 'brackets ] } [ { and "quotes" \\ in text ' * 2000}
+    body = json.dumps([tricky, 7, None, tricky]).encode()
+    decoded = []
+
+    class CountingDecoder:
+        def decode(self, text):
+            decoded.append(len(text))
+            return json.loads(text)
+
+    async def stream(size):
+        for i in range(0, len(body), size):
+            yield body[i:i + size]
+
+    async def collect(size):
+        return [item async for item in bulk._json_array_items(stream(size))]
+    original = bulk._decoder
+    bulk._decoder = CountingDecoder()
+    try:
+        for size in (1, 3, 4096):
+            decoded.clear()
+            assert asyncio.run(collect(size)) == [tricky, 7, None, tricky]
+            # Each element is decoded once it is complete, not retried on every chunk
+            assert len(decoded) == 4 and sum(decoded) < len(body)
+        # A complete but invalid element fails on its own; the rest still parse
+        body = b'[{"a": 1}}, {"b": 2}]'
+        items = asyncio.run(collect(2))
+        assert items[0] == {"a": 1} and isinstance(items[1], ValueError) and items[2] == {"b": 2}
+    finally:
+        bulk._decoder = original
+
+if __name__ == "__main__":
+    test_json_array_in_chunks()
+    test_ndjson_with_bad_lines_and_failed_chunk()
+    test_split_body_chunks()
+    test_large_elements_are_decoded_once()
+    print("✅ Bulk content tests passed")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the documents/time-series chat_messages layouts.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import datetime
+from app.services.persistence import TurnWriter
+from app.utils.chat_messages import ensure_messages_collection, from_storage, message_filter, messages_layout, to_storage
+
+MESSAGE = {"appId": "app", "sessionId": "s1", "sender": "user", "message": "hi",
+           "timestamp": datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc), "language": "en"}
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.indexes = []
+        self.inserted = []
+
+    async def create_index(self, keys):
+        self.indexes.append(keys)
+
+    async def insert_many(self, docs, ordered=True):
+        self.inserted.extend(docs)
+
+class FakeDb:
+    name = "tenant"
+
+    def __init__(self):
+        self.collections = {}
+        self.created = []
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection(name))
+
+    async def list_collection_names(self, filter=None):
+        return [c for c in self.created if not filter or c == filter["name"]]
+
+    async def create_collection(self, name, **options):
+        self.created.append(name)
+        self.options = options
+
+def test_round_trip_and_filters():
+    stored = to_storage(MESSAGE, "timeseries")
+    assert stored["meta"] == {"appId": "app", "sessionId": "s1"} and "appId" not in stored
+    assert from_storage(stored) == MESSAGE
+    assert to_storage(MESSAGE, "documents") is MESSAGE and from_storage(MESSAGE) is MESSAGE
+    assert message_filter("timeseries", "app", "s1", sender="ai") == {"meta.appId": "app", "meta.sessionId": "s1", "sender": "ai"}
+    assert message_filter("documents", "app") == {"appId": "app"}
+
+def test_layout_comes_from_the_app_document():
+    assert messages_layout({}) == "documents"
+    assert messages_layout({"chatMessagesLayout": "timeseries"}) == "timeseries"
+    try:
+        messages_layout({"chatMessagesLayout": "columnar"})
+    except ValueError:
+        pass
+    else:
+        assert False, "unknown layout accepted"
+
+def test_time_series_collection_is_created_once():
+    db = FakeDb()
+
+    async def run():
+        first = await ensure_messages_collection(db, "timeseries")
+        second = await ensure_messages_collection(db, "timeseries")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is second and first.name == "chat_messages_ts"
+    assert db.created == ["chat_messages_ts"]
+    assert db.options["timeseries"] == {"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"}
+    assert first.indexes[0] == [("meta.appId", 1), ("meta.sessionId", 1), ("timestamp", -1)]
+
+def test_turn_writer_stores_the_app_layout():
+    messages = FakeCollection("chat_messages_ts")
+
+    class Sessions:
+        async def bulk_write(self, requests, ordered=True):
+            pass
+
+    async def resolve(app_id):
+        return {"chat_messages": messages, "chat_sessions": Sessions(), "chat_messages_layout": "timeseries"}
+
+    asyncio.run(TurnWriter(resolve).write("app", "s1", [dict(MESSAGE)], None))
+    assert messages.inserted[0]["meta"] == {"appId": "app", "sessionId": "s1"}
+
+if __name__ == "__main__":
+    test_round_trip_and_filters()
+    test_layout_comes_from_the_app_document()
+    test_time_series_collection_is_created_once()
+    test_turn_writer_stores_the_app_layout()
+    print("✅ chat_messages layout tests passed")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests for the concurrent chat turn pipeline: overlapping stages, cancellation on block, timings.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import time
+import datetime
+from app.routers import chat
+from app.services.chat_processor import PipelineMetrics, TurnPipeline
+
+DELAY = 0.05
+APP = {"_id": "app", "defaultLanguage": "en"}
+SESSION = {"_id": "s1", "appId": "app", "language": "en", "lastActiveAt": datetime.datetime.now(datetime.timezone.utc)}
+
+def install_fakes(blocked=False):
+    """Replace the I/O stages of a chat turn with fakes that each take DELAY seconds."""
+    calls = {"cancelled": set()}
+
+    def stage(name, result, delay=DELAY):
+        async def fake(*args, **kwargs):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                calls["cancelled"].add(name)
+                raise
+            return result
+        return fake
+
+    originals = {name: getattr(chat, name) for name in ("get_app", "get_session", "get_query_embedding", "get_relevant_content", "get_last_messages", "apply_guardrails")}
+    chat.get_app = stage("app", dict(APP))
+    chat.get_session = stage("session", dict(SESSION))
+    chat.get_query_embedding = stage("embedding", None)
+    chat.get_relevant_content = stage("retrieval", [{"contentType": "note", "text": "Open 9 to 5."}])
+    chat.get_last_messages = stage("history", [{"sender": "user", "message": "hi"}])
+    verdict = {"blocked": True, "ruleId": "r1", "message": "Blocked"} if blocked else {"blocked": False}
+    # A blocking rule answers before the lookups started alongside it have finished
+    chat.apply_guardrails = stage("guardrails_in", verdict, delay=0 if blocked else DELAY)
+    return calls, originals
+
+def restore(originals):
+    for name, fn in originals.items():
+        setattr(chat, name, fn)
+
+def test_lookups_overlap_the_input_guardrails():
+    calls, originals = install_fakes()
+    try:
+        started = time.perf_counter()
+        turn = asyncio.run(chat.prepare_chat_turn("app", "s1", "When do you open on weekdays?"))
+        elapsed = time.perf_counter() - started
+    finally:
+        restore(originals)
+    assert turn["early_response"] is None and "Open 9 to 5." in turn["prompt"]
+    # app+session, then guardrails alongside embedding/retrieval/history: two rounds, not six
+    assert elapsed < 4 * DELAY
+    assert {"app", "session", "guardrails_in", "embedding", "retrieval", "history"} <= set(turn["pipeline"].timings)
+
+def test_blocked_input_cancels_pending_lookups():
+    calls, originals = install_fakes(blocked=True)
+    try:
+        turn = asyncio.run(chat.prepare_chat_turn("app", "s1", "something forbidden"))
+    finally:
+        restore(originals)
+    assert turn["early_response"].guardrailTriggered
+    assert calls["cancelled"] == {"embedding", "retrieval", "history"}
+    assert turn["pipeline"].cancelled == calls["cancelled"]
+    assert "retrieval" not in turn["pipeline"].timings
+
+def test_history_comes_from_the_session():
+    utc = datetime.timezone.utc
+    stored = datetime.datetime(2024, 5, 1, 12, 0)  # read back from MongoDB: naive UTC
+    session = {"_id": "s1", "recentTurns": [
+        {"sender": "user", "message": "old", "timestamp": stored},
+        {"sender": "user", "message": "new", "timestamp": datetime.datetime(2024, 5, 1, 12, 5, tzinfo=utc)},
+        {"sender": "ai", "message": "newer", "timestamp": datetime.datetime(2024, 5, 1, 12, 6, tzinfo=utc)},
+    ]}
+    msgs = asyncio.run(chat.get_last_messages("app", session, limit=6, after=stored))
+    assert [m["message"] for m in msgs] == ["new", "newer"]
+    assert [m["message"] for m in asyncio.run(chat.get_last_messages("app", session, limit=1))] == ["newer"]
+
+def test_pipeline_cancel_and_metrics():
+    metrics = PipelineMetrics()
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def failing():
+        raise RuntimeError("lookup failed")
+
+    async def run():
+        pipeline = TurnPipeline(metrics)
+        pipeline.start("slow", slow())
+        pipeline.start("failing", failing())
+        await pipeline.run("fast", asyncio.sleep(0))
+        await asyncio.sleep(0)
+        return pipeline.finish(), pipeline
+
+    timings, pipeline = asyncio.run(run())
+    assert set(timings) == {"fast", "total"}
+    assert pipeline.cancelled == {"slow"}
+    assert "fast;dur=" in pipeline.server_timing()
+    stats = metrics.stats()
+    assert stats["slow"]["cancelled"] == 1 and stats["fast"]["runs"] == 1
+
+if __name__ == "__main__":
+    test_lookups_overlap_the_input_guardrails()
+    test_blocked_input_cancels_pending_lookups()
+    test_history_comes_from_the_session()
+    test_pipeline_cancel_and_metrics()
+    print("✅ Chat pipeline tests passed")
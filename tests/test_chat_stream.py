@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming chat endpoint: SSE event order, the final verdict event,
+persistence after the stream, output guardrails mid-stream, upstream errors and disconnects.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import datetime
+import json
+import httpx
+from fastapi import FastAPI
+from app.routers import chat
+from app.services import gemini_client
+from app.services.guardrail import CompiledGuardrails
+from tests.fake_gemini import create_fake_gemini
+
+APP = {"_id": "app", "defaultLanguage": "en", "googleApiKey": "stream-test-key"}
+SESSION = {"_id": "s1", "appId": "app", "language": "en", "lastActiveAt": datetime.datetime.now(datetime.timezone.utc)}
+ANSWER = "answer from gemini-1.5-flash (cached=False) "
+OUTPUT_RULE = {"_id": "out", "ruleType": "response_filter", "pattern": "cached", "action": "override_response",
+               "responseMessage": {"en": "That answer was withheld."}}
+
+def install_fakes(output_rules=()):
+    """Replace the database-backed steps of a turn; `log` records persistence and background work."""
+    log = []
+
+    def returning(value):
+        async def fake(*args, **kwargs):
+            return value
+        return fake
+
+    async def store(x_app_id, session, user_message, ai_response, language, usage=None):
+        log.append(("persist", user_message, ai_response))
+
+    async def summarize(app_id, session_id, api_key):
+        log.append(("summary", session_id))
+
+    originals = {name: getattr(chat, name) for name in (
+        "get_app", "get_session", "get_query_embedding", "get_relevant_content", "get_last_messages",
+        "apply_guardrails", "get_guardrail_matcher", "store_message_and_response", "update_rolling_summary")}
+    chat.get_app = returning(dict(APP))
+    chat.get_session = returning(dict(SESSION))
+    chat.get_query_embedding = returning(None)
+    chat.get_relevant_content = returning([{"contentType": "note", "text": "Open 9 to 5."}])
+    chat.get_last_messages = returning([])
+    chat.apply_guardrails = returning({"blocked": False})
+    chat.get_guardrail_matcher = returning(CompiledGuardrails(list(output_rules)))
+    chat.store_message_and_response = store
+    chat.update_rolling_summary = summarize
+    return log, originals
+
+def restore(originals):
+    for name, fn in originals.items():
+        setattr(chat, name, fn)
+
+def run_with_fake(scenario, output_rules=()):
+    fake = create_fake_gemini()
+    log, originals = install_fakes(output_rules)
+
+    async def main():
+        gemini_client._http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake))
+        try:
+            await scenario(fake, log)
+        finally:
+            await gemini_client.close_http_client()
+    try:
+        asyncio.run(main())
+    finally:
+        restore(originals)
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+async def turn_events(message="When do you open?"):
+    turn = await chat.prepare_chat_turn("app", "s1", message)
+    return turn, chat._stream_chat_events("app", message, turn)
+
+def test_endpoint_streams_tokens_then_verdict_and_stores_the_turn():
+    async def scenario(fake, log):
+        api = FastAPI()
+        api.include_router(chat.router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as client:
+            resp = await client.post("/api/v1/client/chat/message/stream", json={"message": "When do you open?"},
+                                     headers={"X-App-Id": "app", "X-Session-Id": "s1"})
+        assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/event-stream")
+        events = parse_events(resp.text)
+        names = [name for name, _ in events]
+        # session first, one token event per upstream chunk plus the held-back last character, the verdict last
+        assert names[0] == "session" and names[-1] == "guardrail"
+        assert set(names[1:-1]) == {"token"} and len(names) - 2 == len(ANSWER.split()) + 1
+        assert "".join(data["text"] for name, data in events if name == "token") == ANSWER
+        assert events[-1][1]["message"] == ANSWER and events[-1][1]["guardrailTriggered"] is False
+        # The turn is stored once, then the summary update runs as a background task
+        assert log == [("persist", "When do you open?", ANSWER), ("summary", "s1")]
+        assert len(fake.state.generate_requests) == 1
+    run_with_fake(scenario)
+
+def test_turn_is_stored_after_the_final_event():
+    async def scenario(fake, log):
+        turn, events = await turn_events()
+        seen = []
+        async for event in events:
+            seen.append(event.split("\n", 1)[0])
+            # Nothing is written while the answer is still streaming
+            assert not log or seen[-1] == "event: guardrail"
+        assert seen[-1] == "event: guardrail"
+        assert log == [("persist", "When do you open?", ANSWER)]
+        assert "total" in turn["pipeline"].timings and "persist" in turn["pipeline"].timings
+    run_with_fake(scenario)
+
+def test_output_guardrail_blocks_mid_stream():
+    async def scenario(fake, log):
+        turn, events = await turn_events()
+        parsed = parse_events("".join([event async for event in events]))
+        streamed = "".join(data["text"] for name, data in parsed if name == "token")
+        # Text before the match was already released; the match and everything after it never is
+        assert streamed and ANSWER.startswith(streamed) and "cached" not in streamed
+        verdict = parsed[-1]
+        assert verdict[0] == "guardrail" and verdict[1]["guardrailTriggered"] is True
+        assert verdict[1]["guardrailRuleId"] == "out" and verdict[1]["message"] == "That answer was withheld."
+        assert log == [("persist", "When do you open?", "That answer was withheld.")]
+    run_with_fake(scenario, output_rules=[OUTPUT_RULE])
+
+def test_upstream_error_ends_the_stream_with_an_error_event():
+    async def scenario(fake, log):
+        fake.state.fail_status = 400
+        turn, events = await turn_events()
+        parsed = parse_events("".join([event async for event in events]))
+        assert [name for name, _ in parsed] == ["session", "error"]
+        assert "400" in parsed[-1][1]["error"]
+        # A failed answer is neither stored nor followed by a verdict
+        assert log == []
+        assert "total" in turn["pipeline"].timings
+    run_with_fake(scenario)
+
+def test_client_disconnect_closes_upstream_without_storing():
+    upstream = chat.stream_gemma_api
+
+    async def tracked_stream(*args, **kwargs):
+        try:
+            async for text in upstream(*args, **kwargs):
+                yield text
+        finally:
+            closed.append(True)
+
+    async def scenario(fake, log):
+        turn, events = await turn_events()
+        assert (await events.__anext__()).startswith("event: session")
+        assert (await events.__anext__()).startswith("event: token")
+        assert not closed
+        # What the server does when the client goes away mid-answer
+        await events.aclose()
+        assert closed == [True] and log == []
+        assert "total" in turn["pipeline"].timings
+
+    closed = []
+    chat.stream_gemma_api = tracked_stream
+    try:
+        run_with_fake(scenario)
+    finally:
+        chat.stream_gemma_api = upstream
+
+def test_stream_gemma_api_yields_text_deltas():
+    async def scenario(fake, log):
+        chunks = [text async for text in chat.stream_gemma_api("stream-test-key", "hi", model="m1", max_tokens=8)]
+        assert chunks == ["answer ", "from ", "m1 ", "(cached=False) "]
+        assert fake.state.generate_requests[0]["prompt"] == "hi"
+    run_with_fake(scenario)
+
+if __name__ == "__main__":
+    test_endpoint_streams_tokens_then_verdict_and_stores_the_turn()
+    test_turn_is_stored_after_the_final_event()
+    test_output_guardrail_blocks_mid_stream()
+    test_upstream_error_ends_the_stream_with_an_error_event()
+    test_client_disconnect_closes_upstream_without_storing()
+    test_stream_gemma_api_yields_text_deltas()
+    print("✅ Streaming chat tests passed")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for prefix caching of each tenant's knowledge block, against the local fake Gemini server.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import httpx
+from app.config import settings
+from app.services import gemini_client
+from app.services.context_cache import ContextCacheRegistry
+from app.routers.chat import build_prompt, build_prompt_prefix, build_prompt_suffix, call_gemma_api
+from tests.fake_gemini import create_fake_gemini
+
+PREFIX = build_prompt_prefix(["What is your return policy?\nThirty days."], ["Closed on holidays."], [], [])
+
+def run_with_fake(test):
+    fake = create_fake_gemini()
+
+    async def main():
+        gemini_client._http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake))
+        try:
+            await test(fake)
+        finally:
+            await gemini_client.close_http_client()
+
+    enabled, min_tokens = settings.CONTEXT_CACHE_ENABLED, settings.CONTEXT_CACHE_MIN_TOKENS
+    settings.CONTEXT_CACHE_ENABLED, settings.CONTEXT_CACHE_MIN_TOKENS = True, 1
+    try:
+        asyncio.run(main())
+    finally:
+        settings.CONTEXT_CACHE_ENABLED, settings.CONTEXT_CACHE_MIN_TOKENS = enabled, min_tokens
+
+def test_prompt_splits_into_stable_prefix_and_variable_suffix():
+    prompt = build_prompt("Can I return shoes?", ["Q\nA"], [], [], [], [{"message": "hi"}])
+    prefix = build_prompt_prefix(["Q\nA"], [], [], [])
+    assert prompt == prefix + build_prompt_suffix("Can I return shoes?", [{"message": "hi"}])
+    assert "Can I return shoes?" not in prefix
+    assert "hi" not in prefix
+
+def test_prefix_registered_once_per_content_version():
+    async def scenario(fake):
+        registry = ContextCacheRegistry()
+        first = await registry.resolve("app-1", "key", "gemini-1.5-flash-001", 1, PREFIX)
+        again = await registry.resolve("app-1", "key", "gemini-1.5-flash-001", 1, PREFIX)
+        assert first and first == again
+        assert list(fake.state.caches) == [first]
+
+        # Content changed: a new cache replaces the old one
+        refreshed = await registry.resolve("app-1", "key", "gemini-1.5-flash-001", 2, PREFIX + "\nNew note")
+        assert refreshed != first
+        assert list(fake.state.caches) == [refreshed]
+        assert registry.stats()["created"] == 2 and registry.stats()["reused"] == 1
+
+    run_with_fake(scenario)
+
+def test_generation_sends_only_suffix_with_cache_name():
+    async def scenario(fake):
+        registry = ContextCacheRegistry()
+        name = await registry.resolve("app-1", "key", "gemini-1.5-flash-001", 1, PREFIX)
+        answer = await call_gemma_api("key", build_prompt_suffix("Can I return shoes?", []),
+                                      model="gemini-1.5-flash-001", cached_content=name)
+        assert answer == "answer from gemini-1.5-flash-001 (cached=True)"
+        sent = fake.state.generate_requests[-1]
+        assert sent["cachedContent"] == name
+        assert "Thirty days" not in sent["prompt"]
+
+    run_with_fake(scenario)
+
+def test_concurrent_first_messages_register_one_cache():
+    async def scenario(fake):
+        registry = ContextCacheRegistry()
+        names = await asyncio.gather(*[registry.resolve("app-1", "key", "m", 1, PREFIX) for _ in range(10)])
+        assert len(set(names)) == 1
+        assert len(fake.state.caches) == 1
+
+    run_with_fake(scenario)
+
+def test_small_prefix_is_not_cached():
+    async def scenario(fake):
+        registry = ContextCacheRegistry()
+        settings.CONTEXT_CACHE_MIN_TOKENS = 10**6
+        assert await registry.resolve("app-1", "key", "m", 1, PREFIX) is None
+        assert not fake.state.caches
+
+    run_with_fake(scenario)
+
+if __name__ == "__main__":
+    test_prompt_splits_into_stable_prefix_and_variable_suffix()
+    test_prefix_registered_once_per_content_version()
+    test_generation_sends_only_suffix_with_cache_name()
+    test_concurrent_first_messages_register_one_cache()
+    test_small_prefix_is_not_cached()
+    print("✅ Context cache tests passed")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for bounding prompt history with a rolling session summary.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import datetime
+from app.config import settings
+from app.services import conversation
+from app.services.conversation import build_summary_prompt, fit_history, messages_after, recent_turns_size, split_for_summary
+from app.routers.chat import build_prompt_suffix, get_last_messages
+
+def _turns(n):
+    start = datetime.datetime(2025, 8, 23, tzinfo=datetime.timezone.utc)
+    msgs = []
+    for i in range(n):
+        ts = start + datetime.timedelta(minutes=i)
+        msgs.append({"sender": "user", "message": f"question {i:03d}", "timestamp": ts})
+        msgs.append({"sender": "ai", "message": f"answer {i:03d}", "timestamp": ts})
+    return msgs
+
+def test_split_keeps_recent_turns_and_never_splits_a_turn():
+    msgs = _turns(6)
+    folded = split_for_summary(msgs, keep_messages=4)
+    assert [m["message"] for m in folded][-2:] == ["question 003", "answer 003"]
+    assert len(folded) == 8
+    # An odd cut would separate a user message from its answer; it is pushed to the turn boundary
+    assert len(split_for_summary(msgs, keep_messages=3)) == 10
+    assert split_for_summary(msgs[:4], keep_messages=4) == []
+
+def test_fit_history_drops_oldest_messages_first():
+    msgs = _turns(10)
+    summary, kept = fit_history("user wants a refund", msgs, budget_tokens=20)
+    assert summary == "user wants a refund"
+    assert kept and kept[-1]["message"] == "answer 009"
+    assert kept == msgs[-len(kept):]
+    assert len(kept) < len(msgs)
+
+def test_fit_history_truncates_oversized_summary():
+    summary, kept = fit_history("x" * 10000, _turns(2), budget_tokens=100)
+    assert len(summary) <= 400
+    assert kept == []
+
+def test_prompt_size_stays_flat_as_conversation_grows():
+    sizes = []
+    for n in (5, 50, 500):
+        summary, kept = fit_history("short summary", _turns(n)[-6:], budget_tokens=1500)
+        sizes.append(len(build_prompt_suffix("next question", kept, summary)))
+    assert len(set(sizes)) == 1
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction=1):
+        self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+class FakeMessages:
+    def __init__(self):
+        self.docs = []
+
+    def _matching(self, query):
+        after = query.get("timestamp", {}).get("$gt")
+        return [d for d in self.docs if after is None or d["timestamp"] > after]
+
+    async def count_documents(self, query):
+        return len(self._matching(query))
+
+    def find(self, query):
+        return Cursor(self._matching(query))
+
+class FakeSessions:
+    def __init__(self, session):
+        self.session = session
+
+    async def find_one(self, query):
+        return dict(self.session)
+
+    async def update_one(self, query, update):
+        self.session.update(update["$set"])
+
+def test_history_keeps_every_unsummarized_message():
+    session = {"_id": "s1", "appId": "app"}
+    messages = FakeMessages()
+    collections = {"chat_sessions": FakeSessions(session), "chat_messages": messages, "chat_messages_layout": "documents"}
+
+    async def fake_collections(app_id):
+        return {}, collections
+
+    async def fake_summarize(api_key, prompt, **kwargs):
+        return "summary"
+
+    originals = conversation.get_app_and_collections, conversation.call_gemma_api
+    conversation.get_app_and_collections, conversation.call_gemma_api = fake_collections, fake_summarize
+    try:
+        keep = 2 * settings.HISTORY_RECENT_TURNS
+        all_msgs = _turns(keep // 2 + settings.SUMMARY_BATCH_TURNS + 2)
+        # Walk the session one turn at a time, from `keep` messages past the point a batch is folded
+        for count in range(keep, len(all_msgs) + 1, 2):
+            messages.docs = all_msgs[:count]
+            session["recentTurns"] = all_msgs[:count][-recent_turns_size():]
+            history = asyncio.run(get_last_messages("app", dict(session), limit=recent_turns_size(),
+                                                    after=session.get("summarizedUntil")))
+            # Whatever the summary doesn't cover yet reaches the prompt verbatim
+            assert history == messages_after(all_msgs[:count], session.get("summarizedUntil")), count
+            asyncio.run(conversation.update_rolling_summary("app", "s1", "key"))
+        assert session["summary"] == "summary"
+        assert session["summarizedUntil"] < all_msgs[-keep]["timestamp"]
+    finally:
+        conversation.get_app_and_collections, conversation.call_gemma_api = originals
+
+def test_summary_prompt_labels_speakers():
+    prompt = build_summary_prompt(None, _turns(1))
+    assert "User: question 000" in prompt
+    assert "Assistant: answer 000" in prompt
+    assert "(none)" in prompt
+
+if __name__ == "__main__":
+    test_split_keeps_recent_turns_and_never_splits_a_turn()
+    test_fit_history_drops_oldest_messages_first()
+    test_fit_history_truncates_oversized_summary()
+    test_prompt_size_stays_flat_as_conversation_grows()
+    test_history_keeps_every_unsummarized_message()
+    test_summary_prompt_labels_speakers()
+    print("✅ Conversation summary tests passed")
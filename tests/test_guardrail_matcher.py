@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled per-tenant guardrail matcher.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import time
+import httpx
+from fastapi import FastAPI
+from app.routers.admin import guardrail as guardrail_router
+from app.services import guardrail
+from app.services.guardrail import (
+    AhoCorasick, CompiledGuardrails, GuardrailMatcherCache, RegexRuleSet, StreamingGuardrail, evaluate_corpus, validate_regex_pattern
+)
+
+def rule(rule_id, pattern, rule_type="blacklist_phrase", action="block_input"):
+    return {
+        "_id": rule_id,
+        "ruleType": rule_type,
+        "pattern": pattern,
+        "action": action,
+        "responseMessage": {"en": f"blocked by {rule_id}"},
+    }
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.finds = 0
+
+    def find(self, query):
+        self.finds += 1
+        return FakeCursor(self.docs)
+
+def test_automaton_finds_overlapping_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    assert automaton.search("ushers") == {0, 1, 3}
+    assert automaton.search("nothing here") == {0}
+    assert automaton.search("xyz") == set()
+
+def test_matching_is_normalized():
+    matcher = CompiledGuardrails([rule("r1", "BadWord")])
+    assert matcher.evaluate("this has a BADWORD in it", "en")["blocked"]
+    # Full-width letters fold to ASCII under NFKC
+    assert matcher.evaluate("ｂａｄｗｏｒｄ", "en")["ruleId"] == "r1"
+    assert matcher.evaluate("a clean message", "en") == {"blocked": False}
+
+def test_first_blocking_rule_wins_and_log_only_is_kept():
+    matcher = CompiledGuardrails([
+        rule("watch", "refund", action="log_only"),
+        rule("late", "chargeback"),
+        rule("early", "refund"),
+    ])
+    result = matcher.evaluate("refund or chargeback?", "en")
+    assert result["blocked"] and result["ruleId"] == "late"
+    assert [hit["ruleId"] for hit in result["logged"]] == ["watch"]
+    logged_only = matcher.evaluate("refund status", "en")
+    assert logged_only["blocked"] and logged_only["ruleId"] == "early"
+    assert CompiledGuardrails([rule("watch", "monitor", action="log_only")]).evaluate("monitor me", "en")["blocked"] is False
+
+def test_response_filter_only_applies_to_output():
+    matcher = CompiledGuardrails([rule("out", "confidential", rule_type="response_filter", action="override_response")])
+    assert matcher.evaluate("confidential", "en", "input") == {"blocked": False}
+    assert matcher.evaluate("confidential", "en", "output")["blocked"]
+
+def test_thousands_of_rules_stay_fast():
+    rules = [rule(f"r{i}", f"forbidden phrase {i:05d}") for i in range(5000)]
+    matcher = CompiledGuardrails(rules)
+    text = "a perfectly ordinary customer question about shipping times " * 4
+    started = time.perf_counter()
+    for _ in range(100):
+        assert matcher.evaluate(text, "en") == {"blocked": False}
+    assert (time.perf_counter() - started) / 100 < 0.005
+    assert matcher.evaluate(text + "forbidden phrase 04999", "en")["ruleId"] == "r4999"
+
+def test_cache_recompiles_on_version_bump():
+    cache = GuardrailMatcherCache()
+    collection = FakeCollection([rule("r1", "spam")])
+
+    async def run():
+        first = await cache.get("app-1", 0, collection)
+        assert await cache.get("app-1", 0, collection) is first
+        collection.docs = [rule("r2", "scam")]
+        second = await cache.get("app-1", 1, collection)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert collection.finds == 2
+    assert first.evaluate("spam", "en")["blocked"]
+    assert second.evaluate("spam", "en") == {"blocked": False}
+    assert cache.stats()["compiles"] == 2 and cache.stats()["hits"] == 1
+
+def test_streaming_holds_back_only_a_possible_match():
+    matcher = CompiledGuardrails([rule("out", "secret code", rule_type="response_filter", action="override_response")])
+    guard = StreamingGuardrail(matcher, "en")
+    assert guard.feed("Here is the sec") == "Here is the "
+    # The last character waits for the next chunk in case a combining mark follows it
+    assert guard.feed("ond answer") == "second answe"
+    assert guard.finish() == "r"
+    assert guard.result == {"blocked": False}
+
+def test_streaming_blocks_phrase_split_across_chunks():
+    matcher = CompiledGuardrails([rule("out", "Secret Code", rule_type="response_filter", action="override_response")])
+    guard = StreamingGuardrail(matcher, "en")
+    released = [guard.feed(chunk) for chunk in ["The SEC", "RET co", "de is 1234", " and more"]]
+    assert "".join(released) == "The "
+    assert guard.blocked and guard.result["message"] == "blocked by out"
+    assert guard.finish() == ""
+
+def test_streaming_releases_tail_and_keeps_log_only_hits():
+    matcher = CompiledGuardrails([rule("watch", "refund", action="log_only")])
+    guard = StreamingGuardrail(matcher, "en")
+    streamed = guard.feed("You can get a refund") + guard.feed(" within 30 days. ref") + guard.finish()
+    assert streamed == "You can get a refund within 30 days. ref"
+    assert guard.result["blocked"] is False and guard.result["ruleId"] == "watch"
+
+def test_streaming_normalizes_sequences_split_across_chunks():
+    matcher = CompiledGuardrails([rule("out", "café", rule_type="response_filter", action="override_response"),
+                                  rule("hangul", "한", rule_type="response_filter", action="override_response")])
+    # A base letter and its combining accent in different chunks fold to the precomposed é
+    guard = StreamingGuardrail(matcher, "en")
+    released = [guard.feed(chunk) for chunk in ["Our CAFE", "\u0301 menu"]]
+    assert "".join(released) == "Our " and guard.result["ruleId"] == "out"
+    # So do conjoining Hangul jamo (ᄒ ᅡ ᆫ), which are not combining marks
+    guard = StreamingGuardrail(matcher, "en")
+    released = [guard.feed(chunk) for chunk in ["x \u1112", "\u1161", "\u11ab"]]
+    assert "".join(released) == "x " and not guard.blocked
+    assert guard.finish() == "" and guard.result["ruleId"] == "hangul"
+    # Fullwidth letters fold to ASCII, and an unaccented word is released as soon as it ends
+    guard = StreamingGuardrail(matcher, "en")
+    assert guard.feed("ｃａｆ") == "" and guard.feed("ｅ") == "" and guard.feed(" ok") == "ｃａｆｅ o"
+    assert guard.finish() == "k" and guard.result == {"blocked": False}
+
+def test_regex_validation_rejects_catastrophic_patterns():
+    assert validate_regex_pattern(r"fr[e3]{2}\s*m[o0]ney")
+    for pattern in [r"(a+)+$", r"(\w*)*x", r"(a|b)\1", r"(?=x)y", r"(?P<n>x)", r"(?i)x", r"a*", "(", "x" * 1000]:
+        try:
+            validate_regex_pattern(pattern)
+        except ValueError:
+            continue
+        raise AssertionError(f"{pattern!r} should be rejected")
+
+def test_regex_validation_rejects_ambiguous_repeats():
+    # Each of these backtracks exponentially (or polynomially) on a near-miss input
+    for pattern in [r"(a|a)*b", r"(a|aa)+c", r"(\w|\d)+x", r"\w*\w*\w*\w*z", r"(a|b|ab)*c", r"\d+\s*\d+y", r"x.*.*y",
+                    r"(.*),(.*),(.*),(.*)x", r"a.*b.*c.*d.*e", r".*free.*money", r"(?:.*,){3}x"]:
+        try:
+            validate_regex_pattern(pattern)
+        except ValueError:
+            continue
+        raise AssertionError(f"{pattern!r} should be rejected")
+    for pattern in [r"(foo|bar)+baz", r"(a|ab)*c", r"(?:\d{3}-)+x", r".{0,50}free.{0,50}money", r"[a-z]+@[a-z]+\.com",
+                    r"\b\d{4}(?:[ -]?\d{4}){3}\b", r"money\s+back"]:
+        assert validate_regex_pattern(pattern)
+
+def test_regex_rules_run_in_linear_time():
+    # Validation is defence in depth: even patterns it rejects scan in linear time on re2
+    # (the backtracking engine takes 30s and 3s on these inputs)
+    original, guardrail.validate_regex_pattern = guardrail.validate_regex_pattern, lambda pattern: pattern
+    try:
+        rules = RegexRuleSet([(0, r"(.*),(.*),(.*),(.*)x"), (1, r"a.*b.*c.*d.*e")])
+    finally:
+        guardrail.validate_regex_pattern = original
+    assert len(rules) == 2
+    started = time.perf_counter()
+    assert rules.search("," * 200) == set() and rules.search("abcd" * 100) == set()
+    assert time.perf_counter() - started < 1
+
+def test_regex_rules_combined_with_phrases():
+    matcher = CompiledGuardrails([
+        rule("money", r"fr[e3]{2}\s*m[o0]n[e3]y", rule_type="regex"),
+        rule("phrase", "spam"),
+        rule("card", r"\b\d{4}(?:[ -]?\d{4}){3}\b", rule_type="regex", action="log_only"),
+    ])
+    assert matcher.evaluate("get FR33  MONEY now", "en")["ruleId"] == "money"
+    assert matcher.evaluate("card 1234 5678 9012 3456", "en")["blocked"] is False
+    assert matcher.evaluate("card 1234 5678 9012 3456", "en")["ruleId"] == "card"
+    assert matcher.evaluate("no spam here", "en")["ruleId"] == "phrase"
+    assert matcher.evaluate("hello", "en") == {"blocked": False}
+
+def test_regex_overlap_still_prefers_earlier_rule():
+    matcher = CompiledGuardrails([
+        rule("first", r"money\s+back", rule_type="regex"),
+        rule("second", r"get\s+money", rule_type="regex"),
+    ])
+    # The combined scan matches "get money" first, which hides "money back"
+    assert matcher.evaluate("get money back", "en")["ruleId"] == "first"
+
+def test_streaming_regex_holds_back_window():
+    matcher = CompiledGuardrails([rule("money", r"free\s+money", rule_type="regex")])
+    guard = StreamingGuardrail(matcher, "en")
+    released = guard.feed("x" * 100 + " free ")
+    assert released == "x" * 42
+    assert guard.feed("money!") == ""
+    assert guard.blocked and guard.finish() == ""
+
+def test_dry_run_over_streamed_corpus():
+    matcher = CompiledGuardrails([
+        rule("scam", r"fr[e3]{2}\s*crypto", rule_type="regex"),
+        rule("refund", "refund", action="log_only"),
+        rule("leak", "internal only", rule_type="response_filter", action="override_response"),
+    ])
+    consumed = []
+
+    async def corpus():
+        for i in range(1000):
+            consumed.append(i)
+            text = ["hello", "FREE crypto and a refund", "refund please", "internal only"][i % 4]
+            yield {"text": text, "direction": "input", "sessionId": f"s{i}"}
+
+    report = asyncio.run(evaluate_corpus(matcher, corpus(), batch_size=100, sample_size=2))
+    assert report["scanned"] == 1000 == len(consumed)
+    assert report["blocked"] == 250 and report["logged"] == 500
+    by_id = {r["ruleId"]: r for r in report["rules"]}
+    assert by_id["scam"]["hits"] == 250 and by_id["refund"]["hits"] == 500
+    # response_filter rules never apply to user input
+    assert by_id["leak"]["hits"] == 0
+    assert [s["sessionId"] for s in by_id["scam"]["samples"]] == ["s1", "s5"]
+    assert report["messagesPerSecond"] > 0
+
+def test_evaluate_endpoint_validates_direction_and_sender():
+    api = FastAPI()
+    api.include_router(guardrail_router.router)
+    rules = [{"ruleType": "response_filter", "pattern": "internal only", "action": "override_response"}]
+
+    async def post(**body):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as client:
+            return await client.post("/api/v1/client/app/app/guardrails/evaluate", json={"rules": rules, **body})
+
+    # A misspelled direction used to be accepted and silently matched no output rules
+    assert asyncio.run(post(texts=["internal only"], direction="outptu")).status_code == 422
+    assert asyncio.run(post(days=7, sender="bot")).status_code == 422
+    resp = asyncio.run(post(texts=["internal only"], direction="output"))
+    assert resp.status_code == 200 and resp.json()["blocked"] == 1
+
+if __name__ == "__main__":
+    test_automaton_finds_overlapping_patterns()
+    test_matching_is_normalized()
+    test_first_blocking_rule_wins_and_log_only_is_kept()
+    test_response_filter_only_applies_to_output()
+    test_thousands_of_rules_stay_fast()
+    test_cache_recompiles_on_version_bump()
+    test_streaming_holds_back_only_a_possible_match()
+    test_streaming_blocks_phrase_split_across_chunks()
+    test_streaming_releases_tail_and_keeps_log_only_hits()
+    test_streaming_normalizes_sequences_split_across_chunks()
+    test_regex_validation_rejects_catastrophic_patterns()
+    test_regex_validation_rejects_ambiguous_repeats()
+    test_regex_rules_run_in_linear_time()
+    test_regex_rules_combined_with_phrases()
+    test_regex_overlap_still_prefers_earlier_rule()
+    test_streaming_regex_holds_back_window()
+    test_dry_run_over_streamed_corpus()
+    test_evaluate_endpoint_validates_direction_and_sender()
+    print("✅ Guardrail matcher tests passed")
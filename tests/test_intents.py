@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for per-app intent tables and offline language identification.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+from app.utils.text import NormalizedText
+from app.services.intents import IntentTable, IntentTableCache, detect_language, intent_response
+from app.services.language_id import language_identifier
+from tests.test_model_router import settings_client
+
+APP = {
+    "welcomeMessage": {"en": "Welcome!"},
+    "acknowledgmentMessage": {"en": "You're welcome!", "es": "¡De nada!"},
+    "availableLanguages": ["en", "es", "fr"],
+}
+
+def match(message, config=None):
+    return IntentTable(config).match(NormalizedText(message))
+
+def test_default_intents():
+    assert match("Thanks!")["thanks"] and match("Thanks!")["trivial"]
+    assert match("Please  SWITCH to spanish")["language_switch"] == "es"
+    # Whole-word matching: "hi" inside "this" is not a greeting
+    assert "greeting" not in match("is this in stock")
+    assert not match("thanks, but where is my order from last week?")["trivial"]
+
+def test_trivial_turns_are_answered_locally():
+    table = IntentTable()
+    assert intent_response(APP, table, table.match(NormalizedText("thank you so much")), "es") == ("thanks", "¡De nada!")
+    assert intent_response(APP, table, table.match(NormalizedText("Hello")), "en") == ("greeting", "Welcome!")
+    long_thanks = table.match(NormalizedText("thanks, and what is the refund policy for shoes?"))
+    assert intent_response(APP, table, long_thanks, "en") is None
+    assert intent_response(APP, table, table.match(NormalizedText("hi there!")), "en") == ("greeting", "Welcome!")
+
+def test_short_requests_with_a_greeting_are_not_trivial():
+    table = IntentTable()
+    for message in ("Hello, what are your hours?", "hi where is my order", "hola, cuánto cuesta el envío",
+                    "thanks, any discounts?", "hey, refund status"):
+        found = table.match(NormalizedText(message))
+        assert not found["trivial"], message
+        assert intent_response(APP, table, found, "en") is None, message
+
+def test_app_config_overrides_and_handoff():
+    config = {
+        "greeting": {"phrases": ["yo"], "responses": {"en": "Hey there"}},
+        "handoff": {"phrases": ["talk to a human", "real person"]},
+        "language_switch": {"phrases": {"auf deutsch": "de"}},
+    }
+    table = IntentTable(config)
+    assert "greeting" not in table.match(NormalizedText("hello"))
+    assert intent_response(APP, table, table.match(NormalizedText("yo")), "en") == ("greeting", "Hey there")
+    handoff = table.match(NormalizedText("This bot is useless, I want to talk to a human about my refund"))
+    assert intent_response(APP, table, handoff, "en")[0] == "handoff"
+    assert table.match(NormalizedText("Bitte auf Deutsch"))["language_switch"] == "de"
+
+def test_table_cache_follows_app_setting():
+    cache = IntentTableCache()
+    app = {"intents": {"greeting": {"phrases": ["yo"]}}}
+    first = cache.get("app", app)
+    assert cache.get("app", dict(app)) is first
+    assert cache.get("app", {"intents": {"greeting": {"phrases": ["sup"]}}}) is not first
+
+def test_language_identifier():
+    assert language_identifier.detect("dónde está mi pedido, debía llegar ayer")[0] == "es"
+    assert language_identifier.detect("où est ma commande, elle devait arriver hier")[0] == "fr"
+    assert language_identifier.detect("where is my order, it should have arrived yesterday")[0] == "en"
+    assert language_identifier.detect("12345 !!!") == (None, 0.0)
+    started = time.perf_counter()
+    for _ in range(200):
+        language_identifier.detect("where is my order, it should have arrived yesterday")
+    assert (time.perf_counter() - started) / 200 < 0.001
+
+def test_detect_language_respects_app_settings():
+    spanish = NormalizedText("¿Dónde está mi pedido? Debía llegar ayer")
+    assert detect_language(APP, spanish, "en") == "es"
+    assert detect_language(APP, spanish, "es") is None
+    assert detect_language({**APP, "availableLanguages": ["en"]}, spanish, "en") is None
+    assert detect_language({**APP, "languageDetection": {"enabled": False}}, spanish, "en") is None
+    assert detect_language(APP, NormalizedText("hola"), "en") is None
+
+def test_intent_and_language_detection_settings_are_validated():
+    client, apps = settings_client()
+    intents_url = "/api/v1/client/app/app/settings/intents"
+    for body in ({"greeting": {"phrases": "hi"}}, {"language_switch": {"phrases": ["auf deutsch"]}}, {"farewell": {"phrases": ["bye"]}},
+                 {"thanks": {"responses": {"en": 1}}}, {"maxTrivialTokens": 0}, {"handoff": ["human"]}):
+        assert client.put(intents_url, json=body).status_code == 422, body
+    detection_url = "/api/v1/client/app/app/settings/language-detection"
+    for body in ({"minConfidence": 1.5}, {"minChars": "many"}, {"threshold": 0.9}):
+        assert client.put(detection_url, json=body).status_code == 422, body
+    assert apps.sets == []
+
+    intents = {"greeting": {"phrases": ["yo"]}, "language_switch": {"phrases": {"auf deutsch": "de"}}}
+    assert client.put(intents_url, json=intents).status_code == 200
+    assert client.put(detection_url, json={"minChars": 20}).status_code == 200
+    assert apps.sets == [{"intents": intents}, {"languageDetection": {"minChars": 20}}]
+    assert IntentTable(apps.sets[0]["intents"]).match(NormalizedText("auf Deutsch bitte"))["language_switch"] == "de"
+
+if __name__ == "__main__":
+    test_default_intents()
+    test_trivial_turns_are_answered_locally()
+    test_short_requests_with_a_greeting_are_not_trivial()
+    test_app_config_overrides_and_handoff()
+    test_table_cache_follows_app_setting()
+    test_language_identifier()
+    test_detect_language_respects_app_settings()
+    test_intent_and_language_detection_settings_are_validated()
+    print("✅ Intent and language detection tests passed")
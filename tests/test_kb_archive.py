@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Tests for the portable knowledge-base archive: export, import into another app, and rerun.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import datetime
+import io
+import json
+import tarfile
+import tempfile
+import numpy as np
+from bson import ObjectId
+from app.services import kb_archive
+
+def matches(doc, query):
+    if "$or" in query:
+        return any(matches(doc, q) for q in query["$or"])
+    return all(doc.get(k) == v for k, v in query.items())
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction=1):
+        self.docs.sort(key=lambda d: str(d[field]), reverse=direction < 0)
+        return self
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = [dict(d) for d in docs]
+        self.writes = 0
+
+    def find(self, query=None, projection=None):
+        return Cursor([dict(d) for d in self.docs if matches(d, query or {})])
+
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.docs if matches(d, query)), None)
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def update_one(self, query, update):
+        for d in self.docs:
+            if matches(d, query):
+                d.update(update.get("$set", {}))
+                for k, v in update.get("$inc", {}).items():
+                    d[k] = d.get(k, 0) + v
+
+    async def bulk_write(self, ops, ordered=True):
+        self.writes += 1
+        for op in ops:
+            self.docs = [d for d in self.docs if not matches(d, op._filter)]
+            self.docs.append(dict(op._doc))
+
+NOW = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc)
+VECTORS = np.random.default_rng(7).standard_normal((3, 8)).astype(np.float32)
+
+apps = FakeCollection([{"_id": "src", "name": "Shop", "googleApiKey": "c2VjcmV0", "mongodbConnectionString": "mongodb://a",
+                        "contentVersion": 4, "welcomeMessage": {"en": "Hi"}, "chatMessagesLayout": "timeseries",
+                        "chatMessagesMigration": {"lastId": "m9"}, "tokenUsage": {"inputTokens": 50}}])
+tenants = {
+    "mongodb://a": {
+        "app_content": FakeCollection(
+            [{"_id": f"c{i}", "app_id": "src", "contentType": "note", "content": {"text": f"n{i}", "language": "en"},
+              "embedding": [float(x) for x in VECTORS[i]], "createdAt": NOW} for i in range(3)]
+            + [{"_id": ObjectId(), "appId": "src", "contentType": "qa", "content": {"question": "q", "answer": "a"}}]
+            + [{"_id": "other", "app_id": "elsewhere", "contentType": "note", "embedding": [1.0]}]),
+        "app_guardrails": FakeCollection([{"_id": "g1", "app_id": "src", "ruleName": "r", "isActive": True}]),
+    },
+    "mongodb://b": {"app_content": FakeCollection(), "app_guardrails": FakeCollection()},
+}
+
+async def fake_get_app_and_collections(app_id):
+    app = await apps.find_one({"_id": app_id})
+    return app, tenants[app["mongodbConnectionString"]]
+
+kb_archive.app_collection = apps
+kb_archive.get_app_and_collections = fake_get_app_and_collections
+async def fake_bump(app_id, field):
+    await apps.update_one({"_id": app_id}, {"$inc": {field: 1}})
+kb_archive.bump_app_version = fake_bump
+
+def test_export_import_round_trip():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "kb.tar.gz")
+        manifest = asyncio.run(kb_archive.export_kb("src", path))
+        assert manifest["counts"] == {"content": 4, "embeddings": 3, "guardrails": 1}
+        assert manifest["embedding"]["dim"] == 8
+
+        with tarfile.open(path) as tar:
+            assert tar.getnames() == list(kb_archive.MEMBERS)
+            settings = json.load(tar.extractfile(kb_archive.SETTINGS))
+            tar.extract(kb_archive.EMBEDDINGS, root)
+        # Secrets and deployment-local fields stay behind; vectors are stored as float32
+        assert settings == {"name": "Shop", "welcomeMessage": {"en": "Hi"}}
+        assert np.array_equal(np.load(os.path.join(root, kb_archive.EMBEDDINGS)), VECTORS)
+
+        for _ in range(2):
+            imported = asyncio.run(kb_archive.import_kb(path, "dst", mongodb_uri="mongodb://b"))
+        assert imported == {"appId": "dst", "content": 4, "embeddings": 3, "guardrails": 1}
+
+        content = tenants["mongodb://b"]["app_content"].docs
+        # Rerunning the import replaced rather than duplicated
+        assert len(content) == 4 and len(tenants["mongodb://b"]["app_guardrails"].docs) == 1
+        by_id = {d["_id"]: d for d in content}
+        c1 = by_id[kb_archive.target_id("c1", "dst")]
+        assert c1["embedding"] == VECTORS[1].tolist() and c1["app_id"] == "dst"
+        assert c1["createdAt"] == NOW.replace(tzinfo=None) and "embeddingRow" not in c1
+        qa = next(d for d in content if d["contentType"] == "qa")
+        assert isinstance(qa["_id"], ObjectId) and qa["appId"] == "dst" and "embedding" not in qa
+
+        dst = asyncio.run(apps.find_one({"_id": "dst"}))
+        assert dst["welcomeMessage"] == {"en": "Hi"} and "googleApiKey" not in dst
+        assert dst["contentVersion"] == 2
+
+def test_clone_within_one_database_keeps_the_source():
+    source = tenants["mongodb://a"]
+    before = [dict(d) for d in source["app_content"].docs]
+    apps.docs.append({"_id": "clone", "mongodbConnectionString": "mongodb://a"})
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "kb.tar")
+        asyncio.run(kb_archive.export_kb("src", path))
+        for _ in range(2):
+            asyncio.run(kb_archive.import_kb(path, "clone"))
+
+    docs = source["app_content"].docs
+    # The source tenant's documents are untouched; the clone got its own copies, once
+    assert [d for d in docs if d in before] == before
+    clones = [d for d in docs if d not in before]
+    assert len(clones) == 4 and all(d.get("app_id", d.get("appId")) == "clone" for d in clones)
+    source_ids = {d["_id"] for d in before}
+    assert not source_ids & {d["_id"] for d in clones}
+    assert {type(d["_id"]) for d in clones} == {str, ObjectId}
+    rules = source["app_guardrails"].docs
+    assert sorted(r["app_id"] for r in rules) == ["clone", "src"]
+
+    # Importing an app's own archive keeps its _ids
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "kb.tar")
+        asyncio.run(kb_archive.export_kb("src", path))
+        asyncio.run(kb_archive.import_kb(path))
+    assert len(source["app_content"].docs) == len(docs)
+
+def test_import_checks_embedding_model():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "kb.tar")
+        asyncio.run(kb_archive.export_kb("src", path))
+        original = kb_archive.GEMMA_EMBEDDING_MODEL
+        kb_archive.GEMMA_EMBEDDING_MODEL = "text-embedding-004"
+        try:
+            asyncio.run(kb_archive.import_kb(path, "src"))
+            assert False, "import should refuse embeddings from another model"
+        except ValueError as e:
+            assert "text-embedding-004" in str(e)
+        finally:
+            kb_archive.GEMMA_EMBEDDING_MODEL = original
+
+def test_import_into_an_existing_app_keeps_its_local_fields():
+    local = {"chatMessagesLayout": "documents", "chatMessagesMigration": {"lastId": "x1"},
+             "tokenUsage": {"inputTokens": 7}, "contentVersion": 1}
+    apps.docs.append({"_id": "live", "name": "Old name", "mongodbConnectionString": "mongodb://b", **local})
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "kb.tar")
+        asyncio.run(kb_archive.export_kb("src", path))
+        # An archive written before these fields were left out still carries them
+        with tarfile.open(path) as tar:
+            members = {name: tar.extractfile(name).read() for name in tar.getnames()}
+        settings = json.loads(members[kb_archive.SETTINGS])
+        settings.update({"chatMessagesLayout": "timeseries", "tokenUsage": {"inputTokens": 50}})
+        members[kb_archive.SETTINGS] = json.dumps(settings).encode()
+        with tarfile.open(path, "w") as tar:
+            for name, data in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        asyncio.run(kb_archive.import_kb(path, "live"))
+
+    live = asyncio.run(apps.find_one({"_id": "live"}))
+    # Settings come from the archive; layout, usage and the migration checkpoint stay the target's own
+    assert live["name"] == "Shop" and live["welcomeMessage"] == {"en": "Hi"}
+    assert {k: live[k] for k in ("chatMessagesLayout", "chatMessagesMigration", "tokenUsage")} == {
+        k: local[k] for k in ("chatMessagesLayout", "chatMessagesMigration", "tokenUsage")}
+    assert live["contentVersion"] == 2
+
+if __name__ == "__main__":
+    test_export_import_round_trip()
+    test_clone_within_one_database_keeps_the_source()
+    test_import_checks_embedding_model()
+    test_import_into_an_existing_app_keeps_its_local_fields()
+    print("✅ Knowledge-base archive tests passed")
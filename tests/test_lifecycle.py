@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for idle-session expiry, archival to compressed JSONL and restore.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import datetime
+import tempfile
+from types import SimpleNamespace
+from bson import ObjectId
+from app.services.lifecycle import LocalArchiveStore, archive_sessions, expire_idle_sessions, restore_archive
+from app.utils.chat_messages import to_storage
+
+NOW = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc)
+CUTOFF = NOW - datetime.timedelta(days=30)
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None, False
+        doc = doc[part]
+    return doc, True
+
+def _aware(value):
+    return value.replace(tzinfo=datetime.timezone.utc) if isinstance(value, datetime.datetime) and value.tzinfo is None else value
+
+def matches(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+            continue
+        value, present = _get(doc, key)
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$lt" and not (present and _aware(value) < _aware(arg)):
+                    return False
+                if op == "$exists" and present != arg:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction=1):
+        self.docs.sort(key=lambda d: _aware(_get(d, field)[0]), reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length] if length else self.docs
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = [dict(d) for d in docs]
+
+    def find(self, query=None, projection=None):
+        return Cursor([dict(d) for d in self.docs if matches(d, query or {})])
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(dict(d) for d in docs)
+
+    async def delete_many(self, query):
+        self.docs = [d for d in self.docs if not matches(d, query)]
+
+    async def replace_one(self, query, doc, upsert=False):
+        await self.delete_many(query)
+        self.docs.append(dict(doc))
+
+    async def update_one(self, query, update):
+        await self.update_many(query, update)
+
+    async def update_many(self, query, update):
+        hits = [d for d in self.docs if matches(d, query)]
+        for d in hits:
+            d.update(update.get("$set", {}))
+        return SimpleNamespace(modified_count=len(hits))
+
+def session(session_id, status, days_ago):
+    return {"_id": session_id, "appId": "app", "status": status, "lastActiveAt": NOW - datetime.timedelta(days=days_ago)}
+
+def message(session_id, days_ago, text):
+    return {"_id": ObjectId(), "appId": "app", "sessionId": session_id, "sender": "user", "message": text,
+            "timestamp": NOW - datetime.timedelta(days=days_ago)}
+
+def make_collections(layout="documents"):
+    messages = [message("old", 40, "hello"), message("old", 40, "bye"), message("recent", 5, "hi"), message("live", 35, "yo")]
+    return {
+        "chat_sessions": FakeCollection([session("old", "closed", 40), session("recent", "closed", 5), session("live", "active", 35)]),
+        "chat_messages": FakeCollection([to_storage(m, layout) for m in messages]),
+        "chat_messages_layout": layout,
+        "chat_archives": FakeCollection(),
+    }
+
+def test_expire_idle_sessions():
+    collections = make_collections()
+    closed = asyncio.run(expire_idle_sessions("app", collections, 24 * 3600, NOW))
+    assert closed == 1
+    assert [s["_id"] for s in collections["chat_sessions"].docs if s["status"] == "closed"] == ["old", "recent", "live"]
+
+def test_archive_then_restore_round_trip():
+    for layout in ("documents", "timeseries"):
+        collections = make_collections(layout)
+        with tempfile.TemporaryDirectory() as root:
+            store = LocalArchiveStore(root)
+            totals = asyncio.run(archive_sessions("app", collections, store, CUTOFF, batch_sessions=10))
+            assert totals == {"files": 1, "sessions": 1, "messages": 2}
+            # Only the old closed session left the hot collections
+            assert sorted(s["_id"] for s in collections["chat_sessions"].docs) == ["live", "recent"]
+            assert len(collections["chat_messages"].docs) == 2
+            archive = collections["chat_archives"].docs[0]
+            assert archive["sessionIds"] == ["old"] and os.path.exists(os.path.join(root, archive["_id"]))
+
+            for _ in range(2):
+                restored = asyncio.run(restore_archive("app", collections, store, archive["_id"]))
+            # Restoring twice doesn't duplicate messages; types survive the JSON round trip
+            assert restored == {"sessions": 1, "messages": 0}
+            assert len(collections["chat_messages"].docs) == 4
+            old = next(s for s in collections["chat_sessions"].docs if s["_id"] == "old")
+            assert isinstance(old["lastActiveAt"], datetime.datetime) and "restoredAt" in old
+            assert all(isinstance(m["_id"], ObjectId) for m in collections["chat_messages"].docs)
+
+            # A restored session is not archived again right away
+            again = asyncio.run(archive_sessions("app", collections, store, CUTOFF, batch_sessions=10))
+            assert again["sessions"] == 0
+
+if __name__ == "__main__":
+    test_expire_idle_sessions()
+    test_archive_then_restore_round_trip()
+    print("✅ Lifecycle tests passed")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests for tiered model routing by message complexity.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi import FastAPI
+from pydantic import ValidationError
+from app.models.app import AppModel, AppRecord
+from fastapi.testclient import TestClient
+from app.routers.admin import settings as settings_router
+from app.services.model_router import (
+    DEFAULT_THRESHOLDS, choose_route, classify, message_features, routing_config, trim_context
+)
+
+CONTENT = [
+    {"contentType": "qa", "embedding": [1.0, 0.0, 0.0]},
+    {"contentType": "note", "embedding": [0.0, 1.0, 0.0]},
+]
+ROUTED_APP = {"modelRouting": {"enabled": True}}
+
+def test_features_use_local_similarity():
+    features = message_features("What is your return policy?", [0.9, 0.1, 0.0], CONTENT)
+    assert features["words"] == 5
+    assert features["questions"] == 1
+    assert features["qnaScore"] > 0.99
+    assert features["retrievalScore"] == features["qnaScore"]
+
+def test_tiers():
+    assert choose_route(ROUTED_APP, "ok?", None, [])["tier"] == "simple"
+    assert choose_route(ROUTED_APP, "Could you tell me what your store's return policy is for shoes?", [1.0, 0.0, 0.0], CONTENT)["tier"] == "simple"
+    long_message = "I bought two pairs last month and " * 10 + "what can I do?"
+    assert choose_route(ROUTED_APP, long_message, None, [])["tier"] == "complex"
+    multi_part = "What is the return window? Do you refund shipping? Can I exchange instead?"
+    assert choose_route(ROUTED_APP, multi_part, None, [])["tier"] == "complex"
+    assert choose_route(ROUTED_APP, "Could you tell me when the offices are closed this year", [0.0, 1.0, 0.0], CONTENT)["tier"] == "standard"
+
+def test_weak_retrieval_escalates():
+    features = {"words": 20, "questions": 1, "qnaScore": None, "retrievalScore": 0.2}
+    assert classify(features, DEFAULT_THRESHOLDS) == "complex"
+
+def test_disabled_routing_keeps_previous_model():
+    route = choose_route({}, "ok?", None, [])
+    assert route["tier"] == "standard"
+    assert route["model"] == "gemini-1.5-flash" and route["maxOutputTokens"] == 512
+
+def test_app_overrides():
+    config = routing_config({"modelRouting": {"enabled": True, "tiers": {"simple": {"maxOutputTokens": 128}}, "thresholds": {"simpleMaxWords": 2}}})
+    assert config["tiers"]["simple"]["maxOutputTokens"] == 128
+    assert config["tiers"]["simple"]["model"] == "gemini-1.5-flash-8b"
+    assert config["thresholds"]["simpleMaxWords"] == 2
+
+def test_trim_context_keeps_stored_order():
+    sections = [["a" * 40, "b" * 40], ["c" * 40]]
+    assert trim_context(sections, None) == sections
+    assert trim_context(sections, 22) == [["a" * 40, "b" * 40], []]
+
+class UpdateResult:
+    matched_count = 1
+
+class FakeApps:
+    def __init__(self):
+        self.sets = []
+
+    async def update_one(self, query, update):
+        self.sets.append(update["$set"])
+        return UpdateResult()
+
+def settings_client():
+    apps = FakeApps()
+    settings_router.app_collection = apps
+    api = FastAPI()
+    api.include_router(settings_router.router)
+    return TestClient(api), apps
+
+def test_model_routing_setting_is_validated():
+    client, apps = settings_client()
+    url = "/api/v1/client/app/app/settings/model-routing"
+    for body in ({"tiers": {"simple": "x"}}, {"tiers": {"fast": {"model": "m"}}}, {"tiers": {"simple": {"maxOutputTokens": "lots"}}},
+                 {"tiers": {"simple": {"model": None}}}, {"thresholds": {"simpleMaxWords": "eight"}}, {"thresholds": {"simpleQnaSimilarity": 2}},
+                 {"thresholds": {"unknown": 1}}, {"enabled": "sometimes"}):
+        assert client.put(url, json=body).status_code == 422, body
+    assert apps.sets == []
+
+    body = {"enabled": True, "tiers": {"simple": {"maxOutputTokens": 128, "contextTokens": None}}, "thresholds": {"simpleMaxWords": 5}}
+    assert client.put(url, json=body).status_code == 200
+    # Only the fields sent are stored, so the rest of each tier keeps its default
+    assert apps.sets == [{"modelRouting": body}]
+    config = routing_config({"modelRouting": body})
+    assert config["tiers"]["simple"]["model"] == "gemini-1.5-flash-8b" and config["tiers"]["simple"]["maxOutputTokens"] == 128
+
+def test_app_model_validates_settings():
+    base = {"name": "Shop", "welcomeMessage": {"en": "Hi"}, "defaultLanguage": "en", "availableLanguages": ["en"]}
+    for settings in ({"modelRouting": {"tiers": {"simple": "x"}}}, {"intents": {"greeting": "hi"}},
+                     {"languageDetection": {"minConfidence": 3}}, {"modelRouting": {"tiers": {"simple": {"modle": "m"}}}}):
+        try:
+            AppModel(**base, **settings)
+        except ValidationError:
+            continue
+        raise AssertionError(f"{settings} should be rejected")
+
+    # Stored with only the fields sent; clients can't set the cache version counters
+    app = AppModel(**base, modelRouting={"tiers": {"simple": {"maxOutputTokens": 64}}}, contentVersion=0, guardrailVersion=0)
+    doc = app.document(exclude_unset=True)
+    assert doc["modelRouting"] == {"tiers": {"simple": {"maxOutputTokens": 64}}}
+    assert "contentVersion" not in doc and "guardrailVersion" not in doc
+    assert routing_config(doc)["tiers"]["simple"]["model"] == "gemini-1.5-flash-8b"
+    assert AppRecord(**doc, contentVersion=3).document()["contentVersion"] == 3
+
+if __name__ == "__main__":
+    test_features_use_local_similarity()
+    test_tiers()
+    test_weak_retrieval_escalates()
+    test_disabled_routing_keeps_previous_model()
+    test_app_overrides()
+    test_trim_context_keeps_stored_order()
+    test_model_routing_setting_is_validated()
+    test_app_model_validates_settings()
+    print("✅ Model router tests passed")
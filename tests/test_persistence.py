@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for grouped chat turn persistence.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+from app.services.persistence import TurnWriter, merge_session_update
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail:
+            raise RuntimeError("db down")
+        await asyncio.sleep(0.01)
+        self.calls.append(("insert_many", list(docs)))
+
+    async def bulk_write(self, requests, ordered=True):
+        self.calls.append(("bulk_write", [(r._filter, r._doc) for r in requests]))
+
+def make_writer(fail=False, **kwargs):
+    collections = {"chat_messages": FakeCollection(fail), "chat_sessions": FakeCollection()}
+
+    async def resolve(app_id):
+        return collections
+    return TurnWriter(resolve, **kwargs), collections
+
+def turn(n, session="s1"):
+    return [{"n": n, "sender": "user"}, {"n": n, "sender": "ai"}], {"$set": {"lastActiveAt": n}, "$inc": {"inputTokens": n}}
+
+def test_merge_session_update():
+    merged = merge_session_update({}, {"$set": {"a": 1}, "$inc": {"t": 2}, "$push": {"r": {"$each": [1], "$slice": -3}}})
+    merge_session_update(merged, {"$set": {"a": 2}, "$inc": {"t": 3}, "$push": {"r": {"$each": [2], "$slice": -3}}})
+    assert merged == {"$set": {"a": 2}, "$inc": {"t": 5}, "$push": {"r": {"$each": [1, 2], "$slice": -3}}}
+
+def test_sync_mode_groups_concurrent_turns():
+    writer, collections = make_writer(mode="sync")
+
+    async def run():
+        writer.start()
+        await asyncio.gather(*[writer.write("app", "s1", *turn(n)) for n in range(5)])
+        await writer.write("app", "s1", *turn(5))
+        await writer.stop()
+
+    asyncio.run(run())
+    inserts = [docs for call, docs in collections["chat_messages"].calls]
+    # Concurrent turns share one insert_many; each turn's messages stay in order
+    assert len(inserts) == 2 and len(inserts[0]) == 10
+    assert [d["sender"] for d in inserts[0][:2]] == ["user", "ai"]
+    session_updates = [ops for call, ops in collections["chat_sessions"].calls]
+    assert session_updates[0] == [({"_id": "s1"}, {"$set": {"lastActiveAt": 4}, "$inc": {"inputTokens": 10}})]
+    assert writer.stats()["messagesWritten"] == 12
+
+def test_async_mode_returns_before_the_write_and_stop_drains():
+    writer, collections = make_writer(mode="async", interval=60)
+
+    async def run():
+        writer.start()
+        await writer.write("app", "s1", *turn(1))
+        backlog = writer.stats()["backlogTurns"]
+        await writer.stop()
+        return backlog
+
+    assert asyncio.run(run()) == 1
+    assert len(collections["chat_messages"].calls) == 1
+
+def test_async_mode_waits_when_backlog_is_full():
+    writer, collections = make_writer(mode="async", interval=60, max_backlog=2)
+
+    async def run():
+        writer.start()
+        await writer.write("app", "s1", *turn(1))
+        await writer.write("app", "s1", *turn(2))
+        written = writer.stats()["messagesWritten"]
+        await writer.stop()
+        return written
+
+    assert asyncio.run(run()) == 4
+
+def test_sync_failure_reaches_the_caller():
+    writer, _ = make_writer(fail=True)
+
+    async def run():
+        try:
+            await writer.write("app", "s1", *turn(1))
+        except RuntimeError:
+            return True
+        return False
+
+    assert asyncio.run(run())
+    assert writer.stats()["failedTurns"] == 1
+
+if __name__ == "__main__":
+    test_merge_session_update()
+    test_sync_mode_groups_concurrent_turns()
+    test_async_mode_returns_before_the_write_and_stop_drains()
+    test_async_mode_waits_when_backlog_is_full()
+    test_sync_failure_reaches_the_caller()
+    print("✅ Persistence tests passed")
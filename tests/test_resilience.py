@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Tests for upstream deadlines, hedged requests and circuit breaking.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import time
+import httpx
+import pytest
+from app.services import gemini_client
+from app.services.gemini_client import GEMINI_API_BASE_URL, gemini_health, resilient_post
+from app.services.llm import stream_gemma_api
+from app.services.resilience import (
+    CircuitBreaker, DeadlineExceeded, LatencyTracker, call_timeout, clear_latency_budget, hedged, start_latency_budget
+)
+from tests.fake_gemini import create_fake_gemini
+
+def test_breaker_opens_and_recovers_through_half_open():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01)
+    assert breaker.allow()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.02)
+    assert breaker.allow()        # single half-open trial
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["rejected"] == 2
+
+def test_half_open_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.01)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def half_open_breaker(api_key, model):
+    breaker = gemini_health.breaker(api_key, model)
+    breaker.reset_timeout = 0.01
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    time.sleep(0.02)
+    return breaker
+
+def run_with_fake(scenario):
+    async def main():
+        gemini_client._http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_fake_gemini()))
+        try:
+            await scenario()
+        finally:
+            clear_latency_budget()
+            await gemini_client.close_http_client()
+    asyncio.run(main())
+
+def test_half_open_trial_that_hits_the_deadline_is_released():
+    async def scenario():
+        breaker = half_open_breaker("trial-key", "m1")
+        url = f"{GEMINI_API_BASE_URL}/models/m1:generateContent?key=trial-key"
+        start_latency_budget(-1)
+        with pytest.raises(DeadlineExceeded):
+            await resilient_post("trial-key", "m1", url, {"contents": []})
+        # The abandoned trial re-opened the circuit instead of blocking every later call
+        assert breaker.state == "open"
+        clear_latency_budget()
+        await asyncio.sleep(0.02)
+        resp = await resilient_post("trial-key", "m1", url, {"contents": []})
+        assert resp.status_code == 200 and breaker.state == "closed"
+    run_with_fake(scenario)
+
+def test_half_open_stream_trial_is_settled_on_client_errors_and_cancellation():
+    async def scenario():
+        breaker = half_open_breaker("stream-key", "m2")
+        # 404 for an expired cachedContent: upstream answered, so the trial closes the circuit
+        with pytest.raises(httpx.HTTPStatusError):
+            async for _ in stream_gemma_api("stream-key", "hi", model="m2", cached_content="cachedContents/gone"):
+                pass
+        assert breaker.state == "closed"
+
+        breaker = half_open_breaker("stream-key", "m3")
+        start_latency_budget(-1)
+        with pytest.raises(DeadlineExceeded):
+            async for _ in stream_gemma_api("stream-key", "hi", model="m3"):
+                pass
+        assert breaker.state == "open"
+        clear_latency_budget()
+
+        breaker = half_open_breaker("stream-key", "m4")
+        stream = stream_gemma_api("stream-key", "hi", model="m4")
+        task = asyncio.ensure_future(stream.__anext__())
+        while not breaker.is_trial():
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # A trial cancelled before its response re-opens the circuit instead of staying stuck half-open
+        assert breaker.state == "open"
+    run_with_fake(scenario)
+
+def test_call_timeout_is_capped_by_budget():
+    async def main():
+        assert call_timeout(20.0) == 20.0
+        start_latency_budget(0.5)
+        assert call_timeout(20.0) <= 0.5
+        start_latency_budget(-1)
+        with pytest.raises(DeadlineExceeded):
+            call_timeout(20.0)
+    asyncio.run(main())
+
+def test_hedge_fires_after_delay_and_first_success_wins():
+    started = []
+
+    async def attempt():
+        started.append(time.monotonic())
+        # The first attempt is slow, the hedge is fast
+        await asyncio.sleep(0.5 if len(started) == 1 else 0.01)
+        return len(started)
+
+    begin = time.monotonic()
+    assert asyncio.run(hedged(attempt, delay=0.02)) == 2
+    assert len(started) == 2
+    assert time.monotonic() - begin < 0.4
+
+def test_no_hedge_when_first_attempt_is_fast():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        return "ok"
+
+    assert asyncio.run(hedged(attempt, delay=0.05)) == "ok"
+    assert len(calls) == 1
+
+def test_latency_percentile_needs_samples():
+    tracker = LatencyTracker(min_samples=10)
+    assert tracker.percentile(0.95, default=1.5) == 1.5
+    for i in range(100):
+        tracker.record(i / 100)
+    assert 0.9 <= tracker.percentile(0.95) <= 0.96
+
+if __name__ == "__main__":
+    test_breaker_opens_and_recovers_through_half_open()
+    test_half_open_failure_reopens()
+    test_half_open_trial_that_hits_the_deadline_is_released()
+    test_half_open_stream_trial_is_settled_on_client_errors_and_cancellation()
+    test_call_timeout_is_capped_by_budget()
+    test_hedge_fires_after_delay_and_first_success_wins()
+    test_no_hedge_when_first_attempt_is_fast()
+    test_latency_percentile_needs_samples()
+    print("✅ Resilience tests passed")
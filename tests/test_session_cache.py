@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process LRU session cache.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+import time
+from app.services.session_cache import SessionCache
+
+class FakeWriter:
+    def __init__(self):
+        self.writes = []
+
+    async def write(self, app_id, session_id, messages, update, mode=None):
+        self.writes.append((app_id, session_id, update))
+
+def session(session_id, **fields):
+    return {"_id": session_id, "appId": "app", "language": "en", **fields}
+
+def turn_update(n):
+    return {"$set": {"lastActiveAt": n, "language": "es"}, "$inc": {"inputTokens": 10}}
+
+def test_hits_and_lru_eviction_writes_dirty_state():
+    writer = FakeWriter()
+    cache = SessionCache(max_entries=2, coalesce_seconds=60, writer=writer)
+
+    async def run():
+        await cache.put("app", session("s1"))
+        await cache.put("app", session("s2"))
+        assert cache.get("app", "s1")["_id"] == "s1"
+        cache.record_turn("app", "s2", turn_update(1))
+        cache.record_turn("app", "s2", turn_update(2))
+        # s2 is least recently used now; adding s3 evicts it and writes its pending update
+        await cache.put("app", session("s3"))
+
+    asyncio.run(run())
+    assert cache.get("app", "s2") is None
+    assert writer.writes == [("app", "s2", {"$set": {"lastActiveAt": 2, "language": "es"}, "$inc": {"inputTokens": 20}})]
+    assert cache.stats()["evictions"] == 1
+
+def test_write_through_and_coalescing():
+    through = SessionCache(coalesce_seconds=0, writer=FakeWriter())
+    coalesced = SessionCache(coalesce_seconds=60, writer=FakeWriter())
+
+    async def run():
+        await through.put("app", session("s1"))
+        await coalesced.put("app", session("s1"))
+
+    asyncio.run(run())
+    assert through.record_turn("app", "s1", turn_update(1)) == turn_update(1)
+    # Inside the window the update is deferred but the cached session already reflects it
+    assert coalesced.record_turn("app", "s1", turn_update(1)) is None
+    cached = coalesced.get("app", "s1")
+    assert cached["language"] == "es" and cached["inputTokens"] == 10
+    coalesced._entries[("app", "s1")]["writtenAt"] -= 61
+    pending = coalesced.record_turn("app", "s1", turn_update(2))
+    assert pending == {"$set": {"lastActiveAt": 2, "language": "es"}, "$inc": {"inputTokens": 20}}
+
+def test_recent_turns_ring_follows_pushes():
+    cache = SessionCache(coalesce_seconds=60, writer=FakeWriter())
+    asyncio.run(cache.put("app", session("s1", recentTurns=[{"timestamp": 0, "message": "0"}])))
+    for t in range(1, 6):
+        push = {"recentTurns": {"$each": [{"timestamp": t, "message": str(t)}], "$slice": -4}}
+        cache.record_turn("app", "s1", {"$set": {"lastActiveAt": t}, "$push": push})
+    # The cached session mirrors the $push/$slice, and the deferred update carries all of it
+    assert [m["timestamp"] for m in cache.get("app", "s1")["recentTurns"]] == [2, 3, 4, 5]
+    pending = cache._entries[("app", "s1")]["dirty"]["$push"]["recentTurns"]
+    assert [m["timestamp"] for m in pending["$each"]] == [1, 2, 3, 4, 5] and pending["$slice"] == -4
+
+def test_idle_eviction_and_max_age():
+    writer = FakeWriter()
+    cache = SessionCache(idle_seconds=10, max_age_seconds=5, coalesce_seconds=60, writer=writer)
+
+    async def run():
+        await cache.put("app", session("idle"))
+        await cache.put("app", session("stale"))
+        cache.record_turn("app", "idle", turn_update(1))
+        cache._entries[("app", "idle")]["usedAt"] -= 11
+        cache._entries[("app", "stale")]["loadedAt"] -= 6
+        await cache.sweep()
+
+    asyncio.run(run())
+    assert ("app", "idle") not in cache._entries and len(writer.writes) == 1
+    # Clean entries past max age are re-read from MongoDB
+    assert cache.get("app", "stale") is None
+
+def test_lookup_is_fast():
+    cache = SessionCache(writer=FakeWriter())
+    asyncio.run(cache.put("app", session("s1")))
+    started = time.perf_counter()
+    for _ in range(10000):
+        cache.get("app", "s1")
+    assert (time.perf_counter() - started) / 10000 < 0.0001
+
+if __name__ == "__main__":
+    test_hits_and_lru_eviction_writes_dirty_state()
+    test_write_through_and_coalescing()
+    test_recent_turns_ring_follows_pushes()
+    test_idle_eviction_and_max_age()
+    test_lookup_is_fast()
+    print("✅ Session cache tests passed")
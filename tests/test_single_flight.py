@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for single-flight coalescing of identical in-flight LLM requests.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+from app.services.single_flight import SingleFlight, request_key
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    group = SingleFlight(wait_timeout=1.0)
+    upstream_calls = []
+
+    async def upstream():
+        upstream_calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*[group.do("k", upstream) for _ in range(50)])
+
+    results = asyncio.run(main())
+    assert results == ["answer"] * 50
+    assert len(upstream_calls) == 1
+    assert group.stats()["calls"] == 1
+    assert group.stats()["coalesced"] == 49
+    assert group.stats()["inFlight"] == 0
+
+def test_failure_propagates_to_every_waiter():
+    group = SingleFlight(wait_timeout=1.0)
+
+    async def upstream():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*[group.do("k", upstream) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert group.stats()["failures"] == 1
+
+def test_follower_wait_is_bounded():
+    group = SingleFlight(wait_timeout=0.01)
+
+    async def upstream():
+        await asyncio.sleep(0.1)
+        return "slow"
+
+    async def main():
+        leader = asyncio.ensure_future(group.do("k", upstream))
+        await asyncio.sleep(0)
+        try:
+            await group.do("k", upstream)
+            follower = "no timeout"
+        except asyncio.TimeoutError:
+            follower = "timeout"
+        return await leader, follower
+
+    assert asyncio.run(main()) == ("slow", "timeout")
+    assert group.stats()["timeouts"] == 1
+
+def test_request_key_separates_tenants_and_configs():
+    payload = {"contents": [{"parts": [{"text": "hi"}]}], "generationConfig": {"temperature": 0.2}}
+    assert request_key("key-a", "m", payload) == request_key("key-a", "m", dict(payload))
+    assert request_key("key-a", "m", payload) != request_key("key-b", "m", payload)
+    assert request_key("key-a", "m", payload) != request_key("key-a", "m2", payload)
+
+if __name__ == "__main__":
+    test_concurrent_identical_calls_share_one_upstream_call()
+    test_failure_propagates_to_every_waiter()
+    test_follower_wait_is_bounded()
+    test_request_key_separates_tenants_and_configs()
+    print("✅ Single-flight tests passed")
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared per-message normalization stage.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils.text import NormalizedText, normalized
+from app.services.guardrail import CompiledGuardrails
+from app.services.model_router import message_features
+from app.services.intents import IntentTable
+
+def test_views():
+    text = NormalizedText("  Ｓｗｉｔｃｈ   TO\tSpanish,  please？ ")
+    assert text.nfkc == "  Switch   TO\tSpanish,  please? "
+    assert text.clean == "Switch TO Spanish, please?"
+    assert text.collapsed == "switch to spanish, please?"
+    assert text.tokens == ["switch", "to", "spanish", "please"]
+    assert str(text) == text.raw
+
+def test_views_are_computed_once():
+    text = NormalizedText("Straße")
+    assert "folded" not in vars(text)
+    assert text.folded == "strasse"
+    assert text.folded is text.folded
+    assert normalized(text) is text
+
+def test_stages_share_the_object():
+    text = NormalizedText("THANKS!  Switch  to   French")
+    found = IntentTable().match(text)
+    assert found["thanks"] and found["language_switch"] == "fr"
+    matcher = CompiledGuardrails([{"_id": "r", "ruleType": "blacklist_phrase", "pattern": "french", "action": "block_input"}])
+    assert matcher.evaluate(text, "en")["blocked"]
+    assert message_features(text, None, [])["words"] == 4
+
+if __name__ == "__main__":
+    test_views()
+    test_views_are_computed_once()
+    test_stages_share_the_object()
+    print("✅ Text normalization tests passed")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for the write-behind buffer and the guardrail audit log built on it.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+from app.services.write_behind import WriteBehindBuffer
+from app.services import guardrail_events as events_module
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail:
+            raise RuntimeError("db down")
+        self.batches.append(list(docs))
+
+def make_buffer(collections, **kwargs):
+    async def resolve(key):
+        return collections.setdefault(key, FakeCollection())
+    return WriteBehindBuffer("test", resolve, **kwargs)
+
+def test_flush_groups_by_key_in_batches():
+    collections = {}
+    buffer = make_buffer(collections, batch_size=3)
+    for i in range(7):
+        buffer.put("app-1", {"n": i})
+    buffer.put("app-2", {"n": 0})
+    asyncio.run(buffer.flush())
+    assert [len(b) for b in collections["app-1"].batches] == [3, 3, 1]
+    assert len(collections["app-2"].batches) == 1
+    assert buffer.stats()["written"] == 8 and len(buffer) == 0
+
+def test_pressure_samples_then_drops():
+    buffer = make_buffer({}, max_size=100, sample_above=0.5, sample_rate=10)
+    results = [buffer.put("app", {"n": i}) for i in range(1000)]
+    assert all(results[:50])
+    stats = buffer.stats()
+    assert stats["queued"] <= 100
+    assert stats["sampledOut"] > 0 and stats["dropped"] > 0
+    assert stats["accepted"] + stats["sampledOut"] + stats["dropped"] == 1000
+    assert buffer._buffers["app"][50]["sampleRate"] == 10
+
+def test_background_loop_flushes_and_stop_drains():
+    collections = {}
+
+    async def run():
+        buffer = make_buffer(collections, batch_size=2, interval=60)
+        buffer.start()
+        buffer.put("app", {"n": 1})
+        buffer.put("app", {"n": 2})
+        # A full batch wakes the loop without waiting for the interval
+        for _ in range(20):
+            await asyncio.sleep(0)
+        flushed_early = len(collections.get("app", FakeCollection()).batches)
+        buffer.put("app", {"n": 3})
+        await buffer.stop()
+        return flushed_early
+
+    assert asyncio.run(run()) == 1
+    assert [d["n"] for b in collections["app"].batches for d in b] == [1, 2, 3]
+
+def test_failed_flush_is_counted_not_retried():
+    async def resolve(key):
+        return FakeCollection(fail=True)
+    buffer = WriteBehindBuffer("test", resolve)
+    buffer.put("app", {"n": 1})
+    asyncio.run(buffer.flush())
+    assert buffer.stats()["failed"] == 1 and len(buffer) == 0
+
+def test_guardrail_hits_are_queued():
+    collections = {}
+    original = events_module.guardrail_events
+    events_module.guardrail_events = make_buffer(collections)
+    try:
+        result = {
+            "blocked": True, "ruleId": "block-1", "message": "no",
+            "logged": [{"blocked": False, "ruleId": "watch-1", "message": ""}],
+        }
+        assert events_module.record_guardrail_hits("app", "s1", "input", result, "some text", "en") == 2
+        assert events_module.record_guardrail_hits("app", "s1", "input", {"blocked": False}, "clean", "en") == 0
+        asyncio.run(events_module.guardrail_events.flush())
+    finally:
+        events_module.guardrail_events = original
+    docs = collections["app"].batches[0]
+    assert [(d["ruleId"], d["outcome"]) for d in docs] == [("block-1", "blocked"), ("watch-1", "logged")]
+    assert docs[0]["sessionId"] == "s1" and docs[0]["snippet"] == "some text"
+
+if __name__ == "__main__":
+    test_flush_groups_by_key_in_batches()
+    test_pressure_samples_then_drops()
+    test_background_loop_flushes_and_stop_drains()
+    test_failed_flush_is_counted_not_retried()
+    test_guardrail_hits_are_queued()
+    print("✅ Write-behind tests passed")